@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class MunjiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'munji_app'
+
+    def ready(self):
+        from django.core import checks
+
+        from . import search, signals
+        signals.connect(self)
+        checks.register(search.check_index_triggers, checks.Tags.database)
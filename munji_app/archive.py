@@ -0,0 +1,191 @@
+"""
+Closed seasons, moved out of the live tables by `manage.py archive_season`.
+
+Purchases (with their expenses), misc costs and rice production older
+than a cutoff are copied into Archived<Model> tables with the same columns
+and ids, then deleted from the live tables in chunked transactions. The
+move is plain SQL: no signals run, so the ledger, landed costs and
+DailyRollup are untouched and reports keep covering archived days. Each
+archived month leaves an ArchiveSummary row per table.
+
+<Model>History is an unmanaged model over a `UNION ALL` view of a live
+table and its archive. List and export requests whose ?start_date= falls
+on or before the newest archived row read from it (see
+DateRangeFilterMixin); every other query, including detail routes, only
+sees the live tables, so the current season's indexes stay small.
+
+The views name every column, so a migration that changes an archived
+table must change its archive table to match and recreate the view. Like
+0011_season_archive, it writes the statements out as literal RunSQL:
+drop_views_sql() / create_views_sql() print them for the current models,
+but a migration must not call them, as the models move on after it.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import cache
+from .models import (
+    ArchivedExpense, ArchivedMiscellaneousCost, ArchivedMunjiPurchase, ArchivedRiceProduction,
+    ArchiveSummary, Expense, ExpenseHistory, MiscellaneousCost, MiscellaneousCostHistory,
+    MunjiPurchase, MunjiPurchaseHistory, RiceProduction, RiceProductionHistory,
+)
+
+STAMP = 'archive'
+
+
+@dataclass(frozen=True)
+class Archive:
+    archived: type
+    history: type
+    # Summed into ArchiveSummary.amount.
+    amount: str
+
+
+ARCHIVES = {
+    MunjiPurchase: Archive(ArchivedMunjiPurchase, MunjiPurchaseHistory, 'total_munji_price'),
+    Expense: Archive(ArchivedExpense, ExpenseHistory, 'amount'),
+    MiscellaneousCost: Archive(ArchivedMiscellaneousCost, MiscellaneousCostHistory, 'amount'),
+    RiceProduction: Archive(ArchivedRiceProduction, RiceProductionHistory, 'total_price'),
+}
+
+
+def _columns(model):
+    return ', '.join(connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+
+def create_views_sql():
+    qn = connection.ops.quote_name
+    return [
+        f"CREATE VIEW {qn(archive.history._meta.db_table)} AS "
+        f"SELECT {_columns(model)} FROM {qn(model._meta.db_table)} "
+        f"UNION ALL SELECT {_columns(model)} FROM {qn(archive.archived._meta.db_table)}"
+        for model, archive in ARCHIVES.items()
+    ]
+
+
+def drop_views_sql():
+    qn = connection.ops.quote_name
+    return [f"DROP VIEW IF EXISTS {qn(archive.history._meta.db_table)}" for archive in ARCHIVES.values()]
+
+
+# --- READING ---
+def _load_boundaries():
+    rows = ArchiveSummary.objects.order_by().values('model').annotate(last=Max('last_created_at'))
+    return {row['model']: row['last'] for row in rows}
+
+
+def boundaries():
+    """{model label: created_at of its newest archived row}, for the models with archived rows."""
+    return cache.read_through(STAMP, _load_boundaries)
+
+
+async def aboundaries():
+    async def load():
+        rows = ArchiveSummary.objects.order_by().values('model').annotate(last=Max('last_created_at'))
+        return {row['model']: row['last'] async for row in rows}
+    return await cache.aread_through(STAMP, load)
+
+
+def reaches(model, start, known=None):
+    """Whether rows of `model` created at or after `start` may be archived."""
+    if model not in ARCHIVES:
+        return False
+    last = (boundaries() if known is None else known).get(model._meta.label_lower)
+    return last is not None and start <= last
+
+
+def with_archive(queryset):
+    """`queryset` (unfiltered) over the live and archived rows of its model."""
+    history = ARCHIVES[queryset.model].history.objects.all()
+    related = queryset.query.select_related
+    if related is True:
+        history = history.select_related()
+    elif related:
+        def paths(tree, prefix=''):
+            for name, subtree in tree.items():
+                yield prefix + name
+                yield from paths(subtree, f'{prefix}{name}__')
+        history = history.select_related(*paths(related))
+    return history.order_by(*queryset.query.order_by)
+
+
+# --- ARCHIVING ---
+def _move(cursor, model, column, ids):
+    """Copy the rows of `model` whose `column` is in `ids` into its archive table, then delete them."""
+    qn = connection.ops.quote_name
+    table, archived = qn(model._meta.db_table), qn(ARCHIVES[model].archived._meta.db_table)
+    where = f"{qn(column)} IN ({', '.join(['%s'] * len(ids))})"
+    cursor.execute(
+        f"INSERT INTO {archived} ({_columns(model)}) SELECT {_columns(model)} FROM {table} WHERE {where}", ids,
+    )
+    cursor.execute(f"DELETE FROM {table} WHERE {where}", ids)
+    return cursor.rowcount
+
+
+def _summarize(model, periods):
+    """Recompute the ArchiveSummary rows of `model` for the months in `periods`."""
+    archive = ARCHIVES[model]
+    rows = (
+        archive.archived.objects.order_by()
+        .annotate(period=TruncMonth('created_at'))
+        .filter(period__in=periods)
+        .values('period')
+        .annotate(
+            rows=Count('id'), amount=Sum(archive.amount),
+            first_created_at=Min('created_at'), last_created_at=Max('created_at'),
+        )
+    )
+    for row in rows:
+        period = row.pop('period')
+        ArchiveSummary.objects.update_or_create(
+            model=model._meta.label_lower, period=period.date(), defaults={**row, 'amount': row['amount'] or 0},
+        )
+
+
+def _candidates(model, cutoff):
+    queryset = model.objects.filter(created_at__lt=cutoff)
+    if model is MunjiPurchase:
+        # A purchase moves together with its expenses, so all of them must be old enough.
+        queryset = queryset.exclude(expenses__created_at__gte=cutoff)
+    return queryset.order_by('created_at', 'id')
+
+
+def archive_season(before, chunk_size=1000, progress=None):
+    """
+    Move the rows created before the date `before` into the archive tables,
+    `chunk_size` rows (plus a purchase's expenses) per transaction. Returns
+    {model label: rows moved}; `progress`, if given, is called with
+    (model, rows moved so far) after each chunk.
+    """
+    cutoff = timezone.make_aware(datetime.combine(before, time.min))
+    moved = {model._meta.label_lower: 0 for model in ARCHIVES}
+    for model in (MunjiPurchase, MiscellaneousCost, RiceProduction):
+        while True:
+            ids = list(_candidates(model, cutoff).values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                periods = set(
+                    model.objects.filter(id__in=ids).order_by()
+                    .annotate(period=TruncMonth('created_at')).values_list('period', flat=True)
+                )
+                if model is MunjiPurchase:
+                    expense_periods = set(
+                        Expense.objects.filter(munji_purchase_id__in=ids).order_by()
+                        .annotate(period=TruncMonth('created_at')).values_list('period', flat=True)
+                    )
+                    moved[Expense._meta.label_lower] += _move(cursor, Expense, 'munji_purchase_id', ids)
+                    _summarize(Expense, expense_periods)
+                    cache.touch_model(Expense)
+                moved[model._meta.label_lower] += _move(cursor, model, 'id', ids)
+                _summarize(model, periods)
+                cache.touch_model(model)
+                cache.touch(STAMP)
+            if progress:
+                progress(model, moved[model._meta.label_lower])
+    return moved
@@ -0,0 +1,181 @@
+"""
+Async versions of the hot read endpoints, for running under ASGI.
+
+Each view answers JSON GETs itself with the async ORM and hands every
+other request (writes, HEAD/OPTIONS, the browsable API, other formats) to
+the DRF view that serves the same URL. The queryset, filters, pagination,
+serializer and conditional-GET validators come from the DRF viewset, and
+its authentication, permission and throttle checks run first, so
+responses match the sync path.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import archive, cache, views
+from .conditional import ConditionalGetMixin, NotModified, get_validators, set_validators
+from .fastlist import row_encoder
+from .filters import DateRangeFilterMixin
+from .models import Category, GlobalSettings, MunjiPurchase, Supplier
+from .pagination import PageNumberOrCursorPagination
+from .search import SearchMixin
+from .serializers import MunjiPurchaseSerializer
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+
+
+def _accepts_json(request):
+    if request.method != 'GET' or request.GET.get('format', 'json') != 'json':
+        return False
+    accept = request.headers.get('Accept', '')
+    if 'text/html' in accept:
+        return False
+    return not accept or '*/*' in accept or 'application/json' in accept
+
+
+def _render(data, status=200, allow='GET, HEAD, OPTIONS'):
+    response = HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+    response['Vary'] = 'Accept'
+    response['Allow'] = allow
+    return response
+
+
+def _drf_view(view_class, request, actions=None, **kwargs):
+    """An instance of the DRF view `view_class` set up as its dispatch would, without running it."""
+    view = view_class(args=(), kwargs=kwargs, format_kwarg=None)
+    if actions is not None:
+        # What ViewSetMixin.as_view() does; the handlers also make up `Allow`.
+        view.action_map = actions
+        for method, action in actions.items():
+            setattr(view, method, getattr(view, action))
+        if 'get' in actions and 'head' not in actions:
+            view.head = view.get
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    return view
+
+
+def _handle_exception(view, exc):
+    """The rendered response DRF's dispatch gives for `exc`."""
+    response = view.finalize_response(view.request, view.handle_exception(exc))
+    return response.render() if isinstance(response, Response) else response
+
+
+async def _respond(view, build, allow, models=()):
+    """
+    Run the checks DRF runs before any handler (authentication, permissions,
+    throttling), then answer 304 from the change stamps of `models`, or
+    render `await build()`. A ConditionalGetMixin view gets its validators
+    from its own initial().
+    """
+    request = view.request
+    try:
+        await sync_to_async(view.initial)(request)
+        if isinstance(view, ConditionalGetMixin):
+            validators = view.validators
+        else:
+            validators = get_validators(request, models) if cache.is_shared() else None
+            if validators is not None:
+                etag, last_modified = validators
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is not None:
+                    return set_validators(response, *validators)
+        response = _render(await build(), allow=allow)
+    except (APIException, NotModified) as exc:
+        return await sync_to_async(_handle_exception)(view, exc)
+    return response if validators is None else set_validators(response, *validators)
+
+
+def read_view(viewset_class, actions, build, allow):
+    """
+    Async view for one route: JSON GETs run `build(view, **kwargs)`; other
+    requests go to the DRF view for `actions`.
+    """
+    sync_view = sync_to_async(viewset_class.as_view(actions))
+
+    @csrf_exempt
+    async def view(request, **kwargs):
+        if not _accepts_json(request):
+            return await sync_view(request, **kwargs)
+        drf_view = _drf_view(viewset_class, request, actions, **kwargs)
+        return await _respond(drf_view, lambda: build(drf_view, **kwargs), allow)
+
+    return view
+
+
+async def _list(view):
+    if isinstance(view, SearchMixin) and view.search_query() is not None:
+        return await sync_to_async(view.search_results)()
+    if isinstance(view, DateRangeFilterMixin) and view.request.query_params.get('start_date'):
+        # get_queryset() checks them without touching the database.
+        view.archive_boundaries = await archive.aboundaries()
+    queryset = view.filter_queryset(view.get_queryset())
+    encoder = view.get_row_encoder()
+    if encoder is None:
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data).data
+    queryset = queryset.prefetch_related(None)
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view=view, lookups=encoder.lookups)
+    data = encoder.encode_many(page)
+    if view.expansions():
+        data = await sync_to_async(view.expand_rows)(page, data)
+    return view.get_paginated_response(data).data
+
+
+async def _retrieve(view, pk):
+    queryset = view.filter_queryset(view.get_queryset())
+    model = queryset.model
+    try:
+        obj = await queryset.aget(pk=pk)
+    except model.DoesNotExist:
+        raise NotFound(f'No {model._meta.object_name} matches the given query.')
+    return view.get_serializer(obj).data
+
+
+async def _globals_list(view):
+    page = view.paginate_queryset([await GlobalSettings.aget_instance()])
+    return view.get_paginated_response(view.get_serializer(page, many=True).data).data
+
+
+async def _globals_retrieve(view, pk):
+    return view.get_serializer(await GlobalSettings.aget_instance()).data
+
+
+LIST_ALLOW = 'GET, POST, HEAD, OPTIONS'
+DETAIL_ALLOW = 'GET, PUT, PATCH, DELETE, HEAD, OPTIONS'
+
+purchase_list = read_view(views.MunjiPurchaseViewSet, LIST_ACTIONS, _list, LIST_ALLOW)
+purchase_detail = read_view(views.MunjiPurchaseViewSet, DETAIL_ACTIONS, _retrieve, DETAIL_ALLOW)
+supplier_list = read_view(views.SupplierViewSet, LIST_ACTIONS, _list, LIST_ALLOW)
+category_list = read_view(views.CategoryViewSet, LIST_ACTIONS, _list, LIST_ALLOW)
+globals_list = read_view(views.GlobalSettingsViewSet, LIST_ACTIONS, _globals_list, LIST_ALLOW)
+globals_detail = read_view(views.GlobalSettingsViewSet, DETAIL_ACTIONS, _globals_retrieve, DETAIL_ALLOW)
+
+_recent_purchases = sync_to_async(views.recent_purchases)
+
+
+@csrf_exempt
+async def recent_purchases(request):
+    if not _accepts_json(request):
+        return await _recent_purchases(request)
+    drf_view = _drf_view(views.recent_purchases.cls, request)
+
+    async def build():
+        encoder = row_encoder(MunjiPurchaseSerializer)
+        queryset = MunjiPurchase.objects.order_by('-created_at')
+        paginator = PageNumberOrCursorPagination()
+        paginator.page_size = 10
+        page = await paginator.apaginate_queryset(queryset, drf_view.request, lookups=encoder.lookups)
+        return paginator.get_paginated_response(encoder.encode_many(page)).data
+
+    return await _respond(drf_view, build, 'GET, OPTIONS', models=(MunjiPurchase, Supplier, Category))
+
+
+# Schema generators only list views that carry their DRF class.
+recent_purchases.cls = views.recent_purchases.cls
+recent_purchases.initkwargs = views.recent_purchases.initkwargs
@@ -0,0 +1,7 @@
+"""
+Endpoint benchmarks, run with `manage.py benchmark`.
+
+scenarios.py lists the requests made against every route, runner.py times
+them through the Django test client and compares a run with a stored
+baseline.
+"""
@@ -0,0 +1,157 @@
+"""
+Time scenarios through the Django test client and compare runs.
+
+Each scenario is requested `warmup` times untimed, then `iterations` times
+timed, recording wall-clock latency and the queries each request ran.
+One further request runs under tracemalloc for its peak allocated memory,
+kept apart so tracing does not inflate the timings.
+"""
+import json
+import math
+import time
+import tracemalloc
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from munji_app import cache
+
+# Latency differences below this are noise, whatever the threshold says.
+NOISE_FLOOR_MS = 1.0
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+@contextmanager
+def seeded_database(purchases, seed):
+    """A throwaway test database filled by generate_data, sized from `purchases`."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        cache.clear()
+        call_command(
+            'generate_data',
+            suppliers=max(10, purchases // 100),
+            purchases=purchases,
+            expenses=purchases * 2,
+            production=purchases // 2,
+            misc_costs=purchases // 2,
+            seed=seed,
+            stdout=StringIO(),
+        )
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def scenario_url(scenario, ctx):
+    kwargs = {}
+    if scenario.model is not None:
+        kwargs['pk'] = scenario.model.objects.order_by('pk').values_list('pk', flat=True).first()
+    url = reverse(scenario.route, kwargs=kwargs)
+    query = scenario.query.format(**ctx)
+    return f'{url}?{query}' if query else url
+
+
+def _request(client, scenario, url, i, ctx):
+    if scenario.method == 'get':
+        response = client.get(url)
+    else:
+        response = getattr(client, scenario.method)(
+            url, scenario.data(i, ctx), content_type='application/json', headers=scenario.headers,
+        )
+    if response.streaming:
+        b''.join(response.streaming_content)
+    if response.status_code >= 400:
+        raise BenchmarkError(f'{scenario.name}: {scenario.method.upper()} {url} returned {response.status_code}')
+    return response
+
+
+def measure(client, scenario, ctx, iterations, warmup):
+    url = scenario_url(scenario, ctx)
+    for i in range(warmup):
+        _request(client, scenario, url, i, ctx)
+
+    timings, queries = [], []
+    for i in range(warmup, warmup + iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            _request(client, scenario, url, i, ctx)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+
+    tracemalloc.start()
+    try:
+        _request(client, scenario, url, warmup + iterations, ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def run(scenarios, ctx, iterations=20, warmup=2, progress=None):
+    """Return {scenario name: measurements} for `scenarios`, in order."""
+    client = Client()
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = measure(client, scenario, ctx, iterations, warmup)
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
+
+
+def compare(baseline, results, threshold):
+    """
+    Return a list of regressions of `results` against `baseline`: median
+    latency or peak memory more than `threshold` (a fraction) above the
+    baseline, p95 latency more than twice that, or any increase in queries
+    per request. A scenario the baseline does not cover is reported too.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            regressions.append(f"{name}: not in the baseline; record it with --update-baseline")
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {current['queries']} queries per request, baseline {previous['queries']}")
+        # Tails are noisier than medians, so p95 gets twice the allowance.
+        for key, allowance in (('p50_ms', threshold), ('p95_ms', 2 * threshold)):
+            if (current[key] > previous[key] * (1 + allowance)
+                    and current[key] - previous[key] > NOISE_FLOOR_MS):
+                regressions.append(f"{name}: {key[:3]} {current[key]:.1f} ms, baseline {previous[key]:.1f} ms")
+        if current['peak_kb'] > previous['peak_kb'] * (1 + threshold):
+            regressions.append(f"{name}: peak memory {current['peak_kb']:.0f} KiB, baseline {previous['peak_kb']:.0f} KiB")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, meta, results):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
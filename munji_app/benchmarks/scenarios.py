@@ -0,0 +1,129 @@
+"""
+One or more scenarios per route of the project's URLconf.
+
+A scenario names a route, the model whose first row fills its <pk>, a
+query string and, for writes, a factory building the request body from
+the iteration number (so created names stay unique) and any extra
+request headers.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.db import models
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils import timezone
+
+from ..models import Category, Expense, GlobalSettings, Job, MiscellaneousCost, MunjiPurchase, Supplier
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    route: str
+    model: Optional[type[models.Model]] = None
+    query: str = ''
+    method: str = 'get'
+    data: Optional[Callable[[int, dict], object]] = None
+    headers: Optional[dict] = None
+
+
+def route_names(patterns=None, namespace=''):
+    """
+    Names of every route in the project, namespaced as reverse() expects.
+    Admin is represented by its index page only.
+    """
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace == 'admin':
+                names.add('admin:index')
+                continue
+            inner = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            names |= route_names(pattern.url_patterns, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(namespace + pattern.name)
+    return names
+
+
+def context():
+    """Values the scenarios' queries and bodies refer to, read from the seeded database."""
+    recent = timezone.localdate() - timedelta(days=90)
+    return {
+        'recent': recent.isoformat(),
+        'today': timezone.localdate().isoformat(),
+        'category': Category.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'purchase': MunjiPurchase.objects.order_by('pk').values_list('pk', flat=True).first(),
+    }
+
+
+def _purchase(i, ctx):
+    return {
+        'total_bags': 10,
+        'buying_quantity_munji': '25.00',
+        'munji_price_per_unit': '120.00',
+        'payment_type': MunjiPurchase.CREDIT,
+    }
+
+
+SCENARIOS = [
+    Scenario('api-root', 'api-root'),
+    Scenario('payment-choices', 'payment-choices'),
+    Scenario('recent_purchases', 'recent_purchases'),
+    Scenario('reports', 'reports'),
+    Scenario('dashboard', 'dashboard'),
+    Scenario('reports-monthly-by-category', 'reports', query='granularity=month&group_by=category'),
+    Scenario('supplier-list', 'supplier-list'),
+    Scenario('supplier-search-prefix', 'supplier-list', query='q=mi'),
+    Scenario('supplier-search-substring', 'supplier-list', query='q=son'),
+    Scenario('category-search', 'category-list', query='q=ric'),
+    Scenario('supplier-detail', 'supplier-detail', Supplier),
+    Scenario('category-list', 'category-list'),
+    Scenario('category-detail', 'category-detail', Category),
+    Scenario('munjipurchase-list', 'munjipurchase-list'),
+    Scenario('munjipurchase-list-page-2', 'munjipurchase-list', query='page=2'),
+    Scenario('munjipurchase-list-cursor', 'munjipurchase-list', query='pagination=cursor'),
+    Scenario('munjipurchase-list-sparse', 'munjipurchase-list', query='fields=id,supplier,total_munji_cost'),
+    Scenario('munjipurchase-list-expand-expenses', 'munjipurchase-list', query='expand=expenses&page_size=50'),
+    Scenario('munjipurchase-list-cash', 'munjipurchase-list', query='payment_type=cash'),
+    Scenario('munjipurchase-list-date-range', 'munjipurchase-list', query='start_date={recent}&end_date={today}'),
+    Scenario('munjipurchase-list-category', 'munjipurchase-list', query='category={category}&start_date={recent}'),
+    Scenario('munjipurchase-detail', 'munjipurchase-detail', MunjiPurchase),
+    Scenario('munjipurchase-expenses', 'munjipurchase-expenses', MunjiPurchase),
+    Scenario('munjipurchase-export', 'munjipurchase-export', query='format=csv&start_date={recent}'),
+    Scenario('globalsettings-list', 'globalsettings-list'),
+    Scenario('globalsettings-detail', 'globalsettings-detail', GlobalSettings),
+    Scenario('globalsettings-as-of', 'globalsettings-as-of', query='date={today}'),
+    Scenario('expense-list', 'expense-list'),
+    Scenario('expense-detail', 'expense-detail', Expense),
+    Scenario('expense-export', 'expense-export', query='format=ndjson&start_date={recent}'),
+    Scenario('miscellaneouscost-list', 'miscellaneouscost-list'),
+    Scenario('miscellaneouscost-detail', 'miscellaneouscost-detail', MiscellaneousCost),
+    Scenario('miscellaneouscost-export', 'miscellaneouscost-export', query='format=csv'),
+    Scenario('riceproduction-export', 'riceproduction-export', query='format=csv'),
+    Scenario('schema-json', 'schema-json'),
+    Scenario('schema-swagger-ui', 'schema-swagger-ui'),
+    Scenario('schema-redoc', 'schema-redoc'),
+    Scenario('admin-index', 'admin:index'),
+    Scenario('metrics', 'metrics'),
+    # Writes run last so the reads above see the seeded data only.
+    Scenario('supplier-create', 'supplier-list', method='post', data=lambda i, ctx: {'name': f'Benchmark Supplier {i}'}),
+    Scenario('category-create', 'category-list', method='post', data=lambda i, ctx: {'name': f'Benchmark Category {i}'}),
+    Scenario('munjipurchase-create', 'munjipurchase-list', method='post', data=_purchase),
+    # Every iteration after the first replays the first one's response.
+    Scenario('munjipurchase-create-retry', 'munjipurchase-list', method='post', data=_purchase,
+             headers={'Idempotency-Key': 'benchmark-retry'}),
+    Scenario('munjipurchase-bulk', 'munjipurchase-bulk', method='post', data=lambda i, ctx: [_purchase(i, ctx)] * 5),
+    Scenario('expense-create', 'expense-list', method='post', data=lambda i, ctx: {
+        'munji_purchase': ctx['purchase'], 'title': 'Labor', 'amount': '10.00',
+    }),
+    Scenario('miscellaneouscost-create', 'miscellaneouscost-list', method='post', data=lambda i, ctx: {
+        'title': 'Diesel', 'amount': '10.00',
+    }),
+    # The job reads follow job-create, which queues the job they read.
+    Scenario('job-create', 'job-list', method='post', data=lambda i, ctx: {'kind': 'report'}),
+    Scenario('job-list', 'job-list'),
+    Scenario('job-detail', 'job-detail', Job),
+    Scenario('job-result', 'job-result', Job),
+    Scenario('job-cancel', 'job-cancel', Job, method='post', data=lambda i, ctx: {}),
+]
@@ -0,0 +1,68 @@
+"""
+Microbenchmark of list serialization: the DRF serializer against the
+values_list() row encoder from munji_app.fastlist, over the same rows.
+
+Both sides are timed from the query to the list of dicts, since reading
+model instances instead of tuples is part of what the encoder saves.
+"""
+import time
+from dataclasses import dataclass
+from statistics import median
+
+from munji_app.fastlist import row_encoder
+from munji_app.models import Category, Expense, MiscellaneousCost, MunjiPurchase, RiceProduction, Supplier
+from munji_app.serializers import (
+    ChoiceSerializer, ExpenseSerializer, MiscellaneousCostSerializer, MunjiPurchaseSerializer,
+    RiceProductionSerializer,
+)
+
+
+@dataclass
+class Case:
+    name: str
+    serializer_class: type
+    queryset: object
+
+    def rows(self, count):
+        return self.queryset().order_by('-created_at', '-id')[:count]
+
+
+CASES = [
+    Case('purchases', MunjiPurchaseSerializer, lambda: MunjiPurchase.objects.select_related('supplier', 'category')),
+    Case('expenses', ExpenseSerializer, lambda: Expense.objects.all()),
+    Case('production', RiceProductionSerializer, lambda: RiceProduction.objects.all()),
+    Case('miscellaneous-costs', MiscellaneousCostSerializer, lambda: MiscellaneousCost.objects.all()),
+    Case('suppliers', ChoiceSerializer, lambda: Supplier.objects.all()),
+    Case('categories', ChoiceSerializer, lambda: Category.objects.all()),
+]
+
+
+def serialize(case, count):
+    return case.serializer_class(case.rows(count), many=True).data
+
+
+def encode(case, count):
+    encoder = row_encoder(case.serializer_class)
+    return encoder.encode_many(case.rows(count).values_list(*encoder.lookups, named=True))
+
+
+def _median_ms(function, case, count, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function(case, count)
+        timings.append((time.perf_counter() - started) * 1000)
+    return median(timings)
+
+
+def measure(case, count, iterations):
+    """{'rows', 'serializer_ms', 'encoder_ms', 'speedup'} for `count` rows of `case`."""
+    rows = len(encode(case, count))
+    serializer_ms = _median_ms(serialize, case, count, iterations)
+    encoder_ms = _median_ms(encode, case, count, iterations)
+    return {
+        'rows': rows,
+        'serializer_ms': round(serializer_ms, 3),
+        'encoder_ms': round(encoder_ms, 3),
+        'speedup': round(serializer_ms / encoder_ms, 2) if encoder_ms else None,
+    }
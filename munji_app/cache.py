@@ -0,0 +1,153 @@
+"""
+Change stamps and read-through caching.
+
+A change stamp is a (token, changed_at) pair kept in the Django cache
+under a name. Writers `touch()` the name; readers compare the stamp with
+the one their cached copy was built from, so a stale copy is never served
+once the write is visible. Every munji_app model has a stamp named after
+its label, touched on save and delete (see signals.py) and by the code
+paths that bypass those signals (queryset.update, bulk_create).
+
+Cached values live in two layers: a process-local dict, and the
+MUNJI_CACHE alias (locmem by default). Point that alias at a shared
+backend such as Redis or Memcached when several worker processes must
+see each other's writes; until then conditional GETs are not answered
+and the process-local dict is not used, so another worker's write shows
+within MUNJI_CACHE_TIMEOUT (see is_shared()). Async code calls the cache synchronously too:
+these are in-memory or single round-trip calls, cheaper than a hop to
+the sync thread.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+STAMP_KEY = 'munji:stamp:{name}'
+VALUE_KEY = 'munji:value:{name}:{token}'
+# Backends whose entries only the writing process sees.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# name -> (token, value); replaced wholesale, never mutated in place.
+_local = {}
+
+
+def _cache():
+    return caches[settings.MUNJI_CACHE]
+
+
+def stamp(name):
+    """Return the current (token, changed_at) change stamp for `name`."""
+    current = _cache().get(STAMP_KEY.format(name=name))
+    if current is None:
+        # Unknown or evicted: start a new stamp so nothing cached earlier matches.
+        _cache().add(STAMP_KEY.format(name=name), (uuid.uuid4().hex, time.time()), timeout=None)
+        current = _cache().get(STAMP_KEY.format(name=name))
+    return current
+
+
+def _new_stamp(name):
+    _cache().set(STAMP_KEY.format(name=name), (uuid.uuid4().hex, time.time()), timeout=None)
+
+
+def touch(name):
+    """
+    Mark `name` as changed. The stamp is replaced immediately, so reads in
+    the writing transaction see the change, and again on commit, so a copy
+    other connections built from pre-commit data is not kept.
+    """
+    _new_stamp(name)
+    transaction.on_commit(lambda: _new_stamp(name))
+
+
+def is_shared():
+    """Whether every process serving requests sees the same stamps."""
+    if settings.MUNJI_SINGLE_PROCESS:
+        return True
+    return settings.CACHES[settings.MUNJI_CACHE]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def model_stamp(model):
+    return stamp(model._meta.label_lower)
+
+
+def touch_model(model):
+    touch(model._meta.label_lower)
+
+
+def _local_get(name, token):
+    """
+    The process-local copy of `name` built under `token`, if any. Only
+    used when the stamps are shared: with a per-process cache, another
+    worker's write never touches this process's stamp, and the copy would
+    be served forever.
+    """
+    if not is_shared():
+        return None
+    cached = _local.get(name)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+    return None
+
+
+def _local_set(name, token, value):
+    if is_shared():
+        _local[name] = (token, value)
+
+
+def read_through(name, loader):
+    """Return `loader()`'s value for `name`, reusing it until `name` is touched."""
+    token, _ = stamp(name)
+    value = _local_get(name, token)
+    if value is not None:
+        return value
+
+    key = VALUE_KEY.format(name=name, token=token)
+    value = _cache().get(key)
+    if value is None:
+        value = loader()
+        _cache().set(key, value, timeout=settings.MUNJI_CACHE_TIMEOUT)
+    _local_set(name, token, value)
+    return value
+
+
+async def aread_through(name, aloader):
+    """read_through() for async code: `aloader` is awaited on a miss."""
+    token, _ = stamp(name)
+    value = _local_get(name, token)
+    if value is not None:
+        return value
+
+    key = VALUE_KEY.format(name=name, token=token)
+    value = _cache().get(key)
+    if value is None:
+        value = await aloader()
+        _cache().set(key, value, timeout=settings.MUNJI_CACHE_TIMEOUT)
+    _local_set(name, token, value)
+    return value
+
+
+def cached(name, key, loader, timeout=None):
+    """
+    Return `loader()`'s value for `key`, reusing it until `name` is touched
+    or for `timeout` seconds (default MUNJI_CACHE_TIMEOUT). Unlike
+    read_through(), values are kept only in the shared cache, so a stamp
+    can cover any number of keys (e.g. one per search query).
+    """
+    token, _ = stamp(name)
+    cache_key = VALUE_KEY.format(name=f'{name}:{key}', token=token)
+    value = _cache().get(cache_key)
+    if value is None:
+        value = loader()
+        _cache().set(cache_key, value, timeout=timeout or settings.MUNJI_CACHE_TIMEOUT)
+    return value
+
+
+def clear():
+    """Drop every cached value and stamp (used between tests)."""
+    _local.clear()
+    _cache().clear()
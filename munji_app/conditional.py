@@ -0,0 +1,94 @@
+"""
+Conditional GET support (ETag / Last-Modified) driven by model change stamps.
+
+A response's validators are derived from the change stamps of the models
+it is built from, plus the request path, query string and Accept header.
+They are computed before the view runs, so a matching If-None-Match or
+If-Modified-Since is answered with a 304 without touching the database.
+
+A stamp is only current in the processes that can see the writer's cache,
+so nothing here runs unless cache.is_shared(): with a per-process cache
+and several workers, one that missed a write would keep answering 304.
+"""
+import hashlib
+import math
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import cache
+
+
+def get_validators(request, models):
+    """Return (etag, last_modified timestamp) for `request` served from `models`."""
+    stamps = [cache.model_stamp(model) for model in models]
+    key = '|'.join(
+        [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        + [token for token, _ in stamps]
+    )
+    etag = '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+    last_modified = math.ceil(max(changed_at for _, changed_at in stamps))
+    return etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin answering conditional GETs from change stamps.
+    `conditional_models` lists every model the responses read; it defaults
+    to the queryset's model.
+    """
+    conditional_models = ()
+    validators = None
+
+    def get_conditional_models(self):
+        return self.conditional_models or (self.queryset.model,)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if request.method in ('GET', 'HEAD') and cache.is_shared():
+            self.validators = get_validators(request, self.get_conditional_models())
+            etag, last_modified = self.validators
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.validators is not None:
+            set_validators(response, *self.validators)
+        return response
+
+
+def conditional_get(*models):
+    """The ConditionalGetMixin behaviour for @api_view functions."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not cache.is_shared():
+                return view(request, *args, **kwargs)
+            etag, last_modified = get_validators(request, models)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return set_validators(response, etag, last_modified)
+        return wrapped
+    return decorator
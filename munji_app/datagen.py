@@ -0,0 +1,127 @@
+"""
+Row generators for the `generate_data` command.
+
+Each function builds one chunk of rows as plain tuples from its own
+seeded random generator, so chunks can be produced in worker processes in
+any order and still give the same data for the same seed. Nothing here
+touches the database; related rows refer to each other by index and the
+command maps those to primary keys when loading.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from faker import Faker
+
+CATEGORIES = ["Paddy", "Wheat", "Corn", "Rice"]
+EXPENSE_TYPES = ["Transportation", "Labor", "Storage", "Handling", "Inspection", "Documentation", "Taxes", "Miscellaneous"]
+PAYMENT_TYPES = ["Cash", "Credit"]
+
+
+def d2(x):
+    return Decimal(x).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _rng(seed, name, number):
+    return random.Random(f"{seed}:{name}:{number}")
+
+
+def _faker(rng):
+    fake = Faker()
+    fake.seed_instance(rng.random())
+    return fake
+
+
+def _moment(rng, start, span):
+    return start + timedelta(seconds=rng.uniform(0, span))
+
+
+def supplier_names(seed, count):
+    """`count` distinct company names."""
+    fake = _faker(_rng(seed, 'suppliers', 0))
+    names, seen = [], {}
+    for _ in range(count):
+        name = fake.company()
+        seen[name] = seen.get(name, 0) + 1
+        names.append(name if seen[name] == 1 else f"{name} {seen[name]}")
+    return names
+
+
+def purchases(task):
+    """
+    One chunk of purchases with their expenses.
+    Returns (purchases, expenses): a purchase is (supplier index, category
+    index, bags, quantity, price per unit, total price, landed cost, expense
+    count, payment type, created_at); an expense is (index of its purchase
+    in the chunk, title, amount, created_at).
+    """
+    seed, number, count, expense_count, suppliers, categories, start, span = task
+    rng = _rng(seed, 'purchases', number)
+    end = start + timedelta(seconds=span)
+
+    rows = []
+    for _ in range(count):
+        qty = d2(rng.uniform(10, 200))
+        price = d2(rng.uniform(50, 500))
+        rows.append([
+            rng.randrange(suppliers) if suppliers else None,
+            rng.randrange(categories),
+            rng.randint(10, 100),
+            qty,
+            price,
+            d2(qty * price),
+            d2(qty * price),
+            0,
+            rng.choice(PAYMENT_TYPES),
+            _moment(rng, start, span),
+        ])
+
+    expenses = []
+    for _ in range(expense_count if rows else 0):
+        index = rng.randrange(count)
+        amount = d2(rng.uniform(50, 500))
+        purchase = rows[index]
+        purchase[6] += amount
+        purchase[7] += 1
+        created_at = min(purchase[9] + timedelta(seconds=rng.uniform(0, 3 * 86400)), end)
+        expenses.append((index, rng.choice(EXPENSE_TYPES), amount, created_at))
+    return [tuple(row) for row in rows], expenses
+
+
+def productions(task):
+    """
+    One chunk of rice production runs, each consuming at most `max_quantity`
+    munji. Returns tuples in RiceProduction field order, created_at last.
+    """
+    seed, number, count, max_quantity, start, span = task
+    rng = _rng(seed, 'production', number)
+    rows = []
+    for _ in range(count):
+        qprod = d2(max_quantity * Decimal(rng.uniform(0.5, 1.0)))
+        rice_price = d2(rng.uniform(50, 200))
+        total_quality = d2(float(qprod) * rng.uniform(0.7, 0.95))
+        rows.append((
+            qprod,
+            d2(rng.uniform(100, 500)),
+            d2(rng.uniform(200, 1000)),
+            d2(rng.uniform(0.01, 0.1)),
+            d2(rng.uniform(0.7, 0.95)),
+            rice_price,
+            total_quality,
+            d2(total_quality * rice_price),
+            d2(rng.uniform(5, 20)),
+            d2(rng.uniform(10, 100)),
+            _moment(rng, start, span),
+        ))
+    return rows
+
+
+def miscellaneous_costs(task):
+    """One chunk of miscellaneous costs as (title, amount, created_at)."""
+    seed, number, count, start, span = task
+    rng = _rng(seed, 'miscellaneous', number)
+    fake = _faker(rng)
+    return [
+        (fake.sentence(nb_words=4), d2(rng.uniform(10, 1000)), _moment(rng, start, span))
+        for _ in range(count)
+    ]
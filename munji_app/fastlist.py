@@ -0,0 +1,206 @@
+"""
+Fast list serialization from values_list() rows.
+
+A ModelSerializer builds a model instance per row and walks every field's
+get_attribute()/to_representation() for it. For list responses the same
+output can be produced from plain values_list() rows: row_encoder()
+compiles a serializer class once into the lookups to select (related
+names become joins, e.g. supplier.name -> supplier__name) and a converter
+per field (Decimal quantizing, ISO 8601 datetimes), and FastListMixin uses
+it for the list action.
+
+Only serializers made of plain model-backed fields can be compiled; for
+anything else (method fields, nested serializers, hyperlinks, sources
+that are not database columns) row_encoder() returns None and callers use
+the serializer as usual.
+"""
+import decimal
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+# Keyset pagination reads these from every row.
+KEY_FIELDS = ('id', 'created_at')
+
+# Fields whose representation of a database value is the value itself.
+IDENTITY_FIELDS = (
+    serializers.BooleanField, serializers.CharField, serializers.ChoiceField,
+    serializers.IntegerField, serializers.PrimaryKeyRelatedField,
+)
+UNSUPPORTED_FIELDS = (
+    serializers.BaseSerializer, serializers.HyperlinkedRelatedField, serializers.ManyRelatedField,
+    serializers.SerializerMethodField, serializers.HiddenField,
+)
+
+_SKIP = object()
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _datetime_converter(field):
+    if getattr(field, 'format', api_settings.DATETIME_FORMAT) != ISO_8601:
+        return field.to_representation
+    enforce_timezone = field.enforce_timezone
+
+    def convert(value):
+        value = enforce_timezone(value).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _date_converter(field):
+    if getattr(field, 'format', api_settings.DATE_FORMAT) != ISO_8601:
+        return field.to_representation
+    return lambda value: value.isoformat()
+
+
+def _converter(field):
+    """A function giving `field`'s representation of a non-null column value (None for the value itself)."""
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        return _date_converter(field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None:
+        return field.pk_field.to_representation
+    if isinstance(field, IDENTITY_FIELDS):
+        return None
+    return field.to_representation
+
+
+def model_lookup(model, source_attrs):
+    """
+    The values() lookup for a dotted serializer source, and whether a null
+    can come from a missing related row (rather than a null column).
+    Raises FieldDoesNotExist if the source is not a chain of model fields.
+    """
+    nullable_join = False
+    for depth, attr in enumerate(source_attrs):
+        model_field = model._meta.get_field(attr)
+        if depth < len(source_attrs) - 1:
+            if not model_field.is_relation or model_field.many_to_many or model_field.one_to_many:
+                raise FieldDoesNotExist(attr)
+            nullable_join = nullable_join or model_field.null
+            model = model_field.related_model
+        elif model_field.many_to_many or model_field.one_to_many:
+            raise FieldDoesNotExist(attr)
+        elif nullable_join and model_field.null:
+            # A null could mean either; the serializer treats them differently.
+            raise FieldDoesNotExist(attr)
+    return '__'.join(source_attrs), nullable_join
+
+
+class RowEncoder:
+    """Turns values_list(*lookups) rows into the dicts a serializer class would produce."""
+
+    def __init__(self, lookups, columns):
+        self.lookups = lookups
+        self.columns = columns
+
+    def encode(self, row):
+        data = {}
+        for name, index, convert, missing in self.columns:
+            value = row[index]
+            if value is None:
+                if missing is _SKIP:
+                    continue
+                data[name] = missing
+            elif convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+
+    def encode_many(self, rows):
+        encode = self.encode
+        return [encode(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def row_encoder(serializer_class, fields=None):
+    """
+    The RowEncoder for `serializer_class`, limited to the field names in
+    `fields` (a frozenset) if given, or None if it cannot be compiled.
+    """
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    lookups, columns = [], []
+    for field in serializer._readable_fields:
+        if fields is not None and field.field_name not in fields:
+            continue
+        if isinstance(field, UNSUPPORTED_FIELDS) or field.source == '*':
+            return None
+        try:
+            lookup, nullable_join = model_lookup(model, field.source_attrs)
+        except FieldDoesNotExist:
+            return None
+        missing = None
+        if nullable_join:
+            # What Field.get_attribute() gives when the related row is missing.
+            if field.default is not empty:
+                if callable(field.default):
+                    return None
+                missing = field.default
+            elif not field.allow_null:
+                missing = _SKIP
+        if lookup not in lookups:
+            lookups.append(lookup)
+        columns.append((field.field_name, lookups.index(lookup), _converter(field), missing))
+    for lookup in KEY_FIELDS:
+        if lookup not in lookups:
+            try:
+                model._meta.get_field(lookup)
+            except FieldDoesNotExist:
+                continue
+            lookups.append(lookup)
+    return RowEncoder(tuple(lookups), tuple(columns))
+
+
+class FastListMixin:
+    """
+    Viewset mixin serving the list action from values_list() rows through
+    row_encoder(), when the list serializer can be compiled. The paginator
+    must accept `lookups` (see pagination.PageNumberOrCursorPagination).
+    Placed after sparse.SparseFieldsMixin, it honours ?fields= and ?expand=.
+    """
+
+    def sparse_fields(self):
+        return None
+
+    def expansions(self):
+        return ()
+
+    def expand_rows(self, rows, data):
+        return data
+
+    def get_row_encoder(self):
+        return row_encoder(self.get_serializer_class(), self.sparse_fields())
+
+    def list(self, request, *args, **kwargs):
+        encoder = self.get_row_encoder()
+        if encoder is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        if self.paginator is None:
+            rows = list(queryset.values_list(*encoder.lookups, named=True))
+            return Response(self.expand_rows(rows, encoder.encode_many(rows)))
+        page = self.paginator.paginate_queryset(queryset, request, view=self, lookups=encoder.lookups)
+        return self.get_paginated_response(self.expand_rows(page, encoder.encode_many(page)))
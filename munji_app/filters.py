@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import archive
+
+
+def parse_day(value, param):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValidationError({'error': f'{param} must be given as YYYY-MM-DD.'})
+
+
+class DateRangeFilterMixin:
+    """
+    ?start_date= / ?end_date= (YYYY-MM-DD, inclusive) on created_at, and
+    ?category= (id or name) through `category_lookup` when the model has one.
+    Lists and exports starting on or before the newest archived row also
+    read the archive (see archive.py).
+    """
+    category_lookup = None
+    archive_actions = ('list', 'export')
+    # archive.boundaries(), when the caller loaded them already (async views).
+    archive_boundaries = None
+
+    def get_queryset(self):
+        start_date = self.request.query_params.get('start_date')
+        end_date = self.request.query_params.get('end_date')
+        category = self.request.query_params.get('category')
+
+        if start_date:
+            start_date = timezone.make_aware(parse_day(start_date, 'start_date'))
+            model = type(self).queryset.model
+            if self.action in self.archive_actions and archive.reaches(model, start_date, self.archive_boundaries):
+                self.queryset = archive.with_archive(type(self).queryset)
+
+        queryset = super().get_queryset()
+        if start_date:
+            queryset = queryset.filter(created_at__gte=start_date)
+
+        if end_date:
+            end_date = timezone.make_aware(parse_day(end_date, 'end_date') + timedelta(days=1))
+            queryset = queryset.filter(created_at__lt=end_date)
+
+        if category and self.category_lookup:
+            if category.isdigit():
+                queryset = queryset.filter(**{f'{self.category_lookup}_id': int(category)})
+            else:
+                queryset = queryset.filter(**{f'{self.category_lookup}__name__iexact': category})
+
+        return queryset
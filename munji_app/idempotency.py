@@ -0,0 +1,150 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client that may retry a POST sends an Idempotency-Key header with a
+value unique to the operation. The first request with a key claims it by
+inserting an IdempotencyKey row (unique per key and route) and commits
+that claim before running. It then runs the handler and stores the
+response in one transaction, so a write is never kept without the
+response that replays it. A retry with the same key and body gets the
+stored response back, with `Idempotent-Replayed: true`, and never reaches
+the handler: the ledger is charged once. A duplicate arriving while the
+first request still runs waits up to IDEMPOTENCY_WAIT seconds for its
+response instead of running again, then answers 409.
+
+Only successful (2xx) responses are kept. Any other outcome releases the
+key, so the client can retry once the cause is fixed. Reusing a key with
+a different body is rejected with 422. Keys expire IDEMPOTENCY_KEY_TTL
+seconds after they were claimed; `manage.py purge_idempotency_keys`
+deletes expired rows.
+"""
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# Seconds between checks of a claim another request holds.
+POLL_INTERVAL = 0.05
+# A claim still running after this many seconds was left by a crashed worker.
+ABANDONED_AFTER = 120
+
+
+def _usable(record, now):
+    if record.expires_at <= now:
+        return False
+    return record.status_code is not None or record.created_at > now - timedelta(seconds=ABANDONED_AFTER)
+
+
+def claim(key, route, fingerprint):
+    """
+    Return (record, claimed): a new claim of `key` on `route`, or the
+    record of the request that holds it already. Expired and abandoned
+    records are replaced.
+    """
+    while True:
+        now = timezone.now()
+        record = IdempotencyKey.objects.filter(key=key, route=route).first()
+        if record is not None:
+            if _usable(record, now):
+                return record, False
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    key=key, route=route, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+            return record, True
+        except IntegrityError:
+            # Another request claimed it in between: read its record.
+            continue
+
+
+def _replay(record):
+    headers = {REPLAYED_HEADER: 'true'}
+    if record.location:
+        headers['Location'] = record.location
+    return Response(record.response, status=record.status_code, headers=headers)
+
+
+def respond(request, handler):
+    """
+    The response of `handler()` for `request`, run at most once per
+    Idempotency-Key. Requests without the header just run it.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler()
+    if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        return Response({'error': f'{HEADER} must be 1 to 255 characters.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    fingerprint = hashlib.sha256(request.body).hexdigest()
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while True:
+        record, claimed = claim(key, request.path, fingerprint)
+        if claimed:
+            break
+        if record.fingerprint != fingerprint:
+            return Response({'error': f'{HEADER} was already used with a different request body.'},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if record.status_code is not None:
+            return _replay(record)
+        if time.monotonic() >= deadline:
+            return Response({'error': f'A request with this {HEADER} is still in progress.'},
+                            status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        with transaction.atomic():
+            response = handler()
+            if status.is_success(response.status_code):
+                IdempotencyKey.objects.filter(pk=record.pk).update(
+                    status_code=response.status_code, response=response.data,
+                    location=response.get('Location', ''),
+                )
+                return response
+    except BaseException:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        raise
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+    return response
+
+
+def idempotent(method):
+    """Decorate a viewset handler method (e.g. a POST @action) to honour Idempotency-Key."""
+    @wraps(method)
+    def handler(view, request, *args, **kwargs):
+        return respond(request, lambda: method(view, request, *args, **kwargs))
+    return handler
+
+
+class IdempotencyMixin:
+    """Idempotency-Key support for create()."""
+
+    def create(self, request, *args, **kwargs):
+        return respond(request, lambda: super(IdempotencyMixin, self).create(request, *args, **kwargs))
+
+
+def purge(batch_size=1000, progress=None):
+    """Delete expired keys, `batch_size` per query. Returns the number deleted."""
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+        if progress:
+            progress(deleted)
@@ -0,0 +1,281 @@
+"""
+Background jobs, queued in the Job table and run by `manage.py run_jobs`.
+
+A task is a function registered with @task(name); it is called with a
+JobContext and the job's params and returns a JSON-serializable result.
+Requests only insert a Job row (submit()) and read it back, so long
+rebuilds and reports never hold a request worker. The worker is a thread
+pool in its own process: no broker, the table is the queue.
+
+Workers claim the oldest queued job with a conditional UPDATE, so any
+number of them can share the table; each runs at most `concurrency` jobs
+at once. cancel() stops a queued job at once and asks a running one to
+stop: its next JobContext.update() raises Cancelled. Progress reported
+inside a transaction is written when the transaction ends, because on
+SQLite nothing else can write while it is open.
+
+A worker stamps heartbeat_at on the jobs it runs every HEARTBEAT_INTERVAL
+seconds. A running job without a heartbeat for ABANDONED_AFTER seconds
+was left by a crashed worker; the next worker to beat marks it failed, so
+its client stops polling and can submit it again. Should the job's own
+worker finish it after all, that outcome is dropped.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import landed_costs, rollups
+from .models import Job, MunjiPurchase
+from .serializers import ReportRowSerializer
+
+logger = logging.getLogger(__name__)
+
+# Least time between two progress writes of a job, in seconds.
+PROGRESS_INTERVAL = 0.5
+# Seconds between a worker's heartbeats for the jobs it runs.
+HEARTBEAT_INTERVAL = 15
+# A running job without a heartbeat for this many seconds was left by a
+# crashed worker. Generous, because a worker cannot write its heartbeats
+# while one of its tasks holds a transaction open on SQLite.
+ABANDONED_AFTER = 600
+
+
+class Cancelled(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Task:
+    function: Callable
+    # Called with the submitted params; raises ValueError if they are invalid.
+    validate: Optional[Callable] = None
+
+
+TASKS = {}
+
+
+def task(name, validate=None):
+    def register(function):
+        TASKS[name] = Task(function, validate)
+        return function
+    return register
+
+
+def submit(kind, params=None):
+    """Queue a `kind` job. Raises ValueError for an unknown kind or invalid params."""
+    if kind not in TASKS:
+        raise ValueError(f"Unknown job kind {kind!r}; choose from {', '.join(sorted(TASKS))}.")
+    params = params or {}
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object.')
+    if TASKS[kind].validate:
+        TASKS[kind].validate(params)
+    return Job.objects.create(kind=kind, params=params)
+
+
+def cancel(job):
+    """Cancel a queued job, or ask a running one to stop. Finished jobs are left alone."""
+    now = timezone.now()
+    if not Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+        status=Job.CANCELLED, cancel_requested=True, finished_at=now,
+    ):
+        Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def claim(worker):
+    """Mark the oldest queued job as run by `worker` and return its id (None if the queue is empty)."""
+    queued = Job.objects.filter(status=Job.QUEUED)
+    while True:
+        pk = queued.order_by('created_at', 'id').values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        # Another worker may have claimed it since; then try the next one.
+        now = timezone.now()
+        if queued.filter(pk=pk).update(status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now):
+            return pk
+
+
+def fail_abandoned():
+    """Mark running jobs whose worker stopped sending heartbeats as failed; return how many."""
+    now = timezone.now()
+    return (
+        Job.objects.filter(status=Job.RUNNING)
+        .alias(last_seen=Coalesce('heartbeat_at', 'started_at'))
+        .filter(last_seen__lt=now - timedelta(seconds=ABANDONED_AFTER))
+        .update(status=Job.FAILED, error='Abandoned: its worker stopped responding.', finished_at=now)
+    )
+
+
+class JobContext:
+    """Handed to a task to report progress; raises Cancelled when the job is cancelled."""
+
+    def __init__(self, job):
+        self.job = job
+        self._pending = {}
+        self._written_at = 0.0
+
+    def update(self, progress=None, message=None):
+        """Record `progress` (0-100) and/or `message`, and stop here if the job was cancelled."""
+        if progress is not None:
+            self._pending['progress'] = max(0, min(int(progress), 100))
+        if message is not None:
+            self._pending['message'] = message[:255]
+        if connection.in_atomic_block or time.monotonic() - self._written_at < PROGRESS_INTERVAL:
+            return
+        jobs = Job.objects.filter(pk=self.job.pk)
+        if self._pending:
+            jobs.update(**self._pending)
+            self._pending = {}
+        self._written_at = time.monotonic()
+        if jobs.filter(cancel_requested=True).exists():
+            raise Cancelled
+
+    def flush(self):
+        """Fields not yet written, for the final update."""
+        pending, self._pending = self._pending, {}
+        return pending
+
+
+def run(pk):
+    """Run the claimed job `pk` to completion and store its outcome."""
+    job = Job.objects.get(pk=pk)
+    context = JobContext(job)
+    try:
+        if job.kind not in TASKS:
+            raise ValueError(f'Unknown job kind {job.kind!r}.')
+        result = TASKS[job.kind].function(context, **job.params)
+    except Cancelled:
+        outcome = {'status': Job.CANCELLED}
+    except Exception as e:
+        logger.exception('Job %s failed', job)
+        outcome = {'status': Job.FAILED, 'error': f'{type(e).__name__}: {e}'}
+    else:
+        outcome = {'status': Job.SUCCEEDED, 'result': result, 'progress': 100}
+    # Only while the job is still ours: if it was failed as abandoned
+    # meanwhile (or claimed again), that outcome stands.
+    if not Job.objects.filter(pk=pk, status=Job.RUNNING, worker=job.worker).update(
+        **{**context.flush(), **outcome, 'finished_at': timezone.now()},
+    ):
+        logger.warning('Job %s finished as %s, but it was no longer running on this worker; outcome dropped',
+                       job, outcome['status'])
+        return Job.objects.values_list('status', flat=True).get(pk=pk)
+    return outcome['status']
+
+
+class Worker:
+    """Claims queued jobs and runs up to `concurrency` of them at once in threads."""
+
+    def __init__(self, concurrency=None, poll_interval=None, name=None):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stop = threading.Event()
+
+    def _run(self, pk):
+        try:
+            return run(pk)
+        finally:
+            connection.close()
+
+    def beat(self):
+        """Stamp a heartbeat on the jobs this worker runs and fail those abandoned by other workers."""
+        try:
+            Job.objects.filter(status=Job.RUNNING, worker=self.name).update(heartbeat_at=timezone.now())
+            abandoned = fail_abandoned()
+        except DatabaseError:
+            # SQLite is locked by a task's transaction; try again next time.
+            logger.warning('Worker %s could not write its heartbeat', self.name, exc_info=True)
+            return
+        if abandoned:
+            logger.warning('Failed %d job(s) abandoned by their worker', abandoned)
+
+    def work(self, burst=False):
+        """Run jobs until stop is set, or, with `burst`, until the queue is empty."""
+        running = set()
+        beaten = None
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            while not self.stop.is_set():
+                if beaten is None or time.monotonic() - beaten >= HEARTBEAT_INTERVAL:
+                    self.beat()
+                    beaten = time.monotonic()
+                running = {future for future in running if not future.done()}
+                pk = claim(self.name) if len(running) < self.concurrency else None
+                if pk is not None:
+                    running.add(pool.submit(self._run, pk))
+                    continue
+                if burst and not running:
+                    break
+                self.stop.wait(self.poll_interval)
+
+
+# --- TASKS ---
+def _allow(*names):
+    """A validator rejecting params other than `names`."""
+    def validate(params):
+        unknown = sorted(set(params) - set(names))
+        if unknown:
+            raise ValueError(f"Unknown params: {', '.join(unknown)}.")
+    return validate
+
+
+def _validate_report(params):
+    _allow('start_date', 'end_date', 'granularity', 'group_by')(params)
+    if not all(isinstance(value, str) for value in params.values()):
+        raise ValueError('Report params must be strings, as in the /api/reports/ query string.')
+    rollups.report_options(params)
+
+
+def _validate_size(name):
+    def validate(params):
+        _allow(name)(params)
+        size = params.get(name, 1)
+        if not isinstance(size, int) or isinstance(size, bool) or size < 1:
+            raise ValueError(f'{name} must be a positive integer.')
+    return validate
+
+
+@task('report', validate=_validate_report)
+def report_task(context, **params):
+    """/api/reports/ over any range, as a job."""
+    options = rollups.report_options(params)
+    context.update(message='Aggregating rollups')
+    return {
+        'granularity': options['granularity'],
+        'results': ReportRowSerializer(rollups.report(**options), many=True).data,
+    }
+
+
+@task('rebuild_rollups', validate=_validate_size('chunk_size'))
+def rebuild_rollups_task(context, chunk_size=10000):
+    sources = ['MunjiPurchase', 'Expense', 'MiscellaneousCost', 'RiceProduction']
+
+    def progress(model, number):
+        context.update(
+            progress=100 * sources.index(model.__name__) // len(sources),
+            message=f'{model.__name__}: chunk {number}',
+        )
+
+    return {'rows': rollups.rebuild(chunk_size=chunk_size, progress=progress)}
+
+
+@task('repair_landed_costs', validate=_validate_size('batch_size'))
+def repair_landed_costs_task(context, batch_size=2000):
+    total = MunjiPurchase.objects.count() or 1
+
+    def progress(checked):
+        context.update(progress=100 * checked // total, message=f'{checked} purchases checked')
+
+    return {'fixed': landed_costs.repair(batch_size=batch_size, progress=progress)}
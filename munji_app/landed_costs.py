@@ -0,0 +1,99 @@
+"""
+Landed cost per purchase: `total_munji_cost` is the purchase price plus
+the sum of its expenses, and `expense_count` the number of expenses.
+
+Both are running totals kept by F() updates whenever an expense is
+created, changed or deleted, inside the writing transaction, so listing
+landed costs reads plain columns. `repair()` recomputes them from the
+expenses table for rows written around the signals (bulk_create, raw SQL).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import cache
+from .models import Expense, MunjiPurchase
+
+
+def record(purchase_id, amount, count):
+    """Add `amount` and `count` expenses to the landed cost of one purchase."""
+    if not (amount or count):
+        return
+    MunjiPurchase.objects.filter(pk=purchase_id).update(
+        total_munji_cost=F('total_munji_cost') + amount,
+        expense_count=F('expense_count') + count,
+    )
+    cache.touch_model(MunjiPurchase)
+
+
+def expense_totals(purchase_ids=None):
+    """Return {purchase_id: (expense total, expense count)} from one grouped query."""
+    expenses = Expense.objects.order_by()
+    if purchase_ids is not None:
+        expenses = expenses.filter(munji_purchase_id__in=purchase_ids)
+    rows = expenses.values('munji_purchase_id').annotate(total=Sum('amount'), count=Count('id'))
+    return {row['munji_purchase_id']: (row['total'], row['count']) for row in rows}
+
+
+# --- SIGNAL HANDLERS ---
+def remember_previous(sender, instance, **kwargs):
+    """pre_save: keep the stored purchase and amount so post_save can move the difference."""
+    instance._landed_cost_previous = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._landed_cost_previous = (
+            Expense.objects.filter(pk=instance.pk).values_list('munji_purchase_id', 'amount').first()
+        )
+
+
+def on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_landed_cost_previous', None)
+    if previous is None:
+        record(instance.munji_purchase_id, instance.amount, 1)
+        return
+    purchase_id, amount = previous
+    if purchase_id == instance.munji_purchase_id:
+        record(purchase_id, instance.amount - amount, 0)
+    else:
+        record(purchase_id, -amount, -1)
+        record(instance.munji_purchase_id, instance.amount, 1)
+
+
+def on_delete(sender, instance, **kwargs):
+    record(instance.munji_purchase_id, -instance.amount, -1)
+
+
+# --- REPAIR ---
+def repair(batch_size=2000, progress=None):
+    """
+    Recompute landed cost and expense count for every purchase from one
+    grouped aggregate over expenses, writing only the rows that drifted.
+    `progress`, if given, is called with the number of rows checked so far.
+    Returns the number of purchases corrected.
+    """
+    fixed = checked = 0
+    with transaction.atomic():
+        totals = expense_totals()
+        stale = []
+        purchases = MunjiPurchase.objects.only(
+            'id', 'total_munji_price', 'total_munji_cost', 'expense_count',
+        ).order_by('pk')
+        for purchase in purchases.iterator(chunk_size=batch_size):
+            total, count = totals.get(purchase.pk, (Decimal(0), 0))
+            cost = purchase.total_munji_price + total
+            if (purchase.total_munji_cost, purchase.expense_count) != (cost, count):
+                purchase.total_munji_cost, purchase.expense_count = cost, count
+                stale.append(purchase)
+            checked += 1
+            if len(stale) >= batch_size:
+                MunjiPurchase.objects.bulk_update(stale, ['total_munji_cost', 'expense_count'])
+                fixed += len(stale)
+                stale = []
+            if progress and checked % batch_size == 0:
+                progress(checked)
+        if stale:
+            MunjiPurchase.objects.bulk_update(stale, ['total_munji_cost', 'expense_count'])
+            fixed += len(stale)
+        if fixed:
+            cache.touch_model(MunjiPurchase)
+    return fixed
@@ -0,0 +1,207 @@
+"""
+Ledger service for the GlobalSettings singleton.
+
+Every balance change is applied as a single conditional UPDATE on the
+singleton row ("deduct only if cash_in_hand >= amount"), so concurrent
+writers never overwrite each other's changes and never have to lock the
+row in Python. Callers that also insert a domain row (purchase, expense,
+...) run both inside one ``transaction.atomic()`` block: if the ledger
+refuses the change, the insert is rolled back with it.
+
+Each applied change is also appended to the LedgerEntry journal, and every
+LEDGER_SNAPSHOT_INTERVAL entries the resulting balances are written to a
+LedgerSnapshot, so balances at any past moment can be rebuilt from the
+nearest snapshot plus the short journal tail after it (see `as_of`).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from . import cache, models
+
+BALANCE_FIELDS = ('opening_balance', 'cash_in_hand', 'sales', 'total_munji')
+
+
+def _singleton():
+    return models.GlobalSettings.objects.filter(pk=models.GlobalSettings.SINGLETON_ID)
+
+
+def balances():
+    """Return the current balances as a dict keyed by BALANCE_FIELDS."""
+    return _singleton().values(*BALANCE_FIELDS).get()
+
+
+def _update(deltas, require):
+    """Apply `deltas` to the singleton if it meets `require`; return whether it did."""
+    queryset = _singleton().filter(
+        **{f'{field}__gte': Decimal(minimum) for field, minimum in require.items()}
+    )
+    if deltas:
+        return queryset.update(**{field: F(field) + amount for field, amount in deltas.items()})
+    return queryset.exists()
+
+
+def apply(kind, deltas, require=None, error=None):
+    """
+    Add `deltas` ({field: amount}) to the singleton in one UPDATE and
+    record them in the journal as a `kind` entry.
+
+    `require` maps a field to the minimum value it must hold before the
+    change is applied. If the row does not satisfy it nothing is written
+    and a ValidationError carrying `error` is raised. Returns the balances
+    after the change.
+    """
+    deltas = {field: Decimal(amount) for field, amount in deltas.items() if amount}
+    require = require or {}
+
+    with transaction.atomic():
+        updated = _update(deltas, require)
+        if not updated and not _singleton().exists():
+            # Fresh or flushed database. get_instance() may still be served
+            # from the cache, so create the row itself and try once more.
+            models.GlobalSettings.objects.get_or_create(pk=models.GlobalSettings.SINGLETON_ID)
+            updated = _update(deltas, require)
+        if not updated:
+            raise ValidationError(error or "Insufficient balance.")
+
+        current = balances()
+        if deltas:
+            _journal(kind, deltas, current)
+            cache.touch_model(models.GlobalSettings)
+        return current
+
+
+def _journal(kind, deltas, current):
+    entry = models.LedgerEntry.objects.create(kind=kind, **deltas)
+    if entry.pk % settings.LEDGER_SNAPSHOT_INTERVAL == 0:
+        models.LedgerSnapshot.objects.create(
+            last_entry_id=entry.pk,
+            created_at=entry.created_at,
+            **current,
+        )
+
+
+def as_of(moment):
+    """
+    Return the balances as they stood just before `moment`, or None if the
+    journal does not reach back that far.
+    """
+    snapshot = (
+        models.LedgerSnapshot.objects
+        .filter(created_at__lt=moment)
+        .order_by('-created_at', '-last_entry_id')
+        .first()
+    )
+    if snapshot is None:
+        return None
+
+    tail = models.LedgerEntry.objects.filter(
+        created_at__gte=snapshot.created_at,
+        created_at__lt=moment,
+        id__gt=snapshot.last_entry_id,
+    ).aggregate(**{field: Sum(field) for field in BALANCE_FIELDS})
+
+    return {
+        field: getattr(snapshot, field) + (tail[field] or Decimal(0))
+        for field in BALANCE_FIELDS
+    }
+
+
+# --- ACCOUNTING RULES ---
+def add_capital(amount):
+    return apply(models.LedgerEntry.CAPITAL, {'opening_balance': amount})
+
+
+def add_cash(amount):
+    return apply(
+        models.LedgerEntry.CASH,
+        {'cash_in_hand': amount, 'opening_balance': -amount},
+        require={'opening_balance': amount},
+        error="Not enough capital to convert to cash.",
+    )
+
+
+def deduct_purchase(amount, munji_qty):
+    return apply(
+        models.LedgerEntry.PURCHASE,
+        {'cash_in_hand': -amount, 'total_munji': munji_qty},
+        require={'cash_in_hand': amount},
+        error="Not enough cash in hand for this purchase.",
+    )
+
+
+def change_purchase(amount, munji_qty):
+    """
+    An edited purchase: `amount` more cash paid and `munji_qty` more munji
+    bought. Either is negative when the purchase shrank, and is credited
+    back (munji only while the global total still holds it).
+    """
+    require = {}
+    if amount > 0:
+        require['cash_in_hand'] = amount
+    if munji_qty < 0:
+        require['total_munji'] = -munji_qty
+    return apply(
+        models.LedgerEntry.PURCHASE,
+        {'cash_in_hand': -amount, 'total_munji': munji_qty},
+        require=require,
+        error="Not enough cash in hand for this purchase." if amount > 0 else "Not enough Munji in global total.",
+    )
+
+
+def add_munji(munji_qty):
+    return apply(models.LedgerEntry.PURCHASE, {'total_munji': munji_qty})
+
+
+def consume_munji(munji_qty):
+    return apply(
+        models.LedgerEntry.PRODUCTION,
+        {'total_munji': -munji_qty},
+        require={'total_munji': munji_qty},
+        error="Not enough Munji in global total.",
+    )
+
+
+def deduct_expense(amount):
+    return apply(
+        models.LedgerEntry.EXPENSE,
+        {'cash_in_hand': -amount},
+        require={'cash_in_hand': amount},
+        error="Not enough cash in hand to record expense.",
+    )
+
+
+def deduct_miscellaneous(amount):
+    return apply(
+        models.LedgerEntry.MISCELLANEOUS,
+        {'cash_in_hand': -amount},
+        require={'cash_in_hand': amount},
+        error="Not enough cash in hand to cover miscellaneous cost.",
+    )
+
+
+def adjust(opening_balance=0, cash_in_hand=0, sales=0, total_munji=0):
+    """
+    Manual adjustment from the globals endpoint: `opening_balance` is added
+    to capital, `cash_in_hand` is moved from capital into cash, `sales` and
+    `total_munji` are added as-is.
+    """
+    opening_balance = Decimal(opening_balance)
+    cash_in_hand = Decimal(cash_in_hand)
+    require = {}
+    if cash_in_hand:
+        require['opening_balance'] = cash_in_hand - opening_balance
+    return apply(
+        models.LedgerEntry.ADJUSTMENT,
+        {
+            'opening_balance': opening_balance - cash_in_hand,
+            'cash_in_hand': cash_in_hand,
+            'sales': sales,
+            'total_munji': total_munji,
+        },
+        require=require,
+        error="Not enough capital to move into cash.",
+    )
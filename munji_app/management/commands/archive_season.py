@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from munji_app import archive
+
+
+class Command(BaseCommand):
+    help = "Move purchases, expenses, misc costs and rice production created before a date into the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True,
+                            help="Archive rows created before this day (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Rows moved per transaction (default 1000)")
+
+    def handle(self, *args, **options):
+        try:
+            before = datetime.strptime(options['before'], "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError("--before must be given as YYYY-MM-DD.")
+
+        def progress(model, moved):
+            self.stdout.write(f"  {model.__name__}: {moved} rows archived")
+
+        self.stdout.write(self.style.SUCCESS(f"Archiving rows created before {before}..."))
+        moved = archive.archive_season(before, chunk_size=options['chunk_size'], progress=progress)
+        summary = ', '.join(f"{label}: {rows}" for label, rows in moved.items())
+        self.stdout.write(self.style.SUCCESS(f"✅ Season archived ({summary})."))
@@ -0,0 +1,88 @@
+import platform
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from munji_app.benchmarks import runner
+from munji_app.benchmarks.scenarios import SCENARIOS, context, route_names
+
+DEFAULT_BASELINE = Path(runner.__file__).with_name('baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database through generate_data, time every API route and "
+        "compare with the stored baseline (p95 latency, queries per request, peak memory)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purchases', type=int, default=2000,
+                            help="Purchases to seed; other tables are sized from it (default 2000)")
+        parser.add_argument('--seed', type=int, default=0, help="generate_data seed (default 0)")
+        parser.add_argument('--iterations', type=int, default=20, help="Timed requests per scenario (default 20)")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests per scenario (default 2)")
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+                            help=f"Baseline JSON file (default {DEFAULT_BASELINE})")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed median latency and memory growth over the baseline, as a fraction; p95 may grow twice as much (default 0.25)")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Store this run as the new baseline instead of comparing with it (required "
+                                 "when there is no baseline yet)")
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help="Run only these scenarios")
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options['only']:
+            scenarios = [scenario for scenario in SCENARIOS if scenario.name in options['only']]
+        else:
+            missing = route_names() - {scenario.route for scenario in SCENARIOS}
+            if missing:
+                raise CommandError(f"Routes without a benchmark scenario: {', '.join(sorted(missing))}")
+
+        purchases = options['purchases']
+        meta = {
+            'purchases': purchases,
+            'seed': options['seed'],
+            'iterations': options['iterations'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+        if not options['update_baseline']:
+            if not options['baseline'].exists():
+                raise CommandError(
+                    f"No baseline at {options['baseline']}; record one with --update-baseline "
+                    "(on the machine the comparisons will run on) and commit it."
+                )
+            baseline = runner.load_baseline(options['baseline'])
+            if (baseline['meta']['purchases'], baseline['meta']['seed']) != (purchases, options['seed']):
+                raise CommandError(
+                    f"The baseline was recorded with --purchases {baseline['meta']['purchases']} "
+                    f"--seed {baseline['meta']['seed']}; run with the same options or --update-baseline."
+                )
+
+        self.stdout.write(f"Seeding {purchases} purchases...")
+        try:
+            with runner.seeded_database(purchases, options['seed']):
+                ctx = context()
+
+                def progress(name, result):
+                    self.stdout.write(
+                        f"  {name:<36} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                        f"{result['queries']:3d} queries  {result['peak_kb']:9.1f} KiB"
+                    )
+
+                results = runner.run(scenarios, ctx, options['iterations'], options['warmup'], progress)
+        except runner.BenchmarkError as e:
+            raise CommandError(str(e))
+
+        if options['update_baseline']:
+            runner.save_baseline(options['baseline'], meta, results)
+            self.stdout.write(self.style.SUCCESS(f"✅ Baseline written to {options['baseline']}."))
+            return
+
+        regressions = runner.compare(baseline['results'], results, options['threshold'])
+        if regressions:
+            raise CommandError("Benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("✅ No regressions against the baseline."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from munji_app.benchmarks import runner, serialization
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database through generate_data and time list serialization "
+        "with the DRF serializers against the values_list() row encoders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purchases', type=int, default=5000,
+                            help="Purchases to seed; other tables are sized from it (default 5000)")
+        parser.add_argument('--seed', type=int, default=0, help="generate_data seed (default 0)")
+        parser.add_argument('--rows', type=int, default=1000, help="Rows serialized per run (default 1000)")
+        parser.add_argument('--iterations', type=int, default=10, help="Timed runs per side (default 10)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding {options['purchases']} purchases...")
+        with runner.seeded_database(options['purchases'], options['seed']):
+            for case in serialization.CASES:
+                if serialization.serialize(case, options['rows']) != serialization.encode(case, options['rows']):
+                    raise CommandError(f"{case.name}: the row encoder does not match the serializer")
+                result = serialization.measure(case, options['rows'], options['iterations'])
+                self.stdout.write(
+                    f"  {case.name:<22} {result['rows']:6d} rows  serializer {result['serializer_ms']:9.2f} ms  "
+                    f"encoder {result['encoder_ms']:8.2f} ms  x{result['speedup']}"
+                )
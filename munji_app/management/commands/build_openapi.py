@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from munji_app import schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema into OPENAPI_SCHEMA_FILE (run at deploy time, before starting workers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Write the schema here instead of OPENAPI_SCHEMA_FILE")
+
+    def handle(self, *args, **options):
+        path = Path(options['output'] or settings.OPENAPI_SCHEMA_FILE)
+        content = schema.generate()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {path} ({len(content)} bytes, hash {schema.content_hash(content)})."
+        ))
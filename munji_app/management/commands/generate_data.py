@@ -1,105 +1,201 @@
-from decimal import Decimal, ROUND_HALF_UP
-import random
-from django.utils import timezone
+import datetime
+import multiprocessing
+from contextlib import contextmanager
+from decimal import Decimal
+
 from django.core.management.base import BaseCommand
-from faker import Faker
+from django.db import transaction
+from django.utils import timezone
+
+from munji_app import cache, datagen, ledger, rollups, search
 from munji_app.models import Supplier, MunjiPurchase, RiceProduction, GlobalSettings, Category, MiscellaneousCost, Expense
 
-fake = Faker()
-def d2(x): return Decimal(x).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+# Capital and cash left over once every generated row is paid for.
+RESERVE = Decimal('999999.99')
+# Production consumes at most this share of the munji bought.
+PRODUCTION_SHARE = Decimal('0.8')
+# Rows per generated chunk. Fixed, so the data depends only on the seed
+# and the row counts, not on --batch-size or --workers.
+CHUNK_ROWS = 10000
+
+PRODUCTION_FIELDS = (
+    'quantity_produced', 'dryer_cost', 'factory_cost', 'wastage', 'quality_of_rice',
+    'rice_price_per_unit', 'total_quality', 'total_price', 'naku_price', 'naku_quantity', 'created_at',
+)
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """Let bulk_create keep the created_at values it is given."""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def split(total, size):
+    """Chunk sizes of at most `size` adding up to `total`."""
+    return [min(size, total - start) for start in range(0, total, size)]
+
 
 class Command(BaseCommand):
-    help = "Generate random data safely"
+    help = "Generate random data, deterministically for a given seed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=10, help="Suppliers to create (default 10)")
+        parser.add_argument('--purchases', type=int, default=35, help="Munji purchases to create (default 35)")
+        parser.add_argument('--expenses', type=int, default=70,
+                            help="Expenses to create, spread over the purchases (default 70)")
+        parser.add_argument('--production', type=int, default=35, help="Rice production runs to create (default 35)")
+        parser.add_argument('--misc-costs', type=int, default=10, help="Miscellaneous costs to create (default 10)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data (default 0)")
+        parser.add_argument('--years', type=float, default=1,
+                            help="Spread created_at over this many years before --end (default 1)")
+        parser.add_argument('--end', type=datetime.date.fromisoformat, default=None,
+                            help="Last day rows are dated (YYYY-MM-DD, default today)")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Rows per INSERT statement (default 5000)")
+        parser.add_argument('--workers', type=int, default=1, help="Processes generating chunks (default 1)")
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS("Generating data..."))
-
-        # Ensure GlobalSettings exists with large balance
-        gs, _ = GlobalSettings.objects.get_or_create(id=1,
-                                                     defaults={'opening_balance': Decimal('999999.99'),
-                                                               'total_munji': Decimal('0.00')})
-
-        # Create default categories if they don't exist
-        default_categories = ["Paddy", "Wheat", "Corn", "Rice"]
-        for cat_name in default_categories:
-            Category.objects.get_or_create(name=cat_name)
-
-        suppliers = []
-        munji_purchases = []
-        rice_productions = []
-        miscellaneous_costs = []
-        expenses = []
-
-        for _ in range(10):
-            s = Supplier(name=fake.company())
-            suppliers.append(s)
-
-        Supplier.objects.bulk_create(suppliers)
-
-        # Get all categories for random assignment
-        all_categories = list(Category.objects.all())
-
-        for s in Supplier.objects.all():
-            for _ in range(random.randint(2, 5)):
-                qty   = d2(random.uniform(10, 200))
-                price = d2(random.uniform(50, 500))
-                total = d2(qty * price)
-
-                munji_purchases.append(MunjiPurchase(
-                    supplier=s,
-                    category=random.choice(all_categories),
-                    total_bags=random.randint(10, 100),
-                    buying_quantity_munji=qty,
-                    munji_price_per_unit=price,
-                    total_munji_price=total,
-                    total_munji_cost=total,
-                    payment_type=random.choice(["Cash", "Credit"]),
-                    created_at=timezone.now()
-                ))
-
-            for _ in range(random.randint(2, 5)):
-                qprod = d2(random.uniform(50, 500))
-                rice_price = d2(random.uniform(50, 200))
-                total_quality = d2(float(qprod) * random.uniform(0.7, 0.95))
-                total_price = d2(total_quality * rice_price)
-
-                rice_productions.append(RiceProduction(
-                    quantity_produced=qprod,
-                    dryer_cost=d2(random.uniform(100, 500)),
-                    factory_cost=d2(random.uniform(200, 1000)),
-                    wastage=d2(random.uniform(0.01, 0.1)),
-                    quality_of_rice=d2(random.uniform(0.7, 0.95)),
-                    rice_price_per_unit=rice_price,
-                    total_quality=total_quality,
-                    total_price=total_price,
-                    naku_price=d2(random.uniform(5, 20)),
-                    naku_quantity=d2(random.uniform(10, 100)),
-                    created_at=timezone.now()
-                ))
-
-        MunjiPurchase.objects.bulk_create(munji_purchases)
-        RiceProduction.objects.bulk_create(rice_productions)
-
-        # Generate expenses for each munji purchase
-        expense_types = ["Transportation", "Labor", "Storage", "Handling", "Inspection", "Documentation", "Taxes", "Miscellaneous"]
-        for purchase in MunjiPurchase.objects.all():
-            # Add 1-3 expenses per purchase
-            for _ in range(random.randint(1, 3)):
-                expenses.append(Expense(
-                    munji_purchase=purchase,
-                    title=random.choice(expense_types),
-                    amount=d2(random.uniform(50, 500)),
-                    created_at=timezone.now()
-                ))
-        
-        Expense.objects.bulk_create(expenses)
-
-        for _ in range(10):
-            miscellaneous_costs.append(MiscellaneousCost(
-                title=fake.sentence(nb_words=4),
-                amount=d2(random.uniform(10, 1000)),
-                created_at=timezone.now()
-            ))
-        MiscellaneousCost.objects.bulk_create(miscellaneous_costs)
+        seed, batch_size = options['seed'], options['batch_size']
+
+        end_day = options['end'] or timezone.localdate()
+        end = timezone.make_aware(datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time()))
+        span = options['years'] * 365 * 86400
+        start = end - datetime.timedelta(seconds=span)
+
+        for name in datagen.CATEGORIES:
+            Category.objects.get_or_create(name=name)
+        category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+        supplier_ids = self.create_suppliers(datagen.supplier_names(seed, options['suppliers']), batch_size)
+
+        totals = {'cash_spend': Decimal(0), 'cash_munji': Decimal(0), 'credit_munji': Decimal(0),
+                  'expenses': Decimal(0), 'misc_costs': Decimal(0), 'produced': Decimal(0)}
+        pool = multiprocessing.Pool(options['workers']) if options['workers'] > 1 else None
+        imap = pool.imap if pool else map
+        try:
+            with explicit_created_at(MunjiPurchase, Expense, RiceProduction, MiscellaneousCost):
+                purchase_chunks = split(options['purchases'], CHUNK_ROWS)
+                expense_chunks = [
+                    options['expenses'] * (n + 1) // len(purchase_chunks) - options['expenses'] * n // len(purchase_chunks)
+                    for n in range(len(purchase_chunks))
+                ]
+                tasks = [
+                    (seed, n, count, expense_chunks[n], len(supplier_ids), len(category_ids), start, span)
+                    for n, count in enumerate(purchase_chunks)
+                ]
+                for n, chunk in enumerate(imap(datagen.purchases, tasks), start=1):
+                    self.load_purchases(chunk, supplier_ids, category_ids, batch_size, totals)
+                    self.stdout.write(f"  purchases: chunk {n}/{len(tasks)}")
+
+                bought = totals['cash_munji'] + totals['credit_munji']
+                max_quantity = bought * PRODUCTION_SHARE / options['production'] if options['production'] else 0
+                tasks = [(seed, n, count, max_quantity, start, span)
+                         for n, count in enumerate(split(options['production'], CHUNK_ROWS))]
+                for n, rows in enumerate(imap(datagen.productions, tasks), start=1):
+                    with transaction.atomic():
+                        RiceProduction.objects.bulk_create(
+                            [RiceProduction(**dict(zip(PRODUCTION_FIELDS, row))) for row in rows],
+                            batch_size=batch_size,
+                        )
+                    totals['produced'] += sum((row[0] for row in rows), Decimal(0))
+                    self.stdout.write(f"  production: chunk {n}/{len(tasks)}")
+
+                tasks = [(seed, n, count, start, span)
+                         for n, count in enumerate(split(options['misc_costs'], CHUNK_ROWS))]
+                for n, rows in enumerate(imap(datagen.miscellaneous_costs, tasks), start=1):
+                    with transaction.atomic():
+                        MiscellaneousCost.objects.bulk_create(
+                            [MiscellaneousCost(title=title, amount=amount, created_at=created_at)
+                             for title, amount, created_at in rows],
+                            batch_size=batch_size,
+                        )
+                    totals['misc_costs'] += sum((row[1] for row in rows), Decimal(0))
+                    self.stdout.write(f"  miscellaneous costs: chunk {n}/{len(tasks)}")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        self.record_balances(totals)
+        # bulk_create bypasses the signals that keep rollups and stamps current.
+        rollups.rebuild(chunk_size=max(batch_size, 10000))
+        for model in (Supplier, Category, MunjiPurchase, Expense, RiceProduction, MiscellaneousCost):
+            cache.touch_model(model)
 
         self.stdout.write(self.style.SUCCESS("✅ Data generation complete (bulk inserted)."))
+
+    def create_suppliers(self, names, batch_size):
+        """Create suppliers by name (reusing existing ones) and return their ids in order."""
+        ids = {}
+        for begin in range(0, len(names), batch_size):
+            batch = names[begin:begin + batch_size]
+            with transaction.atomic():
+                Supplier.objects.bulk_create(
+                    [Supplier(name=name, search_name=search.normalize(name)) for name in batch], ignore_conflicts=True,
+                )
+                ids.update(Supplier.objects.filter(name__in=batch).values_list('name', 'pk'))
+        return [ids[name] for name in names]
+
+    def load_purchases(self, chunk, supplier_ids, category_ids, batch_size, totals):
+        rows, expense_rows = chunk
+        with transaction.atomic():
+            purchases = MunjiPurchase.objects.bulk_create(
+                [
+                    MunjiPurchase(
+                        supplier_id=supplier_ids[supplier] if supplier is not None else None,
+                        category_id=category_ids[category],
+                        total_bags=bags,
+                        buying_quantity_munji=qty,
+                        munji_price_per_unit=price,
+                        total_munji_price=total,
+                        total_munji_cost=cost,
+                        expense_count=expense_count,
+                        payment_type=payment_type,
+                        created_at=created_at,
+                    )
+                    for supplier, category, bags, qty, price, total, cost, expense_count, payment_type, created_at in rows
+                ],
+                batch_size=batch_size,
+            )
+            Expense.objects.bulk_create(
+                [
+                    Expense(munji_purchase_id=purchases[index].pk, title=title, amount=amount, created_at=created_at)
+                    for index, title, amount, created_at in expense_rows
+                ],
+                batch_size=batch_size,
+            )
+        for purchase in purchases:
+            if purchase.payment_type == MunjiPurchase.CASH:
+                totals['cash_spend'] += purchase.total_munji_price
+                totals['cash_munji'] += purchase.buying_quantity_munji
+            else:
+                totals['credit_munji'] += purchase.buying_quantity_munji
+        totals['expenses'] += sum((row[2] for row in expense_rows), Decimal(0))
+
+    def record_balances(self, totals):
+        """
+        Fund the generated rows and book them through the ledger, so the
+        journal explains GlobalSettings and RESERVE is left in capital and cash.
+        """
+        GlobalSettings.get_instance()
+        cash_out = totals['cash_spend'] + totals['expenses'] + totals['misc_costs']
+        with transaction.atomic():
+            ledger.add_capital(cash_out + 2 * RESERVE)
+            ledger.add_cash(cash_out + RESERVE)
+            if totals['cash_spend'] or totals['cash_munji']:
+                ledger.deduct_purchase(totals['cash_spend'], totals['cash_munji'])
+            if totals['credit_munji']:
+                ledger.add_munji(totals['credit_munji'])
+            if totals['expenses']:
+                ledger.deduct_expense(totals['expenses'])
+            if totals['misc_costs']:
+                ledger.deduct_miscellaneous(totals['misc_costs'])
+            if totals['produced']:
+                ledger.consume_munji(totals['produced'])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from munji_app import idempotency
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Keys deleted per query (default 1000)")
+
+    def handle(self, *args, **options):
+        def progress(deleted):
+            self.stdout.write(f"  {deleted} keys deleted")
+
+        self.stdout.write(self.style.SUCCESS("Purging expired idempotency keys..."))
+        deleted = idempotency.purge(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"✅ Idempotency keys purged ({deleted} deleted)."))
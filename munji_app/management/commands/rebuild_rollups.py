@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from munji_app import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyRollup reporting table from purchases, expenses, misc costs and production"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help="Source rows aggregated per query (default 10000)")
+
+    def handle(self, *args, **options):
+        def progress(model, number):
+            self.stdout.write(f"  {model.__name__}: chunk {number}")
+
+        self.stdout.write(self.style.SUCCESS("Rebuilding rollups..."))
+        rows = rollups.rebuild(chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"✅ Rollups rebuilt ({rows} rows)."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from munji_app import landed_costs
+
+
+class Command(BaseCommand):
+    help = "Recompute each purchase's landed cost and expense count from its expenses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Purchases read and written per batch (default 2000)")
+
+    def handle(self, *args, **options):
+        def progress(checked):
+            self.stdout.write(f"  {checked} purchases checked")
+
+        self.stdout.write(self.style.SUCCESS("Repairing landed costs..."))
+        fixed = landed_costs.repair(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"✅ Landed costs repaired ({fixed} purchases corrected)."))
@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from munji_app import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (reports, rollup rebuilds, landed-cost repairs) until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Jobs run at once (default JOB_WORKER_CONCURRENCY)")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds between checks of an empty queue (default JOB_POLL_INTERVAL)")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once the queue is empty instead of waiting for new jobs")
+
+    def handle(self, *args, **options):
+        worker = jobs.Worker(concurrency=options['concurrency'], poll_interval=options['poll_interval'])
+
+        def stop(signum, frame):
+            # Running jobs finish; no new ones are claimed.
+            self.stdout.write("Stopping after the running jobs...")
+            worker.stop.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker {worker.name} running up to {worker.concurrency} jobs ({', '.join(sorted(jobs.TASKS))})."
+        ))
+        worker.work(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS("✅ Worker stopped."))
@@ -0,0 +1,36 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from munji_app.routers import PRIMARY
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto every replica in DATABASE_REPLICAS (online backup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024,
+                            help="Pages copied per backup step; the primary is only locked during a step (default 1024)")
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured: set DB_REPLICAS.")
+        for alias in [PRIMARY, *settings.DATABASE_REPLICAS]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"{alias} is not a SQLite database; use the server's own replication.")
+
+        source = sqlite3.connect(connections[PRIMARY].settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    source.backup(target, pages=options['pages'])
+                finally:
+                    target.close()
+                self.stdout.write(f"  {alias} <- {PRIMARY}")
+        finally:
+            source.close()
+        self.stdout.write(self.style.SUCCESS("✅ Replicas synced."))
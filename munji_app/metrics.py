@@ -0,0 +1,210 @@
+"""
+In-process request metrics, rendered in the Prometheus text format.
+
+MetricsMiddleware records, per route name and method: requests by status,
+a latency histogram, DB queries and DB time, and response bytes. Each
+thread writes to its own shard, so recording takes no lock; a scrape sums
+the shards. Shards of finished threads are folded into a retired total so
+thread-per-request servers do not grow the shard list without bound.
+
+Queries are counted by an execute wrapper installed on every connection
+when it opens; it adds to the counters of the request in the current
+context, so queries the async ORM runs in worker threads are counted too.
+
+Counts are per process. With several worker processes, scrape each one
+(or run a single worker per scrape target).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RouteStats:
+    __slots__ = ('statuses', 'buckets', 'duration', 'queries', 'db_duration', 'size', 'sized')
+
+    def __init__(self):
+        self.statuses = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.duration = 0.0
+        self.queries = 0
+        self.db_duration = 0.0
+        self.size = 0
+        self.sized = 0
+
+    def merge(self, other):
+        for status, count in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.duration += other.duration
+        self.queries += other.queries
+        self.db_duration += other.db_duration
+        self.size += other.size
+        self.sized += other.sized
+
+
+# (thread, {(route, method): RouteStats}) for live threads.
+_shards = []
+_retired = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _merge_into(target, shard):
+    for key, stats in list(shard.items()):
+        target.setdefault(key, RouteStats()).merge(stats)
+
+
+def _retire_finished():
+    """Fold the shards of finished threads into `_retired`. Call with `_lock` held."""
+    alive = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            alive.append((thread, shard))
+        else:
+            _merge_into(_retired, shard)
+    _shards[:] = alive
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _lock:
+            _retire_finished()
+            _shards.append((threading.current_thread(), shard))
+        return shard
+
+
+_request_db = ContextVar('munji_request_db', default=None)
+
+
+@contextmanager
+def count_queries():
+    """Count the queries run in this context (and threads it hands work to) into the yielded dict."""
+    db = {'queries': 0, 'duration': 0.0}
+    token = _request_db.set(db)
+    try:
+        yield db
+    finally:
+        _request_db.reset(token)
+
+
+def time_query(execute, sql, params, many, context):
+    db = _request_db.get()
+    if db is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        db['queries'] += 1
+        db['duration'] += time.perf_counter() - started
+
+
+def install(sender=None, connection=None, **kwargs):
+    """connection_created receiver: time the queries run on `connection`."""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def observe(route, method, status, duration, queries, db_duration, size=None):
+    """Record one request. Only the calling thread writes to its shard."""
+    shard = _shard()
+    stats = shard.get((route, method))
+    if stats is None:
+        stats = shard[(route, method)] = RouteStats()
+    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+    stats.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+    stats.duration += duration
+    stats.queries += queries
+    stats.db_duration += db_duration
+    if size is not None:
+        stats.size += size
+        stats.sized += 1
+
+
+def snapshot():
+    """Return {(route, method): RouteStats} summed over every thread."""
+    totals = {}
+    with _lock:
+        _retire_finished()
+        _merge_into(totals, _retired)
+        for _, shard in _shards:
+            _merge_into(totals, shard)
+    return totals
+
+
+def reset():
+    """Forget everything recorded so far (used by tests)."""
+    with _lock:
+        _retired.clear()
+        for _, shard in _shards:
+            shard.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render(totals=None):
+    """The Prometheus text exposition of `totals` (default: the current snapshot)."""
+    totals = snapshot() if totals is None else totals
+    keys = sorted(totals)
+    lines = [
+        '# HELP munji_http_requests_total Requests served, by route, method and status.',
+        '# TYPE munji_http_requests_total counter',
+    ]
+    for route, method in keys:
+        for status, count in sorted(totals[route, method].statuses.items()):
+            lines.append(f'munji_http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+
+    lines += [
+        '# HELP munji_http_request_duration_seconds Time spent serving requests.',
+        '# TYPE munji_http_request_duration_seconds histogram',
+    ]
+    for route, method in keys:
+        stats = totals[route, method]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.buckets):
+            cumulative += count
+            labels = _labels(route=route, method=method, le=bound)
+            lines.append(f'munji_http_request_duration_seconds_bucket{labels} {cumulative}')
+        labels = _labels(route=route, method=method)
+        lines.append(f'munji_http_request_duration_seconds_sum{labels} {stats.duration:.6f}')
+        lines.append(f'munji_http_request_duration_seconds_count{labels} {cumulative}')
+
+    lines += [
+        '# HELP munji_db_queries_total Database queries run while serving requests.',
+        '# TYPE munji_db_queries_total counter',
+    ]
+    for route, method in keys:
+        lines.append(f'munji_db_queries_total{_labels(route=route, method=method)} {totals[route, method].queries}')
+
+    lines += [
+        '# HELP munji_db_query_duration_seconds_total Time spent in database queries.',
+        '# TYPE munji_db_query_duration_seconds_total counter',
+    ]
+    for route, method in keys:
+        labels = _labels(route=route, method=method)
+        lines.append(f'munji_db_query_duration_seconds_total{labels} {totals[route, method].db_duration:.6f}')
+
+    lines += [
+        '# HELP munji_http_response_size_bytes Response body sizes (streamed responses are not counted).',
+        '# TYPE munji_http_response_size_bytes summary',
+    ]
+    for route, method in keys:
+        stats = totals[route, method]
+        labels = _labels(route=route, method=method)
+        lines.append(f'munji_http_response_size_bytes_sum{labels} {stats.size}')
+        lines.append(f'munji_http_response_size_bytes_count{labels} {stats.sized}')
+    return '\n'.join(lines) + '\n'
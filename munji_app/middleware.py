@@ -0,0 +1,136 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class MetricsMiddleware:
+    """
+    Record every request in munji_app.metrics under its resolved URL name
+    (or "<unmatched>"), timing the whole middleware chain below it and the
+    queries run on any database connection.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.count_queries() as db:
+            response = self.get_response(request)
+        return self.record(request, response, started, db)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with metrics.count_queries() as db:
+            response = await self.get_response(request)
+        return self.record(request, response, started, db)
+
+    def record(self, request, response, started, db):
+        match = getattr(request, 'resolver_match', None)
+        metrics.observe(
+            match.view_name if match else '<unmatched>',
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            db['queries'],
+            db['duration'],
+            None if response.streaming else len(response.content),
+        )
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Serve GET/HEAD requests from read replicas (see routers.py), except for
+    clients that wrote within the last REPLICA_STICKY_SECONDS: a successful
+    write sets a cookie that keeps the client's reads on the primary until
+    replicas have caught up.
+    """
+    cookie_name = 'munji_primary_until'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def is_sticky(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def use_replicas(self, request):
+        return bool(settings.DATABASE_REPLICAS) and request.method in ('GET', 'HEAD') and not self.is_sticky(request)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.use_replicas(request):
+            with routers.replica_reads():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        if self.use_replicas(request):
+            with routers.replica_reads():
+                response = await self.get_response(request)
+        else:
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if not settings.DATABASE_REPLICAS:
+            return response
+        if self.use_replicas(request):
+            if response.streaming:
+                wrap = _replica_aiterator if response.is_async else _replica_iterator
+                response.streaming_content = wrap(response.streaming_content)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                self.cookie_name, '%.3f' % (time.time() + window),
+                max_age=window, httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def _replica_iterator(chunks):
+    """Keep streamed bodies (exports) reading from replicas while they are produced."""
+    chunks = iter(chunks)
+    while True:
+        with routers.replica_reads():
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def _replica_aiterator(chunks):
+    """_replica_iterator() for async streamed bodies."""
+    chunks = aiter(chunks)
+    while True:
+        with routers.replica_reads():
+            try:
+                chunk = await anext(chunks)
+            except StopAsyncIteration:
+                return
+        yield chunk
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:18
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_baseline_snapshot(apps, schema_editor):
+    """Start the journal from the balances GlobalSettings holds today."""
+    GlobalSettings = apps.get_model('munji_app', 'GlobalSettings')
+    LedgerSnapshot = apps.get_model('munji_app', 'LedgerSnapshot')
+    gs = GlobalSettings.objects.filter(pk=1).first() or GlobalSettings()
+    LedgerSnapshot.objects.create(
+        last_entry_id=0,
+        opening_balance=gs.opening_balance,
+        cash_in_hand=gs.cash_in_hand,
+        sales=gs.sales,
+        total_munji=gs.total_munji,
+        created_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munji_app', '0004_category_created_at_globalsettings_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('capital', 'Capital'), ('cash', 'Cash'), ('purchase', 'Purchase'), ('expense', 'Expense'), ('miscellaneous', 'Miscellaneous'), ('production', 'Production'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cash_in_hand', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('sales', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_munji', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='munji_app_l_created_53ca17_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cash_in_hand', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('sales', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_munji', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'last_entry_id'], name='munji_app_l_created_d11c5e_idx')],
+            },
+        ),
+        migrations.RunPython(create_baseline_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munji_app', '0005_ledger_journal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['created_at', 'id'], name='munji_app_c_created_779cef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['created_at', 'id'], name='munji_app_e_created_df58a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['munji_purchase', 'created_at', 'id'], name='munji_app_e_munji_p_859259_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='miscellaneouscost',
+            index=models.Index(fields=['created_at', 'id'], name='munji_app_m_created_c48500_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='munjipurchase',
+            index=models.Index(fields=['created_at', 'id'], name='munji_app_m_created_2ac7ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='munjipurchase',
+            index=models.Index(fields=['payment_type', 'created_at', 'id'], name='munji_app_m_payment_307460_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='munjipurchase',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='munji_app_m_categor_66422b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='riceproduction',
+            index=models.Index(fields=['created_at', 'id'], name='munji_app_r_created_968ae1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['created_at', 'id'], name='munji_app_s_created_91d633_idx'),
+        ),
+    ]
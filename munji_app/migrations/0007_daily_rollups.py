@@ -0,0 +1,88 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:24
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+# The aggregates as they stood when the table was added. They are written
+# out here rather than taken from munji_app.rollups so that later changes to
+# that module cannot change what this migration does.
+SOURCES = [
+    ('MunjiPurchase', ('category_id', 'payment_type'), {
+        'purchases': models.Count('id'),
+        'quantity_bought': models.Sum('buying_quantity_munji'),
+        'spend': models.Sum('total_munji_price'),
+    }),
+    ('Expense', ('munji_purchase__category_id', 'munji_purchase__payment_type'), {
+        'expenses': models.Sum('amount'),
+    }),
+    ('MiscellaneousCost', (), {
+        'misc_costs': models.Sum('amount'),
+    }),
+    ('RiceProduction', (), {
+        'rice_produced': models.Sum('quantity_produced'),
+        'wastage': models.Sum('wastage'),
+        'revenue': models.Sum('total_price'),
+    }),
+]
+
+
+def backfill_rollups(apps, schema_editor):
+    """Fill the new table from the rows that already exist."""
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    for model_name, key_fields, aggregates in SOURCES:
+        rows = (
+            apps.get_model('munji_app', model_name).objects
+            .annotate(day=TruncDate('created_at'))
+            .values('day', *key_fields)
+            .annotate(**aggregates)
+            .order_by()
+        )
+        for row in rows:
+            key = (row['day'], *(row[field] for field in key_fields)) if key_fields else (row['day'], None, '')
+            for metric in aggregates:
+                totals[key][metric] += row[metric] or 0
+
+    DailyRollup = apps.get_model('munji_app', 'DailyRollup')
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(day=day, category_id=category_id, payment_type=payment_type, **metrics)
+            for (day, category_id, payment_type), metrics in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munji_app', '0006_list_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_type', models.CharField(blank=True, max_length=10)),
+                ('purchases', models.PositiveIntegerField(default=0)),
+                ('quantity_bought', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('misc_costs', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rice_produced', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('wastage', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='munji_app.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('category__isnull', False)), fields=('day', 'category', 'payment_type'), name='dailyrollup_unique_key'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('day', 'payment_type'), name='dailyrollup_unique_uncategorised_key')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
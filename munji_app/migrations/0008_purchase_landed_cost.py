@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:29
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_landed_costs(apps, schema_editor):
+    """Landed cost so far was a copy of the price; add each purchase's expenses."""
+    MunjiPurchase = apps.get_model('munji_app', 'MunjiPurchase')
+    Expense = apps.get_model('munji_app', 'Expense')
+    totals = {
+        row['munji_purchase_id']: (row['total'], row['count'])
+        for row in Expense.objects.order_by().values('munji_purchase_id').annotate(total=Sum('amount'), count=Count('id'))
+    }
+    purchases = list(MunjiPurchase.objects.only('id', 'total_munji_price'))
+    for purchase in purchases:
+        total, count = totals.get(purchase.pk, (0, 0))
+        purchase.total_munji_cost = purchase.total_munji_price + total
+        purchase.expense_count = count
+    MunjiPurchase.objects.bulk_update(purchases, ['total_munji_cost', 'expense_count'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munji_app', '0007_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='munjipurchase',
+            name='expense_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_landed_costs, migrations.RunPython.noop),
+    ]
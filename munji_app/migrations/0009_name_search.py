@@ -0,0 +1,86 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:57
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize(value):
+    """search.normalize() as it stood when the column was added."""
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.casefold().split())
+
+
+def backfill_search_names(apps, schema_editor):
+    for name in ('Supplier', 'Category'):
+        model = apps.get_model('munji_app', name)
+        rows = list(model.objects.only('id', 'name'))
+        for row in rows:
+            row.search_name = normalize(row.name)
+        model.objects.bulk_update(rows, ['search_name'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munji_app', '0008_purchase_landed_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_search_names, migrations.RunPython.noop),
+        migrations.RunSQL(
+            [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS munji_app_supplier_search USING fts5("
+                "search_name, content='munji_app_supplier', content_rowid='id', tokenize='trigram')",
+                "CREATE TRIGGER IF NOT EXISTS munji_app_supplier_search_insert AFTER INSERT ON munji_app_supplier BEGIN "
+                "INSERT INTO munji_app_supplier_search(rowid, search_name) VALUES (new.id, new.search_name); END",
+                "CREATE TRIGGER IF NOT EXISTS munji_app_supplier_search_delete AFTER DELETE ON munji_app_supplier BEGIN "
+                "INSERT INTO munji_app_supplier_search(munji_app_supplier_search, rowid, search_name) "
+                "VALUES ('delete', old.id, old.search_name); END",
+                "CREATE TRIGGER IF NOT EXISTS munji_app_supplier_search_update AFTER UPDATE OF search_name ON munji_app_supplier BEGIN "
+                "INSERT INTO munji_app_supplier_search(munji_app_supplier_search, rowid, search_name) "
+                "VALUES ('delete', old.id, old.search_name); "
+                "INSERT INTO munji_app_supplier_search(rowid, search_name) VALUES (new.id, new.search_name); END",
+                "INSERT INTO munji_app_supplier_search(munji_app_supplier_search) VALUES ('rebuild')",
+            ],
+            [
+                "DROP TRIGGER IF EXISTS munji_app_supplier_search_insert",
+                "DROP TRIGGER IF EXISTS munji_app_supplier_search_delete",
+                "DROP TRIGGER IF EXISTS munji_app_supplier_search_update",
+                "DROP TABLE IF EXISTS munji_app_supplier_search",
+            ],
+        ),
+        migrations.RunSQL(
+            [
+                "CREATE VIRTUAL TABLE IF NOT EXISTS munji_app_category_search USING fts5("
+                "search_name, content='munji_app_category', content_rowid='id', tokenize='trigram')",
+                "CREATE TRIGGER IF NOT EXISTS munji_app_category_search_insert AFTER INSERT ON munji_app_category BEGIN "
+                "INSERT INTO munji_app_category_search(rowid, search_name) VALUES (new.id, new.search_name); END",
+                "CREATE TRIGGER IF NOT EXISTS munji_app_category_search_delete AFTER DELETE ON munji_app_category BEGIN "
+                "INSERT INTO munji_app_category_search(munji_app_category_search, rowid, search_name) "
+                "VALUES ('delete', old.id, old.search_name); END",
+                "CREATE TRIGGER IF NOT EXISTS munji_app_category_search_update AFTER UPDATE OF search_name ON munji_app_category BEGIN "
+                "INSERT INTO munji_app_category_search(munji_app_category_search, rowid, search_name) "
+                "VALUES ('delete', old.id, old.search_name); "
+                "INSERT INTO munji_app_category_search(rowid, search_name) VALUES (new.id, new.search_name); END",
+                "INSERT INTO munji_app_category_search(munji_app_category_search) VALUES ('rebuild')",
+            ],
+            [
+                "DROP TRIGGER IF EXISTS munji_app_category_search_insert",
+                "DROP TRIGGER IF EXISTS munji_app_category_search_delete",
+                "DROP TRIGGER IF EXISTS munji_app_category_search_update",
+                "DROP TABLE IF EXISTS munji_app_category_search",
+            ],
+        ),
+    ]
@@ -0,0 +1,192 @@
+# Generated by Django 5.2.6 on 2026-10-17 22:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The UNION ALL views behind the <Model>History models, as the tables stand
+# at this migration. Written out so that later model changes do not alter
+# what this migration creates; a migration that changes these columns
+# recreates the views itself.
+CREATE_VIEWS = [
+    'CREATE VIEW "munji_app_munjipurchase_history" AS '
+    'SELECT "id", "supplier_id", "category_id", "total_bags", "buying_quantity_munji", "munji_price_per_unit", '
+    '"total_munji_price", "total_munji_cost", "expense_count", "payment_type", "created_at" '
+    'FROM "munji_app_munjipurchase" '
+    'UNION ALL SELECT "id", "supplier_id", "category_id", "total_bags", "buying_quantity_munji", "munji_price_per_unit", '
+    '"total_munji_price", "total_munji_cost", "expense_count", "payment_type", "created_at" '
+    'FROM "munji_app_archivedmunjipurchase"',
+    'CREATE VIEW "munji_app_expense_history" AS '
+    'SELECT "id", "munji_purchase_id", "title", "amount", "created_at" FROM "munji_app_expense" '
+    'UNION ALL SELECT "id", "munji_purchase_id", "title", "amount", "created_at" FROM "munji_app_archivedexpense"',
+    'CREATE VIEW "munji_app_miscellaneouscost_history" AS '
+    'SELECT "id", "title", "amount", "created_at" FROM "munji_app_miscellaneouscost" '
+    'UNION ALL SELECT "id", "title", "amount", "created_at" FROM "munji_app_archivedmiscellaneouscost"',
+    'CREATE VIEW "munji_app_riceproduction_history" AS '
+    'SELECT "id", "quantity_produced", "dryer_cost", "factory_cost", "wastage", "quality_of_rice", '
+    '"rice_price_per_unit", "total_quality", "total_price", "naku_price", "naku_quantity", "created_at" '
+    'FROM "munji_app_riceproduction" '
+    'UNION ALL SELECT "id", "quantity_produced", "dryer_cost", "factory_cost", "wastage", "quality_of_rice", '
+    '"rice_price_per_unit", "total_quality", "total_price", "naku_price", "naku_quantity", "created_at" '
+    'FROM "munji_app_archivedriceproduction"',
+]
+DROP_VIEWS = [
+    'DROP VIEW IF EXISTS "munji_app_munjipurchase_history"',
+    'DROP VIEW IF EXISTS "munji_app_expense_history"',
+    'DROP VIEW IF EXISTS "munji_app_miscellaneouscost_history"',
+    'DROP VIEW IF EXISTS "munji_app_riceproduction_history"',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('munji_app', '0010_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseHistory',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'munji_app_expense_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MiscellaneousCostHistory',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'munji_app_miscellaneouscost_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MunjiPurchaseHistory',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_bags', models.PositiveIntegerField()),
+                ('buying_quantity_munji', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('munji_price_per_unit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_munji_price', models.DecimalField(decimal_places=2, editable=False, max_digits=12)),
+                ('total_munji_cost', models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True)),
+                ('expense_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('payment_type', models.CharField(choices=[('Cash', 'Cash'), ('Credit', 'Credit')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'munji_app_munjipurchase_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RiceProductionHistory',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_produced', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('dryer_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('factory_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('wastage', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('quality_of_rice', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('rice_price_per_unit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_quality', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('naku_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('naku_quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'munji_app_riceproduction_history',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMiscellaneousCost',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='munji_app_a_created_75b3dd_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRiceProduction',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_produced', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('dryer_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('factory_cost', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('wastage', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('quality_of_rice', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('rice_price_per_unit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_quality', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('naku_price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('naku_quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='munji_app_a_created_ad14a7_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('period', models.DateField()),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model', 'period'), name='archivesummary_unique_period')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedExpense',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+                ('munji_purchase', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='munji_app.munjipurchase')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='munji_app_a_created_795c75_idx'), models.Index(fields=['munji_purchase', 'created_at', 'id'], name='munji_app_a_munji_p_0558af_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMunjiPurchase',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_bags', models.PositiveIntegerField()),
+                ('buying_quantity_munji', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('munji_price_per_unit', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_munji_price', models.DecimalField(decimal_places=2, editable=False, max_digits=12)),
+                ('total_munji_cost', models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True)),
+                ('expense_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('payment_type', models.CharField(choices=[('Cash', 'Cash'), ('Credit', 'Credit')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='munji_app.category')),
+                ('supplier', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='munji_app.supplier')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'id'], name='munji_app_a_created_65679d_idx'), models.Index(fields=['payment_type', 'created_at', 'id'], name='munji_app_a_payment_3b2f3a_idx'), models.Index(fields=['category', 'created_at', 'id'], name='munji_app_a_categor_8829a4_idx')],
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
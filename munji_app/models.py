@@ -1,12 +1,25 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Sum
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal, ROUND_HALF_UP
 
+from . import cache, ledger, search
+
+
+def _stored(instance, field):
+    """The saved value of `field` for `instance`, or None while it is being added."""
+    if instance._state.adding:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
 
 # -----------------------------------------
 # Global Settings (Singleton)
 # -----------------------------------------
 class GlobalSettings(models.Model):
+    SINGLETON_ID = 1
+
     opening_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     cash_in_hand = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -20,59 +33,145 @@ class GlobalSettings(models.Model):
 
     @classmethod
     def get_instance(cls):
-        obj, _ = cls.objects.get_or_create(id=1)
-        return obj
+        """
+        Return the singleton, served from cache until the ledger next writes
+        to it. Use it for reads and pre-checks only: balance changes are
+        checked against the database row by the ledger service.
+        """
+        return cls._from_values(cache.read_through(cls._meta.label_lower, cls._load_values))
+
+    @classmethod
+    async def aget_instance(cls):
+        """get_instance() for async views."""
+        return cls._from_values(await cache.aread_through(cls._meta.label_lower, cls._aload_values))
+
+    @classmethod
+    def _from_values(cls, values):
+        field_names = [field.attname for field in cls._meta.concrete_fields]
+        return cls.from_db(cls.objects.db, field_names, [values[name] for name in field_names])
+
+    @classmethod
+    def _load_values(cls):
+        obj, _ = cls.objects.get_or_create(id=cls.SINGLETON_ID)
+        return {field.attname: getattr(obj, field.attname) for field in cls._meta.concrete_fields}
+
+    @classmethod
+    async def _aload_values(cls):
+        obj, _ = await cls.objects.aget_or_create(id=cls.SINGLETON_ID)
+        return {field.attname: getattr(obj, field.attname) for field in cls._meta.concrete_fields}
 
     def __str__(self):
         return "Global Settings"
 
     # --- ACCOUNTING RULES ---
+    # Balances are changed in the database by the ledger service; these
+    # methods apply the change and refresh the instance with the result.
+    def _sync(self, balances):
+        for field, value in balances.items():
+            setattr(self, field, value)
+
     def add_capital(self, amount):
-        self.opening_balance += amount
-        self.save()
+        self._sync(ledger.add_capital(amount))
 
     def add_cash(self, amount):
-        if self.opening_balance < amount:
-            raise ValidationError("Not enough capital to convert to cash.")
-        self.cash_in_hand += amount
-        self.opening_balance -= amount
-        self.save()
+        self._sync(ledger.add_cash(amount))
 
     def deduct_purchase(self, amount, munji_qty):
-        if self.cash_in_hand < amount:
-            raise ValidationError("Not enough cash in hand for this purchase.")
-        self.cash_in_hand -= amount
-        self.total_munji += munji_qty
-        self.save()
+        self._sync(ledger.deduct_purchase(amount, munji_qty))
 
     def deduct_expense(self, amount):
-        if self.cash_in_hand < amount:
-            raise ValidationError("Not enough cash in hand to record expense.")
-        self.cash_in_hand -= amount
-        self.save()
+        self._sync(ledger.deduct_expense(amount))
 
     def deduct_miscellaneous(self, amount):
-        if self.cash_in_hand < amount:
-            raise ValidationError("Not enough cash in hand to cover miscellaneous cost.")
-        self.cash_in_hand -= amount
-        self.save()
+        self._sync(ledger.deduct_miscellaneous(amount))
+
+
+# -----------------------------------------
+# Ledger Journal
+# -----------------------------------------
+class LedgerEntry(models.Model):
+    """One balance change applied to GlobalSettings (append-only)."""
+    CAPITAL = "capital"
+    CASH = "cash"
+    PURCHASE = "purchase"
+    EXPENSE = "expense"
+    MISCELLANEOUS = "miscellaneous"
+    PRODUCTION = "production"
+    ADJUSTMENT = "adjustment"
+    KIND_CHOICES = [
+        (CAPITAL, "Capital"),
+        (CASH, "Cash"),
+        (PURCHASE, "Purchase"),
+        (EXPENSE, "Expense"),
+        (MISCELLANEOUS, "Miscellaneous"),
+        (PRODUCTION, "Production"),
+        (ADJUSTMENT, "Adjustment"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cash_in_hand = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_munji = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.kind} @ {self.created_at}"
+
+
+class LedgerSnapshot(models.Model):
+    """GlobalSettings balances right after journal entry `last_entry_id`."""
+    last_entry_id = models.BigIntegerField()
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2)
+    cash_in_hand = models.DecimalField(max_digits=12, decimal_places=2)
+    sales = models.DecimalField(max_digits=12, decimal_places=2)
+    total_munji = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'last_entry_id'])]
+
+    def __str__(self):
+        return f"Snapshot @ {self.created_at}"
 
 
 # -----------------------------------------
 # Supplier / Category
 # -----------------------------------------
-class Supplier(models.Model):
+class SearchableName:
+    """Keeps `search_name` (see search.py) in step with `name` on save."""
+
+    def save(self, *args, **kwargs):
+        self.search_name = search.normalize(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        return super().save(*args, **kwargs)
+
+
+class Supplier(SearchableName, models.Model):
     name = models.CharField(max_length=255, unique=True)
+    search_name = models.CharField(max_length=255, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
     def __str__(self):
         return self.name
 
 
-class Category(models.Model):
+class Category(SearchableName, models.Model):
     name = models.CharField(max_length=255, unique=True)
+    search_name = models.CharField(max_length=255, default='', editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
     def __str__(self):
         return self.name
 
@@ -91,33 +190,69 @@ class MunjiPurchase(models.Model):
     buying_quantity_munji = models.DecimalField(max_digits=12, decimal_places=2)
     munji_price_per_unit = models.DecimalField(max_digits=12, decimal_places=2)
     total_munji_price = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
+    # Landed cost: price plus expenses, kept current by landed_costs.py.
     total_munji_cost = models.DecimalField(max_digits=12, decimal_places=2, editable=False, null=True)
+    expense_count = models.PositiveIntegerField(default=0, editable=False)
     payment_type = models.CharField(max_length=10, choices=PAYMENT_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['payment_type', 'created_at', 'id']),
+            models.Index(fields=['category', 'created_at', 'id']),
+        ]
+
     def clean(self):
-        if self.payment_type == self.CASH:
-            gs = GlobalSettings.objects.first()
-            if gs and self.total_munji_price > gs.cash_in_hand:
+        cash, _ = self.ledger_change()
+        if cash > 0:
+            gs = GlobalSettings.get_instance()
+            if cash > gs.cash_in_hand:
                 raise ValidationError({"payment_type": "Insufficient cash in hand for this purchase."})
 
-    def save(self, *args, **kwargs):
+    def charges(self):
+        """(cash paid, munji bought) by this purchase."""
+        return (self.total_munji_price if self.payment_type == self.CASH else Decimal(0)), self.buying_quantity_munji
+
+    def ledger_change(self):
+        """
+        (cash, munji) this save adds to the ledger: the full charges of a new
+        purchase, the difference from the stored row for an edit.
+        """
+        cash, munji = self.charges()
+        if not self._state.adding:
+            stored = MunjiPurchase.objects.filter(pk=self.pk).first()
+            if stored is not None:
+                old_cash, old_munji = stored.charges()
+                cash, munji = cash - old_cash, munji - old_munji
+        return cash, munji
+
+    def compute_totals(self):
         self.total_munji_price = (
             (self.buying_quantity_munji * self.munji_price_per_unit)
             .quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         )
         self.total_munji_cost = self.total_munji_price
 
+    def save(self, *args, **kwargs):
+        self.compute_totals()
+
         try:
             self.full_clean()
-            super().save(*args, **kwargs)
-            gs = GlobalSettings.get_instance()
-
-            if self.payment_type == self.CASH:
-                gs.deduct_purchase(self.total_munji_price, self.buying_quantity_munji)
-            else:
-                gs.total_munji += self.buying_quantity_munji
-                gs.save()
+            with transaction.atomic():
+                adding = self._state.adding
+                cash, munji = self.ledger_change()
+                if not adding:
+                    expenses = self.expenses.aggregate(total=Sum('amount'), count=Count('id'))
+                    self.total_munji_cost = self.total_munji_price + (expenses['total'] or 0)
+                    self.expense_count = expenses['count']
+                super().save(*args, **kwargs)
+                if not adding:
+                    ledger.change_purchase(cash, munji)
+                elif self.payment_type == self.CASH:
+                    ledger.deduct_purchase(cash, munji)
+                else:
+                    ledger.add_munji(munji)
         except ValidationError as e:
             raise ValidationError(e)
 
@@ -131,17 +266,22 @@ class Expense(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['munji_purchase', 'created_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.amount}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        gs = GlobalSettings.get_instance()
-        try:
-            gs.deduct_expense(self.amount)
-        except ValidationError as e:
-            self.delete()
-            raise e
+        with transaction.atomic():
+            # An edit is charged (or credited) only the difference.
+            amount = self.amount - (_stored(self, 'amount') or 0)
+            super().save(*args, **kwargs)
+            if amount:
+                ledger.deduct_expense(amount)
 
 
 # -----------------------------------------
@@ -160,11 +300,12 @@ class RiceProduction(models.Model):
     naku_quantity = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
     def clean(self):
-        gs = GlobalSettings.objects.first()
-        if not gs:
-            raise ValidationError({"__all__": "Global settings not found."})
-        if self.quantity_produced > gs.total_munji:
+        gs = GlobalSettings.get_instance()
+        if self.quantity_produced - (_stored(self, 'quantity_produced') or 0) > gs.total_munji:
             raise ValidationError({"quantity_produced": "Not enough Munji in global total."})
         if self.total_price != self.total_quality * self.rice_price_per_unit:
             raise ValidationError({"total_price": "Total price must equal total quality * rice price per unit."})
@@ -172,11 +313,11 @@ class RiceProduction(models.Model):
     def save(self, *args, **kwargs):
         try:
             self.full_clean()
-            super().save(*args, **kwargs)
-            gs = GlobalSettings.objects.first()
-            if gs:
-                gs.total_munji -= self.quantity_produced
-                gs.save()
+            with transaction.atomic():
+                quantity = self.quantity_produced - (_stored(self, 'quantity_produced') or 0)
+                super().save(*args, **kwargs)
+                if quantity:
+                    ledger.consume_munji(quantity)
         except ValidationError as e:
             raise ValidationError(e)
 
@@ -189,14 +330,199 @@ class MiscellaneousCost(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'])]
+
     def __str__(self):
         return f"{self.title} - {self.amount}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        gs = GlobalSettings.get_instance()
-        try:
-            gs.deduct_miscellaneous(self.amount)
-        except ValidationError as e:
-            self.delete()
-            raise e
+        with transaction.atomic():
+            amount = self.amount - (_stored(self, 'amount') or 0)
+            super().save(*args, **kwargs)
+            if amount:
+                ledger.deduct_miscellaneous(amount)
+
+
+# -----------------------------------------
+# Reporting Rollups
+# -----------------------------------------
+class DailyRollup(models.Model):
+    """
+    Per-day totals keyed by category and payment type, maintained
+    incrementally by rollups.py. Miscellaneous costs and rice production
+    have no category or payment type and are kept under (None, "").
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    payment_type = models.CharField(max_length=10, blank=True)
+    purchases = models.PositiveIntegerField(default=0)
+    quantity_bought = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    misc_costs = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rice_produced = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    wastage = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'category', 'payment_type'],
+                condition=models.Q(category__isnull=False),
+                name='dailyrollup_unique_key',
+            ),
+            models.UniqueConstraint(
+                fields=['day', 'payment_type'],
+                condition=models.Q(category__isnull=True),
+                name='dailyrollup_unique_uncategorised_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Rollup {self.day} {self.category_id} {self.payment_type}"
+
+
+# -----------------------------------------
+# Background Jobs
+# -----------------------------------------
+class Job(models.Model):
+    """A unit of background work run by `manage.py run_jobs` (see jobs.py)."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+        (CANCELLED, "Cancelled"),
+    ]
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs (see jobs.HEARTBEAT_INTERVAL).
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            # Workers claim the oldest queued job.
+            models.Index(fields=['status', 'created_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+# -----------------------------------------
+# Archive (see archive.py)
+# -----------------------------------------
+def _copied_fields(model, relation):
+    """
+    Clones of `model`'s concrete fields. Foreign keys lose their database
+    constraint; `relation(field)` gives the model and related_name they point to.
+    """
+    fields = {}
+    for field in model._meta.concrete_fields:
+        if field.is_relation:
+            to, related_name = relation(field)
+            fields[field.name] = models.ForeignKey(
+                to, on_delete=models.DO_NOTHING, db_constraint=False, related_name=related_name,
+                null=field.null, blank=field.blank,
+            )
+            continue
+        name, _, args, kwargs = field.deconstruct()
+        kwargs.pop('auto_created', None)
+        # Archived rows keep the timestamps they were created with.
+        kwargs.pop('auto_now_add', None)
+        fields[name] = type(field)(*args, **kwargs)
+    return fields
+
+
+def _archive_model(model):
+    """A table with `model`'s columns and indexes, holding the rows archive_season moved out of it."""
+    meta = type('Meta', (), {'indexes': [models.Index(fields=index.fields) for index in model._meta.indexes]})
+    fields = _copied_fields(model, lambda field: (field.remote_field.model, '+'))
+    return type(f'Archived{model.__name__}', (models.Model,), {'__module__': __name__, 'Meta': meta, **fields})
+
+
+def _history_model(model, histories=None):
+    """
+    An unmanaged model over the view of `model`'s live and archived rows.
+    Foreign keys to a model in `histories` point at its history model instead.
+    """
+    histories = histories or {}
+
+    def relation(field):
+        target = field.remote_field.model
+        if target in histories:
+            return histories[target], field.remote_field.related_name
+        return target, '+'
+
+    meta = type('Meta', (), {'managed': False, 'db_table': f'{model._meta.db_table}_history'})
+    fields = _copied_fields(model, relation)
+    return type(f'{model.__name__}History', (models.Model,), {'__module__': __name__, 'Meta': meta, **fields})
+
+
+ArchivedMunjiPurchase = _archive_model(MunjiPurchase)
+ArchivedExpense = _archive_model(Expense)
+ArchivedMiscellaneousCost = _archive_model(MiscellaneousCost)
+ArchivedRiceProduction = _archive_model(RiceProduction)
+
+MunjiPurchaseHistory = _history_model(MunjiPurchase)
+ExpenseHistory = _history_model(Expense, {MunjiPurchase: MunjiPurchaseHistory})
+MiscellaneousCostHistory = _history_model(MiscellaneousCost)
+RiceProductionHistory = _history_model(RiceProduction)
+
+
+class ArchiveSummary(models.Model):
+    """What archive_season moved out of one table for one month."""
+    model = models.CharField(max_length=100)
+    period = models.DateField()
+    rows = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['model', 'period'], name='archivesummary_unique_period')]
+
+    def __str__(self):
+        return f"{self.model} {self.period:%Y-%m}: {self.rows} rows"
+
+
+# -----------------------------------------
+# Idempotency keys (see idempotency.py)
+# -----------------------------------------
+class IdempotencyKey(models.Model):
+    """A client's Idempotency-Key for one create route, and the response it was given."""
+    key = models.CharField(max_length=255)
+    route = models.CharField(max_length=255)
+    # sha256 of the request body the key was first used with.
+    fingerprint = models.CharField(max_length=64)
+    # Null while the first request with the key is running.
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    location = models.CharField(max_length=2048, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['key', 'route'], name='idempotencykey_unique_route')]
+
+    def __str__(self):
+        return f"{self.route} {self.key}"
@@ -0,0 +1,204 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _rows(queryset, lookups):
+    """The page's rows as model instances, or as named values_list() rows of `lookups`."""
+    return queryset if lookups is None else queryset.values_list(*lookups, named=True)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id), newest first.
+
+    Each page is a single indexed range query (no COUNT, no OFFSET), so
+    deep pages cost the same as the first one. Cursors are opaque tokens
+    holding the boundary row's key and the direction to read in.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None, lookups=None):
+        queryset, cursor = self.seek(queryset, request)
+        return self.finish(list(_rows(queryset, lookups)), cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None, lookups=None):
+        """paginate_queryset() for async views, reading the page with the async ORM."""
+        queryset, cursor = self.seek(queryset, request)
+        return self.finish([row async for row in _rows(queryset, lookups)], cursor)
+
+    def seek(self, queryset, request):
+        """Return (the query for this page plus one row, the decoded cursor)."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        cursor = self.decode_cursor(request)
+
+        queryset = queryset.order_by('-created_at', '-id')
+        if cursor is not None:
+            created_at, pk, reverse = cursor
+            # (created_at, id) > / < (cursor) written with a plain range on
+            # created_at so the (created_at, id) index can seek to it.
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gte=created_at),
+                    Q(created_at__gt=created_at) | Q(id__gt=pk),
+                ).order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lte=created_at),
+                    Q(created_at__lt=created_at) | Q(id__lt=pk),
+                )
+        return queryset[:self.page_size + 1], cursor
+
+    def finish(self, rows, cursor):
+        """Trim the extra row read by seek() and work out the next/previous cursors."""
+        reverse = cursor is not None and cursor[2]
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if cursor is None:
+            has_next, has_previous = has_more, False
+        elif reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, True
+
+        self.next_cursor = self.encode_cursor(rows[-1], reverse=False) if has_next and rows else None
+        self.previous_cursor = self.encode_cursor(rows[0], reverse=True) if has_previous and rows else None
+        return rows
+
+    def get_next_link(self):
+        return self._link(self.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.previous_cursor)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def encode_cursor(self, row, reverse):
+        payload = {'t': row.created_at.isoformat(), 'i': row.id, 'r': int(reverse)}
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            created_at = parse_datetime(payload['t'])
+            pk = int(payload['i'])
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk, reverse
+
+
+class PageNumberOrCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination by default; clients switch a request to keyset
+    pagination with ?pagination=cursor and then follow the returned
+    next/previous links (which carry ?cursor=). ?page_size= applies to
+    both modes.
+    """
+    pagination_query_param = 'pagination'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def use_cursor(self, queryset, request):
+        if not isinstance(queryset, QuerySet):
+            return False
+        return (
+            KeysetPagination.cursor_query_param in request.query_params
+            or request.query_params.get(self.pagination_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None, lookups=None):
+        """
+        With `lookups`, rows are read as named values_list() tuples; the page
+        count is still taken from `queryset`, so it needs no joins.
+        """
+        self.keyset = None
+        if self.use_cursor(queryset, request):
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.get_page_size(request)
+            return self.keyset.paginate_queryset(queryset, request, view, lookups)
+        if lookups is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page = self.get_page(queryset, request)
+        self.page.object_list = list(_rows(self.page.object_list, lookups))
+        return list(self.page)
+
+    async def apaginate_queryset(self, queryset, request, view=None, lookups=None):
+        """
+        paginate_queryset() for async views: the count and the page rows are
+        read with the async ORM. `queryset` must be a QuerySet.
+        """
+        self.keyset = None
+        if self.use_cursor(queryset, request):
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.get_page_size(request)
+            return await self.keyset.apaginate_queryset(queryset, request, view, lookups)
+
+        count = await queryset.acount()
+        self.page = self.get_page(queryset, request, count)
+        self.page.object_list = [row async for row in _rows(self.page.object_list, lookups)]
+        return list(self.page)
+
+    def get_page(self, queryset, request, count=None):
+        """The requested page of `queryset`, unevaluated, as DRF's paginate_queryset() would pick it."""
+        self.request = request
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        if count is not None:
+            paginator.count = count
+        page_number = self.get_page_number(request, paginator)
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return page
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
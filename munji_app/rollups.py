@@ -0,0 +1,250 @@
+"""
+Incremental maintenance of the DailyRollup reporting table.
+
+Every purchase, expense, miscellaneous cost and production row contributes
+fixed amounts to one rollup row, keyed by (day, category, payment type).
+Saves add the row's contribution (after removing the old one on update),
+deletes remove it, all inside the writing transaction. `rebuild()`
+recomputes the table from scratch.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from . import cache
+from .models import (
+    DailyRollup, Expense, ExpenseHistory, MiscellaneousCost, MiscellaneousCostHistory, MunjiPurchase,
+    MunjiPurchaseHistory, RiceProduction, RiceProductionHistory,
+)
+
+METRICS = (
+    'purchases', 'quantity_bought', 'spend', 'expenses',
+    'misc_costs', 'rice_produced', 'wastage', 'revenue',
+)
+
+
+def contributions(instance):
+    """Return [((day, category_id, payment_type), {metric: amount})] for a saved row."""
+    day = timezone.localdate(instance.created_at)
+    if isinstance(instance, MunjiPurchase):
+        return [((day, instance.category_id, instance.payment_type), {
+            'purchases': 1,
+            'quantity_bought': instance.buying_quantity_munji,
+            'spend': instance.total_munji_price,
+        })]
+    if isinstance(instance, Expense):
+        purchase = instance.munji_purchase
+        return [((day, purchase.category_id, purchase.payment_type), {'expenses': instance.amount})]
+    if isinstance(instance, MiscellaneousCost):
+        return [((day, None, ''), {'misc_costs': instance.amount})]
+    if isinstance(instance, RiceProduction):
+        return [((day, None, ''), {
+            'rice_produced': instance.quantity_produced,
+            'wastage': instance.wastage,
+            'revenue': instance.total_price,
+        })]
+    return []
+
+
+def record(key, deltas, sign=1):
+    """Add (sign=1) or remove (sign=-1) `deltas` on the rollup row for `key`."""
+    day, category_id, payment_type = key
+    deltas = {metric: amount for metric, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    rows = DailyRollup.objects.filter(day=day, category_id=category_id, payment_type=payment_type)
+    if rows.update(**{metric: F(metric) + sign * amount for metric, amount in deltas.items()}):
+        return
+    if sign < 0:
+        # Nothing to take from: the row went with its category.
+        return
+    try:
+        with transaction.atomic():
+            DailyRollup.objects.create(day=day, category_id=category_id, payment_type=payment_type, **deltas)
+    except IntegrityError:
+        # A concurrent writer created the row first.
+        rows.update(**{metric: F(metric) + amount for metric, amount in deltas.items()})
+
+
+def add(instances):
+    """Add the contributions of `instances`, one UPDATE per rollup row touched."""
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    for instance in instances:
+        for key, deltas in contributions(instance):
+            for metric, amount in deltas.items():
+                totals[key][metric] += amount
+    for key, deltas in totals.items():
+        record(key, deltas)
+
+
+def remove(instance):
+    for key, deltas in contributions(instance):
+        record(key, deltas, sign=-1)
+
+
+# --- SIGNAL HANDLERS ---
+def remember_previous(sender, instance, **kwargs):
+    """pre_save: keep the stored row so post_save can take its contribution back."""
+    instance._rollup_previous = None
+    if instance.pk is not None and not instance._state.adding:
+        instance._rollup_previous = sender.objects.filter(pk=instance.pk).first()
+
+
+def on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        remove(previous)
+        if isinstance(instance, MunjiPurchase):
+            _move_expenses(previous, instance)
+    add([instance])
+
+
+def _move_expenses(previous, purchase):
+    """Expenses are keyed by their purchase's category and payment type; follow it."""
+    if (previous.category_id, previous.payment_type) == (purchase.category_id, purchase.payment_type):
+        return
+    per_day = (
+        purchase.expenses.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day')
+        .annotate(total=Sum('amount'))
+    )
+    for row in per_day:
+        record((row['day'], previous.category_id, previous.payment_type), {'expenses': row['total']}, sign=-1)
+        record((row['day'], purchase.category_id, purchase.payment_type), {'expenses': row['total']})
+
+
+def on_delete(sender, instance, **kwargs):
+    remove(instance)
+
+
+# --- REBUILD ---
+def _chunks(queryset, chunk_size):
+    """Yield `queryset` restricted to consecutive primary-key ranges of chunk_size rows."""
+    last = 0
+    while True:
+        bounds = queryset.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)
+        upper = next(iter(bounds[chunk_size - 1:chunk_size]), None)
+        if upper is None:
+            yield queryset.filter(pk__gt=last)
+            return
+        yield queryset.filter(pk__gt=last, pk__lte=upper)
+        last = upper
+
+
+def rebuild(chunk_size=10000, progress=None):
+    """
+    Recompute DailyRollup from the source tables, live and archived rows
+    alike, one grouped aggregate per chunk of rows, and replace the table's
+    contents in one transaction. `progress`, if given, is called with
+    (model, chunk number).
+    """
+    sources = [
+        (MunjiPurchase, MunjiPurchaseHistory, ('category_id', 'payment_type'), {
+            'purchases': Count('id'),
+            'quantity_bought': Sum('buying_quantity_munji'),
+            'spend': Sum('total_munji_price'),
+        }),
+        (Expense, ExpenseHistory, ('munji_purchase__category_id', 'munji_purchase__payment_type'), {
+            'expenses': Sum('amount'),
+        }),
+        (MiscellaneousCost, MiscellaneousCostHistory, (), {
+            'misc_costs': Sum('amount'),
+        }),
+        (RiceProduction, RiceProductionHistory, (), {
+            'rice_produced': Sum('quantity_produced'),
+            'wastage': Sum('wastage'),
+            'revenue': Sum('total_price'),
+        }),
+    ]
+
+    totals = defaultdict(lambda: defaultdict(Decimal))
+    with transaction.atomic():
+        for model, history, key_fields, aggregates in sources:
+            for number, chunk in enumerate(_chunks(history.objects.all(), chunk_size), start=1):
+                rows = (
+                    chunk.order_by()
+                    .annotate(day=TruncDate('created_at'))
+                    .values('day', *key_fields)
+                    .annotate(**aggregates)
+                )
+                for row in rows:
+                    key = (row['day'], *(row[field] for field in key_fields)) if key_fields else (row['day'], None, '')
+                    for metric in aggregates:
+                        totals[key][metric] += row[metric] or 0
+                if progress:
+                    progress(model, number)
+
+        DailyRollup.objects.all().delete()
+        DailyRollup.objects.bulk_create(
+            [
+                DailyRollup(day=day, category_id=category_id, payment_type=payment_type, **metrics)
+                for (day, category_id, payment_type), metrics in totals.items()
+            ],
+            batch_size=chunk_size,
+        )
+        # bulk_create sends no signals, so the reports and the dashboard
+        # would keep serving what they built from the old rows.
+        cache.touch_model(DailyRollup)
+    return len(totals)
+
+
+# --- REPORTS ---
+GROUP_FIELDS = ('category', 'payment_type')
+
+
+def report_options(params):
+    """
+    report() arguments from request-style `params`: ?start_date= / ?end_date=
+    (YYYY-MM-DD, inclusive), ?granularity=day|month and ?group_by= any of
+    category,payment_type (empty for period totals).
+    Raises ValueError with a message for the client.
+    """
+    granularity = params.get('granularity', 'day')
+    if granularity not in ('day', 'month'):
+        raise ValueError('granularity must be day or month.')
+
+    group_by = [field for field in params.get('group_by', ','.join(GROUP_FIELDS)).split(',') if field]
+    if set(group_by) - set(GROUP_FIELDS):
+        raise ValueError('group_by accepts category and payment_type.')
+
+    dates = {}
+    for name in ('start_date', 'end_date'):
+        if params.get(name):
+            try:
+                dates[name] = datetime.strptime(params[name], "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError('Dates must be given as YYYY-MM-DD.') from None
+    return {'granularity': granularity, 'group_by': group_by, **dates}
+
+
+def report(granularity='day', group_by=GROUP_FIELDS, start_date=None, end_date=None):
+    """DailyRollup totals per period and `group_by` fields, in period order."""
+    queryset = DailyRollup.objects.all()
+    if start_date:
+        queryset = queryset.filter(day__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(day__lte=end_date)
+
+    keys = ['period'] + [{'category': 'category__name'}.get(field, field) for field in group_by]
+    rows = (
+        queryset
+        .annotate(period=TruncMonth('day') if granularity == 'month' else F('day'))
+        .values(*keys)
+        .annotate(**{f'total_{metric}': Sum(metric) for metric in METRICS})
+        .order_by(*keys)
+    )
+    return [
+        {
+            'period': row['period'],
+            **({'category': row['category__name']} if 'category' in group_by else {}),
+            **({'payment_type': row['payment_type']} if 'payment_type' in group_by else {}),
+            **{metric: row[f'total_{metric}'] for metric in METRICS},
+        }
+        for row in rows
+    ]
@@ -0,0 +1,77 @@
+"""
+Read-replica routing.
+
+Replicas are the aliases listed in settings.DATABASE_REPLICAS. Reads of
+munji_app models go to a random replica only while `replica_reads()` is
+active, which ReplicaMiddleware does for GET/HEAD requests from clients
+that have not written recently. Everything else goes to the primary:
+writes, reads outside such requests (commands, signals, write requests),
+other apps' models (sessions, auth), GlobalSettings, whose balances
+back the purchase and expense checks, and Job, which workers update while
+clients poll it.
+
+Change stamps are shared by all databases, so a replica that lags behind
+the primary can serve an older body under a newer ETag. Keep replication
+lag below REPLICA_STICKY_SECONDS (see sync_replicas) so a client that
+wrote never sees data older than its own write. Values cached server-side
+under a stamp (the dashboard, search results) and the reports are read
+inside `primary_reads()`: there, a lagging replica's copy would be served
+to every client until the next write.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_replica_reads = ContextVar('munji_replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Let reads in this block go to a replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Send reads in this block to the primary, even inside replica_reads()."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    # Always read from the primary.
+    primary_models = {'munji_app.globalsettings', 'munji_app.job'}
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (
+            not replicas
+            or not _replica_reads.get()
+            or model._meta.app_label != 'munji_app'
+            or model._meta.label_lower in self.primary_models
+        ):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary: rows relate across them.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,111 @@
+"""
+The OpenAPI schema, built once at deploy time and served as a static file.
+
+`manage.py build_openapi` walks the API with drf_yasg and writes the JSON
+to OPENAPI_SCHEMA_FILE. Workers only read that file: drf_yasg is imported
+by the command, never by a request. The file is read once per process and
+named by the hash of its content, so
+  - /openapi.json?v=<hash> (the URL the docs pages load) is cached for a
+    year as immutable;
+  - /openapi.json answers with an ETag and has clients revalidate.
+Without the file (e.g. a fresh checkout), the schema is generated on first
+use and kept for the life of the process.
+"""
+import hashlib
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_safe
+
+logger = logging.getLogger(__name__)
+
+INFO = {
+    'title': 'Munji App API',
+    'default_version': 'v1',
+    'description': 'API documentation for Munji App',
+    'terms_of_service': 'https://www.yourapp.com/terms/',
+    'contact': {'email': 'contact@yourapp.com'},
+    'license': {'name': 'Your License'},
+}
+VERSION_PARAM = 'v'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+# The docs pages embed the schema's hash, so they may only be cached briefly.
+PAGE_MAX_AGE = 300
+
+
+def generate():
+    """The schema as JSON bytes, generated from the URLconf with drf_yasg."""
+    from drf_yasg import openapi
+    from drf_yasg.codecs import OpenAPICodecJson
+    from django.test import RequestFactory
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from rest_framework.request import Request
+
+    info = openapi.Info(
+        **{key: value for key, value in INFO.items() if key not in ('contact', 'license')},
+        contact=openapi.Contact(**INFO['contact']),
+        license=openapi.License(**INFO['license']),
+    )
+    # Views read their request while being inspected. url='' keeps that
+    # request's host out of the schema, so clients use the one they called.
+    request = Request(RequestFactory().get('/openapi.json'))
+    schema = OpenAPISchemaGenerator(info, url='').get_schema(request=request, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+@lru_cache(maxsize=1)
+def load():
+    """(content hash, JSON bytes) of the schema this process serves."""
+    try:
+        with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        logger.warning('%s is missing; generating the schema in-process (run `manage.py build_openapi`).',
+                       settings.OPENAPI_SCHEMA_FILE)
+        content = generate()
+    return content_hash(content), content
+
+
+def versioned_url():
+    digest, _ = load()
+    return f'/openapi.json?{VERSION_PARAM}={digest}'
+
+
+@require_safe
+def schema_json(request):
+    digest, content = load()
+    etag = f'"{digest}"'
+    if request.GET.get(VERSION_PARAM) == digest:
+        cache_control = {'public': True, 'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+    else:
+        cache_control = {'public': True, 'no_cache': True}
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+def _docs_page(request, template):
+    response = render(request, template, {'title': INFO['title'], 'schema_url': versioned_url()})
+    patch_cache_control(response, public=True, max_age=PAGE_MAX_AGE)
+    return response
+
+
+@require_safe
+def swagger_ui(request):
+    return _docs_page(request, 'munji_app/swagger_ui.html')
+
+
+@require_safe
+def redoc(request):
+    return _docs_page(request, 'munji_app/redoc.html')
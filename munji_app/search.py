@@ -0,0 +1,174 @@
+"""
+Name autocomplete for suppliers and categories (?q= on their list routes).
+
+Each searchable model keeps `search_name`, its name case-folded with
+accents and extra spaces removed, in an indexed column. Queries shorter
+than three characters are prefix searches on that index. Longer ones also
+match substrings through an FTS5 trigram table over `search_name`, which
+SQLite triggers keep in step with every insert, update and delete
+(bulk_create included).
+
+Results are ranked: name prefix first, then word prefix, then any other
+substring; ties go to the shorter name, then the earlier match. They are
+cached per query under the model's change stamp.
+
+On SQLite, a migration that remakes a searchable table drops its
+triggers; run `create_index_sql(table)` again after it. The
+munji_app.E001 database check (run by migrate and `check --database`)
+reports tables left without them.
+"""
+import hashlib
+import unicodedata
+
+from django.apps import apps
+from django.core import checks
+from django.db import connections
+from django.db.models import Case, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length, StrIndex
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import cache, routers
+
+# Shortest query matched as a substring; FTS5 trigrams need three characters.
+TRIGRAM = 3
+
+
+def normalize(value):
+    """`value` case-folded, without accents, with single spaces."""
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.casefold().split())
+
+
+def index_table(table):
+    return f'{table}_search'
+
+
+def create_index_sql(table):
+    """SQL creating the trigram table of `table` and the triggers keeping it current."""
+    index = index_table(table)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"search_name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {index}(rowid, search_name) VALUES (new.id, new.search_name); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, search_name) VALUES ('delete', old.id, old.search_name); END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF search_name ON {table} BEGIN "
+        f"INSERT INTO {index}({index}, rowid, search_name) VALUES ('delete', old.id, old.search_name); "
+        f"INSERT INTO {index}(rowid, search_name) VALUES (new.id, new.search_name); END",
+        f"INSERT INTO {index}({index}) VALUES ('rebuild')",
+    ]
+
+
+def drop_index_sql(table):
+    index = index_table(table)
+    return [
+        f"DROP TRIGGER IF EXISTS {index}_insert",
+        f"DROP TRIGGER IF EXISTS {index}_delete",
+        f"DROP TRIGGER IF EXISTS {index}_update",
+        f"DROP TABLE IF EXISTS {index}",
+    ]
+
+
+def trigger_names(table):
+    index = index_table(table)
+    return {f'{index}_insert', f'{index}_delete', f'{index}_update'}
+
+
+def check_index_triggers(app_configs=None, databases=None, **kwargs):
+    """Database check: every searchable table still has the triggers feeding its trigram table."""
+    errors = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+            existing = {name for (name,) in cursor.fetchall()}
+        for model in apps.get_app_config('munji_app').get_models():
+            table = model._meta.db_table
+            # Not searchable, or the migration adding the index has yet to run.
+            if index_table(table) not in existing:
+                continue
+            missing = sorted(trigger_names(table) - existing)
+            if missing:
+                errors.append(checks.Error(
+                    f"{table} is missing the search triggers {', '.join(missing)} on database '{alias}'.",
+                    hint=f'A migration probably remade the table; add a RunSQL running '
+                         f'search.create_index_sql({table!r}) after it.',
+                    obj=model,
+                    id='munji_app.E001',
+                ))
+    return errors
+
+
+def search(queryset, query):
+    """`queryset` narrowed to rows matching the normalized `query`, best match first."""
+    prefix = Q(search_name__gte=query, search_name__lt=query + '\U0010ffff')
+    if len(query) < TRIGRAM:
+        return queryset.filter(prefix).order_by('search_name', 'id')
+
+    index = index_table(queryset.model._meta.db_table)
+    phrase = '"%s"' % query.replace('"', '""')
+    matches = RawSQL(f'SELECT rowid FROM {index} WHERE {index} MATCH %s', [phrase])
+    return queryset.filter(id__in=matches).annotate(
+        search_rank=Case(
+            When(prefix, then=Value(0)),
+            When(search_name__contains=' ' + query, then=Value(1)),
+            default=Value(2),
+        ),
+        search_position=StrIndex('search_name', Value(query)),
+        search_length=Length('search_name'),
+    ).order_by('search_rank', 'search_length', 'search_position', 'search_name', 'id')
+
+
+class SearchMixin:
+    """
+    Viewset mixin answering list requests with ?q= from search(): at most
+    ?limit= (default `search_limit`) ranked rows, in the list response
+    shape without further pages. Needs fastlist.FastListMixin.
+    """
+    search_param = 'q'
+    limit_param = 'limit'
+    search_limit = 10
+    max_search_limit = 50
+
+    def search_query(self):
+        """The normalized ?q=, or None when the request is not a search."""
+        query = normalize(self.request.query_params.get(self.search_param, ''))
+        return query or None
+
+    def get_search_limit(self):
+        value = self.request.query_params.get(self.limit_param)
+        if value is None:
+            return self.search_limit
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.max_search_limit:
+            raise ValidationError({'error': f'limit must be between 1 and {self.max_search_limit}.'})
+        return limit
+
+    def search_results(self):
+        """The response data for a ?q= request, cached until the model changes."""
+        query, limit, fields = self.search_query(), self.get_search_limit(), self.sparse_fields()
+        encoder = self.get_row_encoder()
+        model = self.queryset.model
+        key = hashlib.sha1(repr((query, limit, fields and sorted(fields))).encode()).hexdigest()
+
+        @routers.primary_reads()
+        def load():
+            rows = search(self.get_queryset(), query)[:limit].values_list(*encoder.lookups, named=True)
+            results = encoder.encode_many(rows)
+            return {'count': len(results), 'next': None, 'previous': None, 'results': results}
+
+        return cache.cached(model._meta.label_lower, f'search:{key}', load)
+
+    def list(self, request, *args, **kwargs):
+        if self.search_query() is None:
+            return super().list(request, *args, **kwargs)
+        return Response(self.search_results())
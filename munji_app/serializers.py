@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Supplier, MunjiPurchase, RiceProduction, GlobalSettings,Expense, Category,MiscellaneousCost
+from .models import Job, Supplier, MunjiPurchase, RiceProduction, GlobalSettings,Expense, Category,MiscellaneousCost
 
 
 
@@ -43,6 +43,16 @@ class GlobalSettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = GlobalSettings
         fields = '__all__'
+
+
+class BalancesAsOfSerializer(serializers.Serializer):
+    as_of = serializers.DateField()
+    opening_balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    cash_in_hand = serializers.DecimalField(max_digits=12, decimal_places=2)
+    sales = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_munji = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
 class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
@@ -53,3 +63,47 @@ class MiscellaneousCostSerializer(serializers.ModelSerializer):
     class Meta:
         model = MiscellaneousCost
         fields = '__all__'
+
+
+class ReportRowSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    category = serializers.CharField(required=False)
+    payment_type = serializers.CharField(required=False)
+    purchases = serializers.IntegerField()
+    quantity_bought = serializers.DecimalField(max_digits=16, decimal_places=2)
+    spend = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expenses = serializers.DecimalField(max_digits=16, decimal_places=2)
+    misc_costs = serializers.DecimalField(max_digits=16, decimal_places=2)
+    rice_produced = serializers.DecimalField(max_digits=16, decimal_places=2)
+    wastage = serializers.DecimalField(max_digits=16, decimal_places=2)
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class PaymentSplitSerializer(serializers.Serializer):
+    purchases = serializers.IntegerField()
+    quantity_bought = serializers.DecimalField(max_digits=16, decimal_places=2)
+    spend = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expenses = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class DashboardPeriodSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    purchases = serializers.IntegerField()
+    spend = serializers.DecimalField(max_digits=16, decimal_places=2)
+    expenses = serializers.DecimalField(max_digits=16, decimal_places=2)
+    misc_costs = serializers.DecimalField(max_digits=16, decimal_places=2)
+    cash = PaymentSplitSerializer()
+    credit = PaymentSplitSerializer()
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """A job's status; its result is served separately (see JobViewSet.result)."""
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'message', 'error', 'cancel_requested',
+            'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+        ]
+        read_only_fields = [field for field in fields if field not in ('kind', 'params')]
@@ -0,0 +1,27 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import cache, landed_costs, metrics, rollups
+
+
+def touch_model_stamp(sender, **kwargs):
+    cache.touch_model(sender)
+
+
+def connect(app_config):
+    connection_created.connect(metrics.install, dispatch_uid='metrics-time-queries')
+
+    for model in app_config.get_models():
+        post_save.connect(touch_model_stamp, sender=model, dispatch_uid=f'stamp-save-{model._meta.label_lower}')
+        post_delete.connect(touch_model_stamp, sender=model, dispatch_uid=f'stamp-delete-{model._meta.label_lower}')
+
+    for model in (rollups.MunjiPurchase, rollups.Expense, rollups.MiscellaneousCost, rollups.RiceProduction):
+        label = model._meta.label_lower
+        pre_save.connect(rollups.remember_previous, sender=model, dispatch_uid=f'rollup-pre-save-{label}')
+        post_save.connect(rollups.on_save, sender=model, dispatch_uid=f'rollup-save-{label}')
+        post_delete.connect(rollups.on_delete, sender=model, dispatch_uid=f'rollup-delete-{label}')
+
+    label = landed_costs.Expense._meta.label_lower
+    pre_save.connect(landed_costs.remember_previous, sender=landed_costs.Expense, dispatch_uid=f'landed-cost-pre-save-{label}')
+    post_save.connect(landed_costs.on_save, sender=landed_costs.Expense, dispatch_uid=f'landed-cost-save-{label}')
+    post_delete.connect(landed_costs.on_delete, sender=landed_costs.Expense, dispatch_uid=f'landed-cost-delete-{label}')
@@ -1,3 +1,1648 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import importlib
+import json
+import re
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import checks
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.throttling import BaseThrottle
+
+from . import (
+    archive, async_views, cache, export, idempotency, jobs, landed_costs, ledger, metrics, rollups, routers, schema, search,
+    urls, views,
+)
+from .benchmarks import runner, scenarios, serialization
+from .fastlist import row_encoder
+from .middleware import ReplicaMiddleware
+from .serializers import ExpenseSerializer, GlobalSettingsSerializer
+from .models import (
+    ArchivedExpense, ArchivedMunjiPurchase, ArchiveSummary, Category, DailyRollup, Expense, GlobalSettings,
+    IdempotencyKey, Job, LedgerEntry, LedgerSnapshot, MiscellaneousCost, MunjiPurchase, RiceProduction, Supplier,
+)
+
+
+class MunjiTestCase(TestCase):
+    """TestCase that starts every class and test with empty munji caches."""
+
+    @classmethod
+    def setUpClass(cls):
+        cache.clear()
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+# -----------------------------------------
+# Ledger
+# -----------------------------------------
+class LedgerTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('100'))
+        ledger.add_cash(Decimal('30'))
+
+    def test_require_guard_writes_nothing(self):
+        before, entries = ledger.balances(), LedgerEntry.objects.count()
+        with self.assertRaisesMessage(ValidationError, 'Not enough cash in hand to cover miscellaneous cost.'):
+            ledger.deduct_miscellaneous(Decimal('30.01'))
+        self.assertEqual(ledger.balances(), before)
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+
+    def test_recreates_a_singleton_missing_behind_the_cache(self):
+        GlobalSettings.get_instance()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {GlobalSettings._meta.db_table}')
+        self.assertEqual(ledger.add_capital(Decimal('10'))['opening_balance'], Decimal('10'))
+        self.assertEqual(GlobalSettings.objects.get().opening_balance, Decimal('10'))
+
+    def test_sales_and_production_are_journaled(self):
+        ledger.adjust(sales=Decimal('75'))
+        ledger.add_munji(Decimal('20'))
+        RiceProduction.objects.create(
+            quantity_produced=Decimal('8'), dryer_cost=0, factory_cost=0, wastage=0, quality_of_rice=0,
+            rice_price_per_unit=Decimal('2'), total_quality=Decimal('5'), total_price=Decimal('10'),
+            naku_price=0, naku_quantity=0,
+        )
+        sale, production = LedgerEntry.objects.filter(
+            kind__in=[LedgerEntry.ADJUSTMENT, LedgerEntry.PRODUCTION],
+        ).order_by('id')
+        self.assertEqual((sale.kind, sale.sales), (LedgerEntry.ADJUSTMENT, Decimal('75')))
+        self.assertEqual((production.kind, production.total_munji), (LedgerEntry.PRODUCTION, Decimal('-8')))
+        self.assertEqual(ledger.balances()['sales'], Decimal('75'))
+        self.assertEqual(ledger.balances()['total_munji'], Decimal('12'))
+
+
+class BalancesAsOfTests(MunjiTestCase):
+    @override_settings(LEDGER_SNAPSHOT_INTERVAL=3)
+    def test_snapshot_plus_journal_tail(self):
+        # After the snapshot the migrations take of the opening balances.
+        first_day = timezone.now() + datetime.timedelta(days=1)
+        changes = [
+            lambda: ledger.add_capital(Decimal('500')),
+            lambda: ledger.add_cash(Decimal('200')),
+            lambda: ledger.deduct_expense(Decimal('15')),
+            lambda: ledger.adjust(sales=Decimal('40')),
+            lambda: ledger.add_munji(Decimal('30')),
+            lambda: ledger.deduct_purchase(Decimal('60'), Decimal('12')),
+            lambda: ledger.add_capital(Decimal('25')),
+            lambda: ledger.deduct_miscellaneous(Decimal('5')),
+        ]
+        for day, change in enumerate(changes):
+            with mock.patch('django.utils.timezone.now', return_value=first_day + datetime.timedelta(days=day)):
+                change()
+        snapshots = list(LedgerSnapshot.objects.values_list('created_at', flat=True))
+        self.assertGreaterEqual(len(snapshots), 2)
+
+        def recomputed(moment):
+            totals = LedgerEntry.objects.filter(created_at__lt=moment).aggregate(
+                **{field: Sum(field) for field in ledger.BALANCE_FIELDS}
+            )
+            return {field: totals[field] or Decimal(0) for field in ledger.BALANCE_FIELDS}
+
+        half_day = datetime.timedelta(hours=12)
+        moments = [first_day - half_day]
+        for snapshot in snapshots:
+            moments += [snapshot - half_day, snapshot, snapshot + half_day]
+        moments.append(first_day + datetime.timedelta(days=len(changes)))
+        for moment in moments:
+            with self.subTest(moment=moment):
+                if any(snapshot < moment for snapshot in snapshots):
+                    self.assertEqual(ledger.as_of(moment), recomputed(moment))
+                else:
+                    self.assertIsNone(ledger.as_of(moment))
+
+        last_day = timezone.localdate(first_day + datetime.timedelta(days=len(changes) - 1))
+        data = self.client.get('/api/globals/as-of/', {'date': str(last_day)}).json()
+        self.assertEqual({field: Decimal(data[field]) for field in ledger.BALANCE_FIELDS}, ledger.balances())
+
+
+class BulkPurchaseTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('100'))
+        ledger.add_cash(Decimal('100'))
+
+    def test_refused_ledger_change_rolls_back_the_batch(self):
+        row = {'total_bags': 1, 'buying_quantity_munji': '10.00', 'munji_price_per_unit': '5.00'}
+        batch = [{**row, 'payment_type': 'Credit'}] + [{**row, 'payment_type': 'Cash'}] * 3
+        before, entries = ledger.balances(), LedgerEntry.objects.count()
+        response = self.client.post('/api/purchases/bulk/', batch, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Not enough cash in hand for this purchase.'})
+        self.assertFalse(MunjiPurchase.objects.exists())
+        self.assertFalse(DailyRollup.objects.exists())
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+        self.assertEqual(ledger.balances(), before)
+
+
+class LedgerEditTests(MunjiTestCase):
+    """Editing a row charges or credits only the difference from the stored row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+        cls.purchase = MunjiPurchase.objects.create(
+            total_bags=1, buying_quantity_munji=Decimal('10'), munji_price_per_unit=Decimal('5'), payment_type='Cash',
+        )
+        cls.expense = Expense.objects.create(munji_purchase=cls.purchase, title='Labour', amount=Decimal('4'))
+
+    def patch(self, url, data):
+        response = self.client.patch(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def assertLedger(self, cash, munji, entries):
+        balances = ledger.balances()
+        self.assertEqual((balances['cash_in_hand'], balances['total_munji']), (Decimal(cash), Decimal(munji)))
+        self.assertEqual(list(LedgerEntry.objects.filter(id__gt=self.last_entry).values_list('kind', 'cash_in_hand', 'total_munji')), [
+            (kind, Decimal(cash_delta), Decimal(munji_delta)) for kind, cash_delta, munji_delta in entries
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.last_entry = LedgerEntry.objects.order_by('-id').values_list('id', flat=True).first()
+        self.assertLedger('946', '10', [])
+
+    def test_purchase_edits(self):
+        url = f'/api/purchases/{self.purchase.pk}/'
+        self.patch(url, {'total_bags': 3})
+        self.assertLedger('946', '10', [])
+        self.patch(url, {'buying_quantity_munji': '14.00'})
+        self.assertLedger('926', '14', [(LedgerEntry.PURCHASE, '-20', '4')])
+        self.patch(url, {'buying_quantity_munji': '8.00'})
+        self.assertLedger('956', '8', [(LedgerEntry.PURCHASE, '-20', '4'), (LedgerEntry.PURCHASE, '30', '-6')])
+        self.patch(url, {'payment_type': 'Credit'})
+        self.assertLedger('996', '8', [
+            (LedgerEntry.PURCHASE, '-20', '4'), (LedgerEntry.PURCHASE, '30', '-6'), (LedgerEntry.PURCHASE, '40', '0'),
+        ])
+        rows = self.client.get('/api/reports/', {'group_by': 'payment_type'}).json()['results']
+        self.assertEqual({row['payment_type']: row['spend'] for row in rows}, {'Cash': '0.00', 'Credit': '40.00'})
+
+    def test_expense_and_misc_cost_edits(self):
+        self.patch(f'/api/expenses/{self.expense.pk}/', {'title': 'Loading'})
+        self.assertLedger('946', '10', [])
+        self.patch(f'/api/expenses/{self.expense.pk}/', {'amount': '10.00'})
+        self.assertLedger('940', '10', [(LedgerEntry.EXPENSE, '-6', '0')])
+        self.patch(f'/api/expenses/{self.expense.pk}/', {'amount': '1.00'})
+        self.assertLedger('949', '10', [(LedgerEntry.EXPENSE, '-6', '0'), (LedgerEntry.EXPENSE, '9', '0')])
+
+        cost = MiscellaneousCost.objects.create(title='Diesel', amount=Decimal('5'))
+        self.patch(f'/api/miscellaneous-costs/{cost.pk}/', {'amount': '2.00'})
+        self.assertEqual(ledger.balances()['cash_in_hand'], Decimal('947'))
+
+    def test_edit_beyond_cash_in_hand_is_refused(self):
+        response = self.client.patch(
+            f'/api/purchases/{self.purchase.pk}/', {'buying_quantity_munji': '300.00'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertLedger('946', '10', [])
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.buying_quantity_munji, Decimal('10'))
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    def test_competing_deductions_apply_once(self):
+        ledger.add_capital(Decimal('100'))
+        ledger.add_cash(Decimal('100'))
+        start = threading.Barrier(2)
+        outcomes = []
+
+        def deduct():
+            try:
+                start.wait()
+                ledger.deduct_expense(Decimal('60'))
+                outcomes.append('applied')
+            except ValidationError:
+                outcomes.append('refused')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=deduct) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(sorted(outcomes), ['applied', 'refused'])
+        self.assertEqual(ledger.balances()['cash_in_hand'], Decimal('40'))
+        self.assertEqual(LedgerEntry.objects.filter(kind=LedgerEntry.EXPENSE).count(), 1)
+
+
+# -----------------------------------------
+# Conditional GETs
+# -----------------------------------------
+class ConditionalGetTests(MunjiTestCase):
+    @override_settings(MUNJI_SINGLE_PROCESS=True)
+    def test_validators_follow_writes(self):
+        etag = self.client.get('/api/categories/')['ETag']
+        self.assertEqual(self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Category.objects.create(name='Barley')
+        response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_process_local_cache_serves_no_validators(self):
+        response = self.client.get('/api/categories/')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get('/api/categories/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+
+    def test_shared_cache_serves_validators(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            self.assertTrue(cache.is_shared())
+            etag = self.client.get('/api/categories/')['ETag']
+            self.assertEqual(self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ReadThroughTests(MunjiTestCase):
+    def read(self, values):
+        return cache.read_through('munji_app.test', lambda: values.pop(0))
+
+    def test_process_local_cache_expires(self):
+        # Another worker's write never reaches this process's stamp, so
+        # only the cache timeout bounds how long a copy is served.
+        values = ['old', 'new']
+        self.assertEqual(self.read(values), 'old')
+        self.assertEqual(self.read(values), 'old')
+        later = time.time() + settings.MUNJI_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self.read(values), 'new')
+
+    async def test_async_process_local_cache_expires(self):
+        values = ['old', 'new']
+
+        async def load():
+            return values.pop(0)
+
+        self.assertEqual(await cache.aread_through('munji_app.test', load), 'old')
+        later = time.time() + settings.MUNJI_CACHE_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(await cache.aread_through('munji_app.test', load), 'new')
+
+    @override_settings(MUNJI_SINGLE_PROCESS=True)
+    def test_shared_stamps_keep_a_process_copy(self):
+        values = ['old', 'new']
+        self.assertEqual(self.read(values), 'old')
+        token, _ = cache.stamp('munji_app.test')
+        cache._cache().delete(cache.VALUE_KEY.format(name='munji_app.test', token=token))
+        self.assertEqual(self.read(values), 'old')
+        cache.touch('munji_app.test')
+        self.assertEqual(self.read(values), 'new')
+
+
+# -----------------------------------------
+# Daily rollups
+# -----------------------------------------
+class RollupRebuildTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('100'))
+        ledger.add_cash(Decimal('100'))
+        category = Category.objects.create(name='Basmati')
+        purchase = MunjiPurchase.objects.create(
+            category=category, total_bags=1, buying_quantity_munji=Decimal('10'),
+            munji_price_per_unit=Decimal('5'), payment_type='Cash',
+        )
+        Expense.objects.create(munji_purchase=purchase, title='Labour', amount=Decimal('4'))
+        MiscellaneousCost.objects.create(title='Diesel', amount=Decimal('3'))
+
+    def rows(self):
+        return list(DailyRollup.objects.order_by('day', 'category', 'payment_type').values(
+            'day', 'category', 'payment_type', *rollups.METRICS,
+        ))
+
+    @override_settings(MUNJI_SINGLE_PROCESS=True)
+    def test_rebuild_invalidates_reports_and_dashboard(self):
+        expected = self.rows()
+        DailyRollup.objects.update(spend=0, misc_costs=0)
+        etag = self.client.get('/api/reports/')['ETag']
+        self.assertEqual(self.client.get('/api/dashboard/').json()['today']['spend'], '0.00')
+
+        rollups.rebuild()
+        self.assertEqual(self.rows(), expected)
+        response = self.client.get('/api/reports/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['spend'] for row in response.json()['results'] if row['category']], ['50.00'])
+        self.assertEqual(self.client.get('/api/dashboard/').json()['today']['spend'], '50.00')
+
+    def test_migration_backfills_the_table(self):
+        migration = importlib.import_module('munji_app.migrations.0007_daily_rollups')
+        expected = self.rows()
+        DailyRollup.objects.all().delete()
+        migration.backfill_rollups(django_apps, None)
+        self.assertEqual(self.rows(), expected)
+
+
+class RollupSignalTests(MunjiTestCase):
+    """Each write keeps DailyRollup equal to what rebuild() computes from scratch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+        cls.basmati, cls.sella = Category.objects.create(name='Basmati'), Category.objects.create(name='Sella')
+
+    def setUp(self):
+        self.purchase = MunjiPurchase.objects.create(
+            category=self.basmati, total_bags=1, buying_quantity_munji=Decimal('10'),
+            munji_price_per_unit=Decimal('5'), payment_type='Cash',
+        )
+        self.expense = Expense.objects.create(munji_purchase=self.purchase, title='Labour', amount=Decimal('4'))
+        self.cost = MiscellaneousCost.objects.create(title='Diesel', amount=Decimal('3'))
+
+    def rows(self):
+        # Removing a row's contribution leaves a zeroed rollup row behind,
+        # which rebuild() does not create.
+        return [
+            row for row in DailyRollup.objects.order_by('day', 'category', 'payment_type').values(
+                'day', 'category', 'payment_type', *rollups.METRICS,
+            )
+            if any(row[metric] for metric in rollups.METRICS)
+        ]
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rows())
+        return incremental
+
+    def test_create(self):
+        rows = self.assertMatchesRebuild()
+        self.assertEqual(
+            [(row['category'], row['spend'], row['expenses'], row['misc_costs']) for row in rows],
+            [(None, 0, 0, Decimal('3')), (self.basmati.pk, Decimal('50'), Decimal('4'), 0)],
+        )
+
+    def test_update(self):
+        self.purchase.buying_quantity_munji = Decimal('12')
+        self.purchase.save()
+        self.expense.amount = Decimal('6')
+        self.expense.save()
+        self.cost.amount = Decimal('1')
+        self.cost.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([row['spend'] for row in rows if row['category']], [Decimal('60')])
+
+    def test_changing_the_day(self):
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        for instance in (self.purchase, self.expense, self.cost):
+            instance.created_at = yesterday
+            instance.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual({row['day'] for row in rows}, {timezone.localdate(yesterday)})
+
+    def test_changing_the_category_moves_the_expenses(self):
+        self.purchase.category = self.sella
+        self.purchase.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([(row['category'], row['expenses']) for row in rows if row['category']], [(self.sella.pk, Decimal('4'))])
+
+    def test_changing_the_payment_type_moves_the_expenses(self):
+        self.purchase.payment_type = 'Credit'
+        self.purchase.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([(row['payment_type'], row['expenses']) for row in rows if row['category']], [('Credit', Decimal('4'))])
+
+    def test_delete(self):
+        self.expense.delete()
+        self.cost.delete()
+        self.assertMatchesRebuild()
+        self.purchase.delete()
+        self.assertEqual(self.assertMatchesRebuild(), [])
+
+
+# -----------------------------------------
+# Exports
+# -----------------------------------------
+class ExportTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+        basmati, sella = Category.objects.create(name='Basmati'), Category.objects.create(name='Sella')
+        supplier = Supplier.objects.create(name='Amigo Traders')
+        cls.purchases = [
+            MunjiPurchase.objects.create(
+                supplier=supplier, category=category, total_bags=2, buying_quantity_munji=Decimal('10'),
+                munji_price_per_unit=Decimal('5'), payment_type='Cash',
+            )
+            for category in (basmati, sella)
+        ]
+        for day, title in [(1, 'Diesel'), (2, 'Tea'), (3, 'Rent')]:
+            cost = MiscellaneousCost.objects.create(title=title, amount=Decimal(day))
+            MiscellaneousCost.objects.filter(pk=cost.pk).update(
+                created_at=timezone.make_aware(datetime.datetime(2026, 3, day, 12)),
+            )
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_header_and_rows(self):
+        lines = self.export('/api/purchases/export/?format=csv').splitlines()
+        self.assertEqual(lines[0], ','.join([
+            'id', 'supplier', 'category', 'total_bags', 'buying_quantity_munji', 'munji_price_per_unit',
+            'total_munji_price', 'total_munji_cost', 'payment_type', 'created_at',
+        ]))
+        purchase = self.purchases[1]
+        api = self.client.get(f'/api/purchases/{purchase.pk}/').json()
+        self.assertEqual(lines[1], ','.join([
+            str(purchase.pk), 'Amigo Traders', 'Sella', '2', '10.00', '5.00', '50.00', '50.00', 'Cash', api['created_at'],
+        ]))
+        self.assertEqual(len(lines), 3)
+
+    def test_ndjson_rows(self):
+        response = self.client.get('/api/miscellaneous-costs/export/?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="miscellaneouscost.ndjson"')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(row['title'], row['amount']) for row in rows], [('Rent', '3.00'), ('Tea', '2.00'), ('Diesel', '1.00')])
+
+    def test_date_and_category_filters(self):
+        lines = self.export('/api/miscellaneous-costs/export/?format=csv&start_date=2026-03-02&end_date=2026-03-02')
+        self.assertEqual([line.split(',')[1] for line in lines.splitlines()[1:]], ['Tea'])
+        for category in ('Basmati', str(self.purchases[0].category_id)):
+            lines = self.export(f'/api/purchases/export/?format=csv&category={category}').splitlines()
+            self.assertEqual([line.split(',')[0] for line in lines[1:]], [str(self.purchases[0].pk)])
+
+    def test_unknown_format_is_a_bad_request(self):
+        response = self.client.get('/api/purchases/export/?format=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'error': 'format must be csv or ndjson.'})
+        self.assertEqual(self.client.get('/api/purchases/?format=xml').status_code, 404)
+
+    async def test_asgi_streams_batch_by_batch(self):
+        events = []
+        stream_csv = export.stream_csv
+
+        def recorded(header, rows):
+            for chunk in stream_csv(header, rows):
+                events.append('produced')
+                yield chunk
+
+        with mock.patch.object(export, 'BATCH_SIZE', 1), mock.patch.object(export, 'stream_csv', recorded):
+            response = await self.async_client.get('/api/purchases/export/?format=csv')
+            self.assertTrue(response.is_async)
+            async for chunk in response.streaming_content:
+                events.append('received')
+        # Buffered, every chunk would be produced before the first is sent.
+        self.assertEqual(events, ['produced', 'received'] * 3)
+
+
+# -----------------------------------------
+# Landed costs
+# -----------------------------------------
+class LandedCostTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+        cls.first, cls.second = [
+            MunjiPurchase.objects.create(
+                total_bags=1, buying_quantity_munji=Decimal('10'), munji_price_per_unit=Decimal('5'), payment_type='Cash',
+            )
+            for _ in range(2)
+        ]
+        cls.expense = Expense.objects.create(munji_purchase=cls.first, title='Labour', amount=Decimal('4'))
+        Expense.objects.create(munji_purchase=cls.first, title='Transport', amount=Decimal('6'))
+
+    def landed(self, purchase):
+        purchase.refresh_from_db()
+        return purchase.total_munji_cost, purchase.expense_count
+
+    def test_new_expenses_add_up(self):
+        self.assertEqual(self.landed(self.first), (Decimal('60'), 2))
+        self.assertEqual(self.landed(self.second), (Decimal('50'), 0))
+
+    def test_editing_the_amount(self):
+        response = self.client.patch(f'/api/expenses/{self.expense.pk}/', {'amount': '9.50'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.landed(self.first), (Decimal('65.50'), 2))
+
+    def test_moving_to_another_purchase(self):
+        response = self.client.patch(
+            f'/api/expenses/{self.expense.pk}/', {'munji_purchase': self.second.pk, 'amount': '7'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.landed(self.first), (Decimal('56'), 1))
+        self.assertEqual(self.landed(self.second), (Decimal('57'), 1))
+
+    def test_deleting(self):
+        self.assertEqual(self.client.delete(f'/api/expenses/{self.expense.pk}/').status_code, 204)
+        self.assertEqual(self.landed(self.first), (Decimal('56'), 1))
+
+    def test_repair_fixes_drifted_totals(self):
+        MunjiPurchase.objects.filter(pk=self.first.pk).update(total_munji_cost=Decimal('1'), expense_count=9)
+        MunjiPurchase.objects.filter(pk=self.second.pk).update(expense_count=3)
+        out = StringIO()
+        call_command('repair_landed_costs', batch_size=1, stdout=out)
+        self.assertIn('2 purchases corrected', out.getvalue())
+        self.assertEqual(self.landed(self.first), (Decimal('60'), 2))
+        self.assertEqual(self.landed(self.second), (Decimal('50'), 0))
+        self.assertEqual(landed_costs.repair(), 0)
+
+
+# -----------------------------------------
+# Data generation
+# -----------------------------------------
+class GenerateDataTests(MunjiTestCase):
+    options = {
+        'suppliers': 4, 'purchases': 12, 'expenses': 20, 'production': 6, 'misc_costs': 7,
+        'seed': 7, 'end': datetime.date(2026, 6, 30),
+    }
+
+    def generate(self, **options):
+        command = importlib.import_module('munji_app.management.commands.generate_data')
+        # Several chunks per model even at this size.
+        with mock.patch.object(command, 'CHUNK_ROWS', 5):
+            call_command('generate_data', stdout=StringIO(), **{**self.options, **options})
+        by_time = ('created_at', 'id')
+        return {
+            'suppliers': list(Supplier.objects.order_by('name').values_list('name', flat=True)),
+            'purchases': list(MunjiPurchase.objects.order_by(*by_time).values_list(
+                'supplier__name', 'category__name', 'total_bags', 'buying_quantity_munji', 'munji_price_per_unit',
+                'total_munji_price', 'total_munji_cost', 'expense_count', 'payment_type', 'created_at',
+            )),
+            'expenses': list(Expense.objects.order_by(*by_time).values_list(
+                'munji_purchase__created_at', 'title', 'amount', 'created_at',
+            )),
+            'production': list(RiceProduction.objects.order_by(*by_time).values_list(
+                'quantity_produced', 'wastage', 'total_price', 'naku_quantity', 'created_at',
+            )),
+            'misc_costs': list(MiscellaneousCost.objects.order_by(*by_time).values_list('title', 'amount', 'created_at')),
+            'balances': ledger.balances(),
+        }
+
+    def test_counts_match_the_options(self):
+        rows = self.generate()
+        for name in ('suppliers', 'purchases', 'expenses', 'production', 'misc_costs'):
+            self.assertEqual(len(rows[name]), self.options[name], name)
+        self.assertEqual(sum(purchase[7] for purchase in rows['purchases']), self.options['expenses'])
+        self.assertTrue(all(moment.date() <= self.options['end'] for *_, moment in rows['purchases']))
+
+    def test_same_seed_same_rows(self):
+        with transaction.atomic():
+            first = self.generate()
+            transaction.set_rollback(True)
+        cache.clear()
+        self.assertEqual(self.generate(batch_size=3), first)
+
+    def test_other_seed_other_rows(self):
+        with transaction.atomic():
+            first = self.generate()
+            transaction.set_rollback(True)
+        cache.clear()
+        self.assertNotEqual(self.generate(seed=8)['purchases'], first['purchases'])
+
+
+# -----------------------------------------
+# Query plans
+# -----------------------------------------
+class QueryPlanTests(MunjiTestCase):
+    """
+    Run every list/filter query through EXPLAIN QUERY PLAN and fail if it
+    scans a whole table or sorts through a temporary B-tree.
+    """
+    # One-row tables that are fine to scan.
+    SCAN_ALLOWED = {'munji_app_globalsettings'}
+
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('100000'))
+        ledger.add_cash(Decimal('100000'))
+        cls.category = Category.objects.create(name='Paddy')
+        Supplier.objects.create(name='Mill Supplier')
+        for i in range(15):
+            purchase = MunjiPurchase.objects.create(
+                category=cls.category,
+                total_bags=1,
+                buying_quantity_munji=Decimal('10'),
+                munji_price_per_unit=Decimal('5'),
+                payment_type=MunjiPurchase.CASH if i % 2 else MunjiPurchase.CREDIT,
+            )
+            Expense.objects.create(munji_purchase=purchase, title='Labor', amount=Decimal('1'))
+            MiscellaneousCost.objects.create(title='Diesel', amount=Decimal('1'))
+        cls.purchase = purchase
+
+    def capture_selects(self, url):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response, queries
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlan(self, sql, params, label):
+        for step in self.explain(sql, params):
+            self.assertNotIn('TEMP B-TREE', step, f'{label}: sorts in a temp B-tree\n{sql}')
+            match = re.match(r'SCAN (\w+)$', step)
+            if match and match.group(1) not in self.SCAN_ALLOWED:
+                self.fail(f'{label}: full table scan of {match.group(1)}\n{sql}')
+
+    def assertEndpointIndexed(self, url):
+        response, queries = self.capture_selects(url)
+        self.assertTrue(queries, url)
+        for sql, params in queries:
+            self.assertIndexedPlan(sql, params, url)
+        return response
+
+    def test_list_endpoints(self):
+        for url in [
+            '/api/purchases/',
+            '/api/expenses/',
+            '/api/miscellaneous-costs/',
+            '/api/suppliers/',
+            '/api/categories/',
+            '/api/recent_purchases/',
+            f'/api/purchases/{self.purchase.pk}/expenses/',
+            '/api/suppliers/?q=mi',
+            '/api/jobs/',
+        ]:
+            with self.subTest(url=url):
+                self.assertEndpointIndexed(url)
+
+    def test_purchase_filters(self):
+        for query in [
+            'start_date=2020-01-01',
+            'start_date=2020-01-01&end_date=2099-12-31',
+            'payment_type=cash',
+            'payment_type=Credit&start_date=2020-01-01',
+            f'category={self.category.pk}',
+            f'category={self.category.pk}&start_date=2020-01-01&end_date=2099-12-31',
+        ]:
+            with self.subTest(query=query):
+                self.assertEndpointIndexed(f'/api/purchases/?{query}')
+
+    def test_cursor_pages_seek_instead_of_scanning(self):
+        for url in ['/api/purchases/', '/api/expenses/', '/api/miscellaneous-costs/']:
+            with self.subTest(url=url):
+                first = self.assertEndpointIndexed(url + '?pagination=cursor').json()
+                _, queries = self.capture_selects(first['next'])
+                page_query = queries[-1]
+                self.assertIndexedPlan(*page_query, label=first['next'])
+                self.assertTrue(
+                    any(step.startswith('SEARCH') for step in self.explain(*page_query)),
+                    f'{url}: cursor page does not seek on the index',
+                )
+
+    def test_production_list(self):
+        sql, params = RiceProduction.objects.order_by('-created_at')[:10].query.sql_with_params()
+        self.assertIndexedPlan(sql, params, 'production list')
+
+
+# -----------------------------------------
+# Query budgets
+# -----------------------------------------
+def route_names(patterns=None):
+    """Names of every route registered in munji_app/urls.py."""
+    names = set()
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class QueryBudgetTestCase(MunjiTestCase):
+    """
+    Seeds data through `generate_data` and checks GET routes against a
+    query budget. Subclasses list every route in ROUTE_BUDGETS as
+    name -> (max queries, model whose first row is the pk, query string);
+    a budget of None marks a route with no GET handler.
+    """
+    ROUTE_BUDGETS = {}
+    generate_data_options = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', stdout=StringIO(), **cls.generate_data_options)
+
+    def route_url(self, name):
+        _, model, query = self.ROUTE_BUDGETS[name]
+        kwargs = {'pk': model.objects.order_by('pk').values_list('pk', flat=True).first()} if model else {}
+        url = reverse(name, kwargs=kwargs)
+        return f'{url}?{query}' if query else url
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{url}: {response.status_code}')
+        return len(captured.captured_queries)
+
+    def assertWithinBudget(self, url, budget):
+        used = self.count_queries(url)
+        self.assertLessEqual(used, budget, f'{url} ran {used} queries, budget is {budget}')
+
+    def assertQueriesIndependentOfPageSize(self, url):
+        separator = '&' if '?' in url else '?'
+        self.client.get(url)  # compare steady-state counts, with caches warm
+        small = self.count_queries(f'{url}{separator}page_size=2')
+        large = self.count_queries(f'{url}{separator}page_size=50')
+        self.assertEqual(small, large, f'{url}: query count grows with page size ({small} -> {large})')
+
+
+class RouteQueryBudgetTests(QueryBudgetTestCase):
+    ROUTE_BUDGETS = {
+        'api-root': (0, None, ''),
+        'payment-choices': (0, None, ''),
+        'recent_purchases': (2, None, ''),
+        'reports': (1, None, ''),
+        'dashboard': (3, None, ''),
+        'supplier-list': (2, None, ''),
+        'supplier-detail': (1, Supplier, ''),
+        'category-list': (2, None, ''),
+        'category-detail': (1, Category, ''),
+        'munjipurchase-list': (2, None, ''),
+        'munjipurchase-detail': (1, MunjiPurchase, ''),
+        'munjipurchase-expenses': (3, MunjiPurchase, ''),
+        'munjipurchase-bulk': (None, None, ''),
+        'globalsettings-list': (1, None, ''),
+        'globalsettings-detail': (1, GlobalSettings, ''),
+        'globalsettings-as-of': (2, None, 'date=2099-01-01'),
+        'expense-list': (2, None, ''),
+        'expense-detail': (1, Expense, ''),
+        'miscellaneouscost-list': (2, None, ''),
+        'miscellaneouscost-detail': (1, MiscellaneousCost, ''),
+        'munjipurchase-export': (1, None, ''),
+        'expense-export': (1, None, ''),
+        'miscellaneouscost-export': (1, None, ''),
+        'riceproduction-export': (1, None, ''),
+        'metrics': (0, None, ''),
+        'job-list': (2, None, ''),
+        'job-detail': (1, Job, ''),
+        'job-result': (1, Job, ''),
+        'job-cancel': (None, None, ''),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        jobs.submit('report')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(route_names() - set(self.ROUTE_BUDGETS), set())
+
+    def test_routes_stay_within_budget(self):
+        for name, (budget, _, _) in self.ROUTE_BUDGETS.items():
+            if budget is None:
+                continue
+            with self.subTest(route=name):
+                self.assertWithinBudget(self.route_url(name), budget)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        for name in self.ROUTE_BUDGETS:
+            if name.endswith('-list') or name in ('recent_purchases', 'munjipurchase-expenses'):
+                with self.subTest(route=name):
+                    url = self.route_url(name)
+                    self.assertQueriesIndependentOfPageSize(url)
+                    self.assertQueriesIndependentOfPageSize(f'{url}?pagination=cursor')
+
+
+# -----------------------------------------
+# SQLite concurrency
+# -----------------------------------------
+class SQLiteConcurrencyTests(TransactionTestCase):
+    """Readers keep being served while purchases are written (WAL)."""
+
+    def setUp(self):
+        cache.clear()
+        ledger.add_capital(Decimal('100000'))
+        MunjiPurchase.objects.create(
+            total_bags=1, buying_quantity_munji=Decimal('10'), munji_price_per_unit=Decimal('5'),
+            payment_type=MunjiPurchase.CREDIT,
+        )
+
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_readers_are_not_blocked_by_writers(self):
+        readers = 3
+        writing = threading.Event()
+        # The writer commits only once every reader has been served meanwhile.
+        served = threading.Barrier(readers + 1, timeout=30)
+        errors, counts = [], []
+
+        def write():
+            try:
+                # A one-page cache makes the open transaction spill dirty pages
+                # to disk, which without WAL takes the exclusive lock and shuts
+                # readers out.
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute('PRAGMA cache_size=1')
+                    MunjiPurchase.objects.bulk_create([
+                        MunjiPurchase(
+                            total_bags=1, buying_quantity_munji=Decimal('10'), munji_price_per_unit=Decimal('5'),
+                            total_munji_price=Decimal('50'), payment_type=MunjiPurchase.CREDIT,
+                        )
+                        for _ in range(500)
+                    ])
+                    writing.set()
+                    served.wait()
+            except Exception as e:
+                errors.append(e)
+                served.abort()
+            finally:
+                writing.set()
+                connection.close()
+
+        def read():
+            try:
+                writing.wait()
+                response = self.client_class().get('/api/purchases/')
+                counts.append(response.json()['count'] if response.status_code == 200 else response.status_code)
+                served.wait()
+            except Exception as e:
+                errors.append(e)
+                served.abort()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # Every reader was answered from the last commit while the write was open.
+        self.assertEqual(counts, [1] * readers)
+        self.assertEqual(MunjiPurchase.objects.count(), 501)
+
+
+# -----------------------------------------
+# Read replicas
+# -----------------------------------------
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    def route(self, request):
+        """Run `request` through ReplicaMiddleware; return (response, db chosen for reads)."""
+        seen = {}
+
+        def view(request):
+            router = routers.ReplicaRouter()
+            seen['purchase'] = router.db_for_read(MunjiPurchase)
+            seen['globals'] = router.db_for_read(GlobalSettings)
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        response = ReplicaMiddleware(view)(request)
+        return response, seen
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(routers.ReplicaRouter().db_for_read(MunjiPurchase), 'default')
+
+    def test_get_reads_from_replicas_except_global_settings(self):
+        _, seen = self.route(RequestFactory().get('/api/purchases/'))
+        self.assertEqual(seen, {'purchase': 'replica1', 'globals': 'default'})
+
+    def test_writes_stay_on_primary_and_make_the_client_sticky(self):
+        response, seen = self.route(RequestFactory().post('/api/purchases/'))
+        self.assertEqual(seen['purchase'], 'default')
+        self.assertEqual(routers.ReplicaRouter().db_for_write(MunjiPurchase), 'default')
+        cookie = response.cookies[ReplicaMiddleware.cookie_name]
+
+        request = RequestFactory().get('/api/purchases/')
+        request.COOKIES[ReplicaMiddleware.cookie_name] = cookie.value
+        _, seen = self.route(request)
+        self.assertEqual(seen['purchase'], 'default')
+
+        request.COOKIES[ReplicaMiddleware.cookie_name] = str(time.time() - 1)
+        _, seen = self.route(request)
+        self.assertEqual(seen['purchase'], 'replica1')
+
+    async def test_async_streamed_bodies_read_from_replicas(self):
+        async def body():
+            yield routers.ReplicaRouter().db_for_read(MunjiPurchase).encode()
+
+        async def view(request):
+            return StreamingHttpResponse(body())
+
+        response = await ReplicaMiddleware(view)(RequestFactory().get('/api/purchases/export/'))
+        self.assertEqual([chunk async for chunk in response.streaming_content], [b'replica1'])
+
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class PrimaryReadTests(MunjiTestCase):
+    """Bodies cached or validated under the primary's stamps are read from the primary."""
+
+    def routed(self, url):
+        chosen = []
+        db_for_read = routers.ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            chosen.append(db_for_read(router, model, **hints))
+            return 'default'
+
+        with mock.patch.object(routers.ReplicaRouter, 'db_for_read', record):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return set(chosen)
+
+    def test_cached_bodies_read_from_the_primary(self):
+        Supplier.objects.create(name='Amigo Traders')
+        self.assertEqual(self.routed('/api/purchases/'), {'replica1'})
+        for url in ('/api/dashboard/', '/api/reports/', '/api/suppliers/?q=amigo'):
+            with self.subTest(url=url):
+                self.assertEqual(self.routed(url), {'default'})
+
+
+# -----------------------------------------
+# Metrics
+# -----------------------------------------
+class MetricsTests(MunjiTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def test_requests_are_recorded_per_route(self):
+        Category.objects.create(name='Paddy')
+        self.client.get('/api/categories/')
+        self.client.get('/api/categories/')
+        self.client.get('/api/no-such-route/')
+
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('munji_http_requests_total{route="category-list",method="GET",status="200"} 2', body)
+        self.assertIn('munji_http_requests_total{route="<unmatched>",method="GET",status="404"} 1', body)
+        self.assertIn('munji_http_request_duration_seconds_count{route="category-list",method="GET"} 2', body)
+        self.assertIn('munji_http_request_duration_seconds_bucket{route="category-list",method="GET",le="+Inf"} 2', body)
+        self.assertRegex(body, r'munji_db_queries_total\{route="category-list",method="GET"\} [1-9]')
+
+    def test_threads_are_summed(self):
+        def work():
+            for _ in range(100):
+                metrics.observe('route', 'GET', 200, 0.001, 1, 0.0005, 10)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics.observe('route', 'GET', 500, 20.0, 0, 0.0)
+
+        stats = metrics.snapshot()['route', 'GET']
+        self.assertEqual(stats.statuses, {200: 400, 500: 1})
+        self.assertEqual(stats.queries, 400)
+        self.assertEqual(stats.size, 4000)
+        self.assertEqual(stats.buckets[0], 400)
+        self.assertEqual(stats.buckets[-1], 1)
+
+
+# -----------------------------------------
+# Async read views
+# -----------------------------------------
+class AsyncReadTests(QueryBudgetTestCase):
+    """The async views must answer exactly as the DRF views they stand in for."""
+    generate_data_options = {'purchases': 30, 'expenses': 40}
+
+    def drf_response(self, view, url, **kwargs):
+        response = view(RequestFactory().get(url, HTTP_ACCEPT='application/json'), **kwargs)
+        response.render()
+        return response
+
+    def assertSameAsDRF(self, url, view, **kwargs):
+        expected = self.drf_response(view, url, **kwargs)
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.json(), json.loads(expected.content), url)
+        self.assertEqual(set(response['Allow'].split(', ')), set(expected['Allow'].split(', ')), url)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'), url)
+
+    def test_lists_match_drf(self):
+        purchases = views.MunjiPurchaseViewSet.as_view(async_views.LIST_ACTIONS)
+        category = Category.objects.order_by('pk').first()
+        day = MunjiPurchase.objects.order_by('pk').first().created_at.date()
+        for query in ('', 'page=2&page_size=5', 'payment_type=Cash', f'category={category.pk}',
+                      f'start_date={day}&end_date={day}', 'start_date=not-a-date', 'page=99'):
+            self.assertSameAsDRF(f'/api/purchases/?{query}', purchases)
+        on_day = self.client.get(f'/api/purchases/?start_date={day}&end_date={day}').json()['count']
+        self.assertEqual(on_day, MunjiPurchase.objects.filter(created_at__date=day).count())
+        self.assertLess(on_day, MunjiPurchase.objects.count())
+        first = self.client.get('/api/purchases/?cursor=&page_size=5').json()
+        self.assertSameAsDRF(first['next'].replace('http://testserver', ''), purchases)
+        self.assertSameAsDRF('/api/suppliers/', views.SupplierViewSet.as_view(async_views.LIST_ACTIONS))
+        self.assertSameAsDRF('/api/categories/', views.CategoryViewSet.as_view(async_views.LIST_ACTIONS))
+        self.assertSameAsDRF('/api/globals/', views.GlobalSettingsViewSet.as_view(async_views.LIST_ACTIONS))
+        self.assertSameAsDRF('/api/recent_purchases/', views.recent_purchases)
+
+    def test_details_match_drf(self):
+        purchase = views.MunjiPurchaseViewSet.as_view(async_views.DETAIL_ACTIONS)
+        pk = MunjiPurchase.objects.order_by('pk').first().pk
+        self.assertSameAsDRF(f'/api/purchases/{pk}/', purchase, pk=pk)
+        self.assertSameAsDRF('/api/purchases/999999/', purchase, pk=999999)
+        globals_detail = views.GlobalSettingsViewSet.as_view(async_views.DETAIL_ACTIONS)
+        pk = GlobalSettings.get_instance().pk
+        self.assertSameAsDRF(f'/api/globals/{pk}/', globals_detail, pk=pk)
+
+    @override_settings(MUNJI_SINGLE_PROCESS=True)
+    def test_conditional_get(self):
+        etag = self.client.get('/api/purchases/')['ETag']
+        response = self.client.get('/api/purchases/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_permissions_and_throttles_apply(self):
+        class Closed(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 60
+
+        purchase = MunjiPurchase.objects.order_by('pk').first().pk
+        routes = [
+            (views.MunjiPurchaseViewSet, '/api/purchases/', async_views.LIST_ACTIONS, {}),
+            (views.MunjiPurchaseViewSet, f'/api/purchases/{purchase}/', async_views.DETAIL_ACTIONS, {'pk': purchase}),
+            (views.GlobalSettingsViewSet, '/api/globals/', async_views.LIST_ACTIONS, {}),
+            (views.recent_purchases.cls, '/api/recent_purchases/', None, {}),
+        ]
+        for view_class, url, actions, kwargs in routes:
+            drf = views.recent_purchases if actions is None else view_class.as_view(actions)
+            for name, value, status in [('permission_classes', [IsAuthenticated], 403), ('throttle_classes', [Closed], 429)]:
+                with self.subTest(url=url, check=name), mock.patch.object(view_class, name, value):
+                    self.assertSameAsDRF(url, drf, **kwargs)
+                    self.assertEqual(self.client.get(url).status_code, status)
+
+    def test_other_requests_use_drf(self):
+        self.assertIn(b'<html', self.client.get('/api/purchases/', HTTP_ACCEPT='text/html').content)
+        response = self.client.post('/api/categories/', {'name': 'Barley'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Category.objects.filter(name='Barley').exists())
+
+    async def test_async_client(self):
+        metrics.reset()
+        response = await self.async_client.get('/api/purchases/?page_size=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+        stats = metrics.snapshot()['munjipurchase-list', 'GET']
+        self.assertGreater(stats.queries, 0)
+
+
+# -----------------------------------------
+# Fast list serialization
+# -----------------------------------------
+class FastListTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', purchases=30, expenses=40, stdout=StringIO())
+        MunjiPurchase.objects.create(
+            supplier=None, category=Category.objects.first(), total_bags=1,
+            buying_quantity_munji=Decimal('1.5'), munji_price_per_unit=Decimal('3.3'), payment_type='Credit',
+        )
+
+    def test_encoders_match_serializers(self):
+        for case in serialization.CASES:
+            with self.subTest(case.name):
+                self.assertIsNotNone(row_encoder(case.serializer_class))
+                self.assertEqual(serialization.encode(case, 1000), serialization.serialize(case, 1000))
+        supplierless = serialization.encode(serialization.CASES[0], 1000)[0]
+        self.assertNotIn('supplier', supplierless)
+
+    def test_unsupported_serializers_fall_back(self):
+        class WithMethodField(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Category
+                fields = ['id', 'label']
+
+            def get_label(self, obj):
+                return obj.name.upper()
+
+        self.assertIsNone(row_encoder(WithMethodField))
+
+    def test_list_pages_and_cursors(self):
+        first = self.client.get('/api/expenses/?pagination=cursor&page_size=7').json()
+        second = self.client.get(first['next']).json()
+        expected = ExpenseSerializer(Expense.objects.order_by('-created_at', '-id')[:14], many=True).data
+        self.assertEqual(first['results'] + second['results'], expected)
+        response = self.client.get('/api/expenses/?page=2&page_size=7').json()
+        self.assertEqual(response['count'], Expense.objects.count())
+        self.assertEqual(response['results'], expected[7:])
+
+
+# -----------------------------------------
+# Sparse fieldsets and expansion
+# -----------------------------------------
+class SparseFieldsTests(QueryBudgetTestCase):
+    generate_data_options = {'purchases': 30, 'expenses': 60}
+
+    def test_fields_and_exclude(self):
+        full = self.client.get('/api/purchases/?page_size=5').json()['results']
+        sparse = self.client.get('/api/purchases/?page_size=5&fields=id,supplier,total_munji_cost').json()['results']
+        self.assertEqual(sparse, [{k: row[k] for k in ('id', 'supplier', 'total_munji_cost') if k in row} for row in full])
+        rest = self.client.get('/api/purchases/?page_size=5&exclude=supplier,category').json()['results']
+        self.assertEqual(rest, [{k: v for k, v in row.items() if k not in ('supplier', 'category')} for row in full])
+
+        pk = full[0]['id']
+        with CaptureQueriesContext(connection) as captured:
+            detail = self.client.get(f'/api/purchases/{pk}/?fields=id,total_bags').json()
+        self.assertEqual(detail, {'id': pk, 'total_bags': full[0]['total_bags']})
+        self.assertNotIn('munji_price_per_unit', captured.captured_queries[-1]['sql'])
+
+        csv = self.client.get('/api/expenses/export/?format=csv&fields=id,amount')
+        self.assertEqual(b''.join(csv.streaming_content).split(b'\r\n')[0], b'id,amount')
+        self.assertEqual(self.client.get('/api/categories/?fields=label').json()['results'][0].keys(), {'label'})
+        self.assertEqual(self.client.get('/api/globals/?fields=sales').json()['results'][0].keys(), {'sales'})
+
+    def test_unknown_names_are_rejected(self):
+        self.assertEqual(self.client.get('/api/purchases/?fields=id,nope').status_code, 400)
+        self.assertEqual(self.client.get('/api/expenses/?expand=expenses').status_code, 400)
+
+    def test_expand_expenses(self):
+        page = self.client.get('/api/purchases/?fields=id&expand=expenses&page_size=10').json()['results']
+        for row in page:
+            expected = ExpenseSerializer(
+                Expense.objects.filter(munji_purchase_id=row['id']).order_by('-created_at', '-id'), many=True,
+            ).data
+            self.assertEqual(row['expenses'], expected)
+        detail = self.client.get(f"/api/purchases/{page[0]['id']}/?expand=expenses").json()
+        self.assertEqual(detail['expenses'], page[0]['expenses'])
+        self.assertQueriesIndependentOfPageSize('/api/purchases/?expand=expenses')
+        self.assertQueriesIndependentOfPageSize('/api/purchases/?expand=expenses&pagination=cursor')
+
+
+# -----------------------------------------
+# Autocomplete
+# -----------------------------------------
+class SearchTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ['Miller Ltd', 'Hamilton Mills', 'Smith & Miller', 'Café Müller', 'Mi Amigo', 'Tommi Rice']:
+            Supplier.objects.create(name=name)
+
+    def labels(self, query, **params):
+        response = self.client.get('/api/suppliers/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['label'] for row in response.json()['results']]
+
+    def test_ranking(self):
+        self.assertEqual(self.labels('mil'), ['Miller Ltd', 'Hamilton Mills', 'Smith & Miller'])
+        self.assertEqual(self.labels('ill'), ['Miller Ltd', 'Smith & Miller', 'Hamilton Mills'])
+        self.assertEqual(self.labels('mi'), ['Mi Amigo', 'Miller Ltd'])
+        self.assertEqual(self.labels('MULLER'), ['Café Müller'])
+        self.assertEqual(self.labels('mil', limit=1), ['Miller Ltd'])
+        self.assertEqual(self.client.get('/api/suppliers/?q=mil&limit=500').status_code, 400)
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.labels('amigo'), ['Mi Amigo'])
+        supplier = Supplier.objects.get(name='Mi Amigo')
+        supplier.name = 'Amigos Trading'
+        supplier.save(update_fields=['name'])
+        self.assertEqual(self.labels('amigo'), ['Amigos Trading'])
+        supplier.delete()
+        self.assertEqual(self.labels('amigo'), [])
+        Supplier.objects.bulk_create([Supplier(name='Amigo Bulk', search_name='amigo bulk')])
+        cache.touch_model(Supplier)
+        self.assertEqual(self.labels('amigo'), ['Amigo Bulk'])
+
+    def test_results_are_cached(self):
+        self.labels('mil')
+        with self.assertNumQueries(0):
+            self.labels('mil')
+
+    def test_check_reports_missing_triggers(self):
+        self.assertEqual(checks.run_checks(databases=['default'], tags=[checks.Tags.database]), [])
+        # What SQLite does to them when a migration remakes the table.
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER munji_app_supplier_search_update')
+        errors = checks.run_checks(databases=['default'], tags=[checks.Tags.database])
+        self.assertEqual([(error.id, error.obj) for error in errors], [('munji_app.E001', Supplier)])
+        self.assertIn('munji_app_supplier_search_update', errors[0].msg)
+        self.assertIn("search.create_index_sql('munji_app_supplier')", errors[0].hint)
+
+
+# -----------------------------------------
+# Dashboard
+# -----------------------------------------
+class DashboardTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+        category = Category.objects.create(name='Basmati')
+        for payment_type, price in [('Cash', '5'), ('Credit', '7'), ('Credit', '2')]:
+            MunjiPurchase.objects.create(
+                category=category, total_bags=1, buying_quantity_munji=Decimal('10'),
+                munji_price_per_unit=Decimal(price), payment_type=payment_type,
+            )
+        MiscellaneousCost.objects.create(title='Diesel', amount=Decimal('12.5'))
+
+    def test_totals_and_latest_purchases(self):
+        data = self.client.get('/api/dashboard/').json()
+        self.assertEqual(data['balances'], GlobalSettingsSerializer(GlobalSettings.get_instance()).data)
+        for period in ('today', 'month_to_date'):
+            totals = data[period]
+            self.assertEqual(totals['purchases'], 3)
+            self.assertEqual(totals['spend'], '140.00')
+            self.assertEqual(totals['misc_costs'], '12.50')
+            self.assertEqual(totals['cash'], {'purchases': 1, 'quantity_bought': '10.00', 'spend': '50.00', 'expenses': '0.00'})
+            self.assertEqual(totals['credit']['spend'], '90.00')
+        self.assertEqual(data['recent_purchases'], self.client.get('/api/purchases/?page_size=5').json()['results'])
+        self.assertEqual(data['recent_purchases'][0]['category'], 'Basmati')
+
+    def test_cached_until_a_ledger_write(self):
+        self.client.get('/api/dashboard/')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/dashboard/').json()
+        ledger.add_capital(Decimal('25'))
+        data = self.client.get('/api/dashboard/').json()
+        self.assertNotEqual(data['balances'], cached['balances'])
+        self.assertEqual(data['balances'], GlobalSettingsSerializer(GlobalSettings.get_instance()).data)
+
+
+# -----------------------------------------
+# Background jobs
+# -----------------------------------------
+@jobs.task('wait_for_cancel')
+def wait_for_cancel(context, started):
+    context.update(progress=50, message='waiting')
+    Job.objects.filter(pk=context.job.pk).update(message=started)
+    while True:
+        time.sleep(jobs.PROGRESS_INTERVAL / 5)
+        context.update()
+
+
+class JobTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        call_command('generate_data', purchases=40, expenses=40, stdout=StringIO())
+
+    def work(self, concurrency=2):
+        worker = jobs.Worker(concurrency=concurrency, poll_interval=0.01)
+        thread = threading.Thread(target=worker.work, kwargs={'burst': True})
+        thread.start()
+        return worker, thread
+
+    def test_submit_poll_and_fetch(self):
+        query = {'granularity': 'month', 'group_by': 'category'}
+        response = self.client.post('/api/jobs/', {'kind': 'report', 'params': query}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        url = response['Location']
+        self.assertEqual(self.client.get(url + 'result/').status_code, 202)
+        for rebuild in ({'kind': 'rebuild_rollups'}, {'kind': 'repair_landed_costs', 'params': {'batch_size': 7}}):
+            self.assertEqual(self.client.post('/api/jobs/', rebuild, content_type='application/json').status_code, 202)
+
+        _, thread = self.work()
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.SUCCEEDED})
+        job = self.client.get(url).json()
+        self.assertEqual((job['status'], job['progress']), (Job.SUCCEEDED, 100))
+        self.assertEqual(self.client.get(url + 'result/').json(), self.client.get('/api/reports/', query).json())
+
+    def test_invalid_jobs_are_rejected(self):
+        for body in [
+            {'kind': 'nope'},
+            {'kind': 'report', 'params': {'granularity': 'year'}},
+            {'kind': 'repair_landed_costs', 'params': {'batch_size': 0}},
+            {'kind': 'rebuild_rollups', 'params': {'chunk': 10}},
+        ]:
+            with self.subTest(body=body):
+                self.assertEqual(self.client.post('/api/jobs/', body, content_type='application/json').status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_cancel_and_concurrency_limit(self):
+        running = [jobs.submit('wait_for_cancel', {'started': 'started'}) for _ in range(2)]
+        queued = jobs.submit('report')
+        self.assertEqual(self.client.post(f'/api/jobs/{queued.pk}/cancel/').json()['status'], Job.CANCELLED)
+
+        worker, thread = self.work(concurrency=1)
+        deadline = time.monotonic() + 10
+        while not Job.objects.filter(message='started').exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING).count(), 1)
+        for job in running:
+            self.client.post(f'/api/jobs/{job.pk}/cancel/')
+        thread.join(30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.CANCELLED})
+        self.assertEqual(self.client.get(f'/api/jobs/{queued.pk}/result/').status_code, 409)
+
+
+class AbandonedJobTests(MunjiTestCase):
+    def test_jobs_without_a_heartbeat_fail(self):
+        now = timezone.now()
+        stale = now - datetime.timedelta(seconds=jobs.ABANDONED_AFTER + 1)
+        recent = now - datetime.timedelta(seconds=jobs.ABANDONED_AFTER - 60)
+        crashed = Job.objects.create(kind='report', status=Job.RUNNING, worker='gone', started_at=stale, heartbeat_at=stale)
+        # Claimed before heartbeats were recorded.
+        legacy = Job.objects.create(kind='report', status=Job.RUNNING, worker='gone', started_at=stale)
+        slow = Job.objects.create(kind='report', status=Job.RUNNING, worker='gone', started_at=stale, heartbeat_at=recent)
+        mine = Job.objects.create(kind='report', status=Job.RUNNING, worker='here', started_at=stale, heartbeat_at=stale)
+        queued = Job.objects.create(kind='report')
+
+        with self.assertLogs('munji_app.jobs', 'WARNING') as logs:
+            jobs.Worker(name='here').beat()
+        self.assertEqual(logs.output, ['WARNING:munji_app.jobs:Failed 2 job(s) abandoned by their worker'])
+        for job in (crashed, legacy):
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.FAILED)
+            self.assertEqual(job.error, 'Abandoned: its worker stopped responding.')
+            self.assertIsNotNone(job.finished_at)
+        for job, status in ((slow, Job.RUNNING), (mine, Job.RUNNING), (queued, Job.QUEUED)):
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+        self.assertGreaterEqual(mine.heartbeat_at, now)
+
+    def test_claim_starts_the_heartbeat(self):
+        job = jobs.submit('report')
+        self.assertEqual(jobs.claim('here'), job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.heartbeat_at, job.started_at)
+        self.assertEqual(jobs.fail_abandoned(), 0)
+
+    def test_late_outcome_does_not_overwrite_the_failure(self):
+        def outlived(context):
+            # Another worker gave up on this one meanwhile.
+            Job.objects.filter(pk=context.job.pk).update(status=Job.FAILED, error='Abandoned', finished_at=timezone.now())
+            return {'rows': 1}
+
+        with mock.patch.dict(jobs.TASKS, {'outlived': jobs.Task(outlived)}):
+            job = jobs.submit('outlived')
+            jobs.claim('here')
+            with self.assertLogs('munji_app.jobs', 'WARNING') as logs:
+                self.assertEqual(jobs.run(job.pk), Job.FAILED)
+        self.assertIn('no longer running on this worker', logs.output[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.result), (Job.FAILED, 'Abandoned', None))
+
+
+# -----------------------------------------
+# Season archive
+# -----------------------------------------
+class ArchiveTests(MunjiTestCase):
+    cutoff = datetime.date(2026, 1, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', purchases=40, expenses=60, production=20, misc_costs=20,
+                     end=datetime.date(2026, 6, 30), stdout=StringIO())
+        cls.live = {model: model.objects.count() for model in archive.ARCHIVES}
+        cls.report = cls.client_class().get('/api/reports/', {'granularity': 'month'}).json()
+        call_command('archive_season', before=str(cls.cutoff), chunk_size=7, stdout=StringIO())
+
+    def test_old_rows_move_with_a_summary_per_month(self):
+        cutoff = timezone.make_aware(datetime.datetime.combine(self.cutoff, datetime.time()))
+        for model, entry in archive.ARCHIVES.items():
+            with self.subTest(model=model.__name__):
+                archived = entry.archived.objects.count()
+                self.assertGreater(archived, 0)
+                self.assertEqual(model.objects.count() + archived, self.live[model])
+                self.assertEqual(entry.history.objects.count(), self.live[model])
+                self.assertFalse(entry.archived.objects.filter(created_at__gte=cutoff).exists())
+                summaries = ArchiveSummary.objects.filter(model=model._meta.label_lower)
+                self.assertEqual(sum(summaries.values_list('rows', flat=True)), archived)
+        self.assertFalse(MunjiPurchase.objects.filter(created_at__lt=cutoff, expenses__isnull=True).exists())
+        self.assertFalse(Expense.objects.exclude(munji_purchase__in=MunjiPurchase.objects.all()).exists())
+
+    def test_views_match_the_models(self):
+        # The migrations write the view SQL out; it must keep up with the models.
+        with connection.cursor() as cursor:
+            for entry in archive.ARCHIVES.values():
+                history = entry.history._meta
+                with self.subTest(view=history.db_table):
+                    description = connection.introspection.get_table_description(cursor, history.db_table)
+                    columns = [column.name for column in description]
+                    self.assertEqual(columns, [field.column for field in history.concrete_fields])
+                    self.assertEqual(columns, [field.column for field in entry.archived._meta.concrete_fields])
+
+    def test_reports_cover_archived_days(self):
+        self.assertEqual(self.client.get('/api/reports/', {'granularity': 'month'}).json(), self.report)
+        rollups.rebuild()
+        self.assertEqual(self.client.get('/api/reports/', {'granularity': 'month'}).json(), self.report)
+
+    def test_lists_read_the_archive_only_for_old_ranges(self):
+        live_ids = {row['id'] for row in self.client.get('/api/purchases/?page_size=100').json()['results']}
+        self.assertEqual(live_ids, set(MunjiPurchase.objects.values_list('id', flat=True)))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get('/api/purchases/?start_date=2026-03-01')
+        self.assertNotIn('_history', ' '.join(query['sql'] for query in captured.captured_queries))
+
+        old = ArchivedMunjiPurchase.objects.get(pk=ArchivedExpense.objects.order_by('created_at').first().munji_purchase_id)
+        url = f'/api/purchases/?start_date=2025-01-01&page_size=100&expand=expenses&category={old.category_id}'
+        results = {row['id']: row for row in self.client.get(url).json()['results']}
+        self.assertIn(old.pk, results)
+        self.assertEqual(len(results[old.pk]['expenses']), ArchivedExpense.objects.filter(munji_purchase_id=old.pk).count())
+        drf = views.MunjiPurchaseViewSet.as_view(async_views.LIST_ACTIONS)
+        response = drf(RequestFactory().get(url, HTTP_ACCEPT='application/json'))
+        response.render()
+        self.assertEqual(json.loads(response.content)['results'], list(results.values()))
+
+        expense = ArchivedExpense.objects.order_by('created_at').first()
+        day = expense.created_at.date()
+        rows = self.client.get(f'/api/expenses/?start_date={day}&end_date={day}').json()['results']
+        self.assertIn(expense.pk, [row['id'] for row in rows])
+        csv = self.client.get(f'/api/expenses/export/?format=csv&start_date={day}')
+        self.assertIn(f'\r\n{expense.pk},'.encode(), b''.join(csv.streaming_content))
+
+
+# -----------------------------------------
+# Idempotency keys
+# -----------------------------------------
+PURCHASE = {'total_bags': 2, 'buying_quantity_munji': '10.00', 'munji_price_per_unit': '5.00', 'payment_type': 'Cash'}
+
+
+class IdempotencyTests(MunjiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+
+    def post(self, url, data, key=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post(url, data, content_type='application/json', headers=headers)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post('/api/purchases/', PURCHASE, key='retry-1')
+        self.assertEqual(first.status_code, 201)
+        cash = GlobalSettings.get_instance().cash_in_hand
+        with self.assertNumQueries(1):
+            retry = self.post('/api/purchases/', PURCHASE, key='retry-1')
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(MunjiPurchase.objects.count(), 1)
+        self.assertEqual(GlobalSettings.get_instance().cash_in_hand, cash)
+
+        self.assertEqual(self.post('/api/purchases/', PURCHASE).status_code, 201)
+        self.assertEqual(self.post('/api/purchases/', PURCHASE, key='retry-2').status_code, 201)
+        self.assertEqual(MunjiPurchase.objects.count(), 3)
+        self.assertEqual(self.post('/api/purchases/bulk/', [PURCHASE] * 2, key='retry-1').status_code, 201)
+        self.assertEqual(self.post('/api/purchases/bulk/', [PURCHASE] * 2, key='retry-1').json(),
+                         self.post('/api/purchases/bulk/', [PURCHASE] * 2, key='retry-1').json())
+        self.assertEqual(MunjiPurchase.objects.count(), 5)
+
+        job = self.post('/api/jobs/', {'kind': 'report'}, key='job-1')
+        self.assertEqual(self.post('/api/jobs/', {'kind': 'report'}, key='job-1')['Location'], job['Location'])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_errors_release_the_key_and_bodies_must_match(self):
+        self.assertEqual(self.post('/api/miscellaneous-costs/', {'title': 'Diesel'}, key='misc').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        cost = {'title': 'Diesel', 'amount': '12.50'}
+        self.assertEqual(self.post('/api/miscellaneous-costs/', cost, key='misc').status_code, 201)
+        self.assertEqual(self.post('/api/miscellaneous-costs/', {**cost, 'amount': '13.00'}, key='misc').status_code, 422)
+        self.assertEqual(self.post('/api/miscellaneous-costs/', cost, key='x' * 256).status_code, 400)
+        self.assertEqual(MiscellaneousCost.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT=0.1)
+    def test_duplicates_of_a_running_request_wait(self):
+        body = json.dumps(PURCHASE).encode()
+        idempotency.claim('busy', '/api/purchases/', hashlib.sha256(body).hexdigest())
+        response = self.post('/api/purchases/', PURCHASE, key='busy')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+        self.assertFalse(MunjiPurchase.objects.exists())
+
+    def test_expired_keys_are_purged(self):
+        self.post('/api/suppliers/', {'name': 'Old Mill'}, key='old')
+        self.post('/api/suppliers/', {'name': 'New Mill'}, key='new')
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now())
+        self.assertEqual(self.post('/api/suppliers/', {'name': 'Old Mill 2'}, key='old').status_code, 201)
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now())
+        call_command('purge_idempotency_keys', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_make_one_write(self):
+        ledger.add_capital(Decimal('1000'))
+        ledger.add_cash(Decimal('1000'))
+        barrier = threading.Barrier(4)
+        responses = []
+
+        def post():
+            barrier.wait()
+            try:
+                responses.append(self.client_class().post(
+                    '/api/purchases/', PURCHASE, content_type='application/json', headers={'Idempotency-Key': 'storm'},
+                ))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(MunjiPurchase.objects.count(), 1)
+        self.assertEqual(GlobalSettings.get_instance().cash_in_hand, Decimal('950.00'))
+
+
+# -----------------------------------------
+# OpenAPI schema
+# -----------------------------------------
+class SchemaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'openapi.json'
+        settings = override_settings(OPENAPI_SCHEMA_FILE=str(self.path))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        schema.load.cache_clear()
+        self.addCleanup(schema.load.cache_clear)
+        call_command('build_openapi', stdout=StringIO())
+
+    def test_served_from_the_built_file(self):
+        content = self.path.read_bytes()
+        digest = schema.content_hash(content)
+        response = self.client.get('/openapi.json')
+        self.assertEqual(response.content, content)
+        self.assertEqual(response['ETag'], f'"{digest}"')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('/dashboard/', json.loads(content)['paths'])
+        self.assertIn('/recent_purchases/', json.loads(content)['paths'])
+        self.assertEqual(self.client.get('/openapi.json', HTTP_IF_NONE_MATCH=f'"{digest}"').status_code, 304)
+
+        versioned = self.client.get(f'/openapi.json?v={digest}')
+        self.assertIn('immutable', versioned['Cache-Control'])
+        self.assertIn('max-age=31536000', versioned['Cache-Control'])
+        for url in ('/static/swagger-ui.html/', '/redoc/'):
+            page = self.client.get(url).content.decode()
+            self.assertIn(digest, page)
+            # Assets come from the pinned drf-yasg release, not a CDN.
+            self.assertNotIn('https://', page)
+            assets = re.findall(r'(?:src|href)="/static/([^"]+)"', page)
+            self.assertTrue(assets)
+            for asset in assets:
+                self.assertIsNotNone(finders.find(asset), asset)
+
+
+# -----------------------------------------
+# Benchmarks
+# -----------------------------------------
+class BenchmarkScenarioTests(QueryBudgetTestCase):
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(scenarios.route_names() - {s.route for s in scenarios.SCENARIOS}, set())
+
+    def test_scenarios_run(self):
+        results = runner.run(scenarios.SCENARIOS, scenarios.context(), iterations=1, warmup=0)
+        self.assertEqual(list(results), [s.name for s in scenarios.SCENARIOS])
+
+    def test_compare_flags_regressions(self):
+        baseline = {'purchases': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 2, 'peak_kb': 100.0}}
+        same = {'purchases': {'p50_ms': 11.0, 'p95_ms': 25.0, 'queries': 2, 'peak_kb': 110.0}}
+        worse = {'purchases': {'p50_ms': 20.0, 'p95_ms': 40.0, 'queries': 3, 'peak_kb': 200.0}}
+        self.assertEqual(runner.compare(baseline, same, threshold=0.25), [])
+        self.assertEqual(len(runner.compare(baseline, worse, threshold=0.25)), 4)
+        self.assertEqual(runner.compare(baseline, {**same, 'dashboard': same['purchases']}, threshold=0.25), [
+            'dashboard: not in the baseline; record it with --update-baseline',
+        ])
+
+    def test_missing_baseline_is_an_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'baseline.json'
+            with self.assertRaisesMessage(CommandError, f'No baseline at {path}'):
+                call_command('benchmark', baseline=path, stdout=StringIO())
+            self.assertFalse(path.exists())
@@ -1,6 +1,7 @@
 from django.urls import path, include
+from . import async_views
 from rest_framework.routers import DefaultRouter
-from .views import SupplierViewSet, MunjiPurchaseViewSet, RiceProductionViewSet, GlobalSettingsViewSet,ExpenseViewSet, get_payment_choices, CategoryViewSet, MiscellaneousCostViewSet,recent_purchases,global_settings
+from .views import SupplierViewSet, MunjiPurchaseViewSet, RiceProductionViewSet, GlobalSettingsViewSet,ExpenseViewSet, get_payment_choices, CategoryViewSet, MiscellaneousCostViewSet, JobViewSet, global_settings, reports, dashboard, metrics_view
 
 router = DefaultRouter()
 router.register(r'suppliers', SupplierViewSet)
@@ -10,10 +11,26 @@ router.register(r'globals', GlobalSettingsViewSet)
 router.register(r'expenses', ExpenseViewSet)
 router.register(r'categories', CategoryViewSet)
 router.register(r'miscellaneous-costs', MiscellaneousCostViewSet)
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
+    # Async JSON reads for the hot endpoints; they hand everything else to
+    # the router's views below, under the same names.
+    path('purchases/', async_views.purchase_list, name='munjipurchase-list'),
+    path('purchases/<int:pk>/', async_views.purchase_detail, name='munjipurchase-detail'),
+    path('suppliers/', async_views.supplier_list, name='supplier-list'),
+    path('categories/', async_views.category_list, name='category-list'),
+    path('globals/', async_views.globals_list, name='globalsettings-list'),
+    path('globals/<int:pk>/', async_views.globals_detail, name='globalsettings-detail'),
+    path('recent_purchases/', async_views.recent_purchases, name='recent_purchases'),
     path('', include(router.urls)),
     path('payment-choices/', get_payment_choices, name='payment-choices'),
-    path('recent_purchases/', recent_purchases, name='recent_purchases'),
+    path('reports/', reports, name='reports'),
+    path('dashboard/', dashboard, name='dashboard'),
+    path('metrics', metrics_view, name='metrics'),
+    # Production CRUD stays unrouted; only its export is exposed.
+    path('production/export/',
+         RiceProductionViewSet.as_view({'get': 'export'}, basename='production', **RiceProductionViewSet.export.kwargs),
+         name='riceproduction-export'),
     #path('global/', global_settings, name='global-settings'),
 ]
\ No newline at end of file
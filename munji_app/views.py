@@ -1,20 +1,37 @@
-from rest_framework import viewsets, status
+import hashlib
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError as DRFValidationError
+from django.conf import settings
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.http import HttpResponse
+from django.urls import reverse
+from . import cache, jobs, ledger, metrics, rollups, routers
+from .conditional import ConditionalGetMixin, conditional_get
+from .export import ExportMixin
+from .fastlist import FastListMixin, row_encoder
+from .filters import DateRangeFilterMixin
+from .idempotency import IdempotencyMixin, idempotent
 from .models import (
     Supplier, MunjiPurchase, RiceProduction, GlobalSettings,
-    Expense, Category, MiscellaneousCost
+    Expense, Category, MiscellaneousCost, DailyRollup, Job
 )
+from .pagination import PageNumberOrCursorPagination
+from .search import SearchMixin
+from .sparse import SparseFieldsMixin
 from .serializers import (
     SupplierSerializer, MunjiPurchaseSerializer, RiceProductionSerializer,
     GlobalSettingsSerializer, ExpenseSerializer, CategorySerializer,
-    MiscellaneousCostSerializer, ChoiceSerializer
+    MiscellaneousCostSerializer, ChoiceSerializer, BalancesAsOfSerializer,
+    ReportRowSerializer, DashboardPeriodSerializer, JobSerializer
 )
 from decimal import Decimal
 from datetime import datetime, timedelta
-from rest_framework.pagination import PageNumberPagination
+from django.utils import timezone
 
 
 # -------------------------------
@@ -35,13 +52,17 @@ def global_settings(request):
     return Response(serializer.data)
 
 
-class GlobalSettingsViewSet(viewsets.ModelViewSet):
-    queryset = GlobalSettings.objects.all()
+class GlobalSettingsViewSet(IdempotencyMixin, ConditionalGetMixin, SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = GlobalSettings.objects.all().order_by('id')
     serializer_class = GlobalSettingsSerializer
 
     def get_object(self):
-        obj, created = GlobalSettings.objects.get_or_create(id=1)
-        return obj
+        return GlobalSettings.get_instance()
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset([self.get_object()])
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def update(self, request, *args, **kwargs):
         return self._custom_update(request)
@@ -50,7 +71,6 @@ class GlobalSettingsViewSet(viewsets.ModelViewSet):
         return self._custom_update(request)
 
     def _custom_update(self, request):
-        gs = self.get_object()
         data = request.data
 
         def to_decimal(val):
@@ -59,28 +79,33 @@ class GlobalSettingsViewSet(viewsets.ModelViewSet):
             except:
                 return Decimal(0)
 
-        if "opening_balance" in data:
-            gs.opening_balance += to_decimal(data["opening_balance"])
+        try:
+            ledger.adjust(
+                opening_balance=to_decimal(data.get("opening_balance", 0)),
+                cash_in_hand=to_decimal(data.get("cash_in_hand", 0)),
+                sales=to_decimal(data.get("sales", 0)),
+                total_munji=to_decimal(data.get("total_munji", 0)),
+            )
+        except DjangoValidationError as e:
+            return Response({"error": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
 
-        if "cash_in_hand" in data:
-            amount = to_decimal(data["cash_in_hand"])
-            if gs.opening_balance < amount:
-                return Response(
-                    {"error": "Not enough capital to move into cash."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            gs.cash_in_hand += amount
-            gs.opening_balance -= amount
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data)
 
-        if "sales" in data:
-            gs.sales += to_decimal(data["sales"])
+    @action(detail=False, methods=['get'], url_path='as-of')
+    def as_of(self, request):
+        """Balances at the end of ?date=YYYY-MM-DD, rebuilt from the ledger journal."""
+        try:
+            day = datetime.strptime(request.query_params.get('date', ''), "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"error": "date must be given as YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if "total_munji" in data:
-            gs.total_munji += to_decimal(data["total_munji"])
+        end_of_day = timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+        balances = ledger.as_of(end_of_day)
+        if balances is None:
+            return Response({"error": "No ledger history for this date."}, status=status.HTTP_404_NOT_FOUND)
 
-        gs.save()
-        serializer = self.get_serializer(gs)
-        return Response(serializer.data)
+        return Response(BalancesAsOfSerializer({"as_of": day, **balances}).data)
 
 
 # -------------------------------
@@ -89,7 +114,7 @@ class GlobalSettingsViewSet(viewsets.ModelViewSet):
 #class SupplierViewSet(viewsets.ModelViewSet):
 #    queryset = Supplier.objects.all().order_by('-created_at')
 #    serializer_class = ChoiceSerializer
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(IdempotencyMixin, ConditionalGetMixin, SearchMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all().order_by('-created_at')
 
     def get_serializer_class(self):
@@ -98,7 +123,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
         return SupplierSerializer     # For POST/PUT/PATCH/DELETE
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(IdempotencyMixin, ConditionalGetMixin, SearchMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('-created_at')
 
     def get_serializer_class(self):
@@ -110,43 +135,36 @@ class CategoryViewSet(viewsets.ModelViewSet):
 #    serializer_class = ChoiceSerializer
 
 
-class MunjiPurchaseViewSet(viewsets.ModelViewSet):
-    queryset = MunjiPurchase.objects.all().order_by('-created_at')
+class MunjiPurchaseViewSet(IdempotencyMixin, ConditionalGetMixin, DateRangeFilterMixin, ExportMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
+    queryset = MunjiPurchase.objects.select_related('supplier', 'category').order_by('-created_at')
     serializer_class = MunjiPurchaseSerializer
+    conditional_models = (MunjiPurchase, Supplier, Category, Expense)
+    category_lookup = 'category'
+    expandable = {'expenses': ExpenseSerializer}
+    export_fields = (
+        'id', 'supplier__name', 'category__name', 'total_bags', 'buying_quantity_munji',
+        'munji_price_per_unit', 'total_munji_price', 'total_munji_cost', 'payment_type', 'created_at',
+    )
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
         payment_type = self.request.query_params.get('payment_type')
-        category = self.request.query_params.get('category')
-
-        if start_date:
-            start_date = datetime.strptime(start_date, "%Y-%m-%d")
-            queryset = queryset.filter(created_at__gte=start_date)
-
-        if end_date:
-            end_date = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
-            queryset = queryset.filter(created_at__lt=end_date)
 
+        # Match case-insensitively by normalising to the stored spelling, so
+        # the lookup stays an equality the payment_type index can use.
         if payment_type:
-            queryset = queryset.filter(payment_type__iexact=payment_type)
-
-        if category:
-            queryset = queryset.filter(category__iexact=category)
+            choices = {value.lower(): value for value, _ in MunjiPurchase.PAYMENT_CHOICES}
+            queryset = queryset.filter(payment_type=choices.get(payment_type.lower(), payment_type))
 
         return queryset.order_by('-created_at')
 
     @action(detail=True, methods=['get'])
     def expenses(self, request, pk=None):
         purchase = self.get_object()
-        expenses = purchase.expenses.all().order_by('-created_at')
-        page = self.paginate_queryset(expenses)
-        if page is not None:
-            serializer = ExpenseSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = ExpenseSerializer(expenses, many=True)
-        return Response(serializer.data)
+        encoder = row_encoder(ExpenseSerializer)
+        expenses = purchase.expenses.order_by('-created_at')
+        page = self.paginator.paginate_queryset(expenses, request, view=self, lookups=encoder.lookups)
+        return self.get_paginated_response(encoder.encode_many(page))
 
     def create(self, request, *args, **kwargs):
         try:
@@ -160,10 +178,61 @@ class MunjiPurchaseViewSet(viewsets.ModelViewSet):
         except DjangoValidationError as e:
             return Response({'error': getattr(e, 'message_dict', str(e))}, status=400)
 
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        """
+        Create a list of purchases all-or-nothing: rows are validated one by
+        one, then inserted together with a single combined ledger change.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'error': 'Expected a non-empty list of purchases.'}, status=400)
+
+        purchases, errors = [], []
+        for row in request.data:
+            serializer = self.get_serializer(data=row)
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
+            purchase = MunjiPurchase(**serializer.validated_data)
+            purchase.compute_totals()
+            try:
+                purchase.clean_fields()
+            except DjangoValidationError as e:
+                errors.append(e.message_dict)
+                continue
+            purchases.append(purchase)
+            errors.append({})
+
+        if any(errors):
+            return Response({'errors': errors}, status=400)
+
+        cash_needed = sum(
+            (p.total_munji_price for p in purchases if p.payment_type == MunjiPurchase.CASH),
+            Decimal(0),
+        )
+        munji_bought = sum((p.buying_quantity_munji for p in purchases), Decimal(0))
+
+        try:
+            with transaction.atomic():
+                MunjiPurchase.objects.bulk_create(purchases)
+                ledger.deduct_purchase(cash_needed, munji_bought)
+                rollups.add(purchases)
+                cache.touch_model(MunjiPurchase)
+        except DjangoValidationError as e:
+            return Response({'error': e.messages[0]}, status=400)
+
+        serializer = self.get_serializer(purchases, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class RiceProductionViewSet(viewsets.ModelViewSet):
+
+class RiceProductionViewSet(IdempotencyMixin, ConditionalGetMixin, DateRangeFilterMixin, ExportMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = RiceProduction.objects.all().order_by('-created_at')
     serializer_class = RiceProductionSerializer
+    export_fields = (
+        'id', 'quantity_produced', 'dryer_cost', 'factory_cost', 'wastage', 'quality_of_rice',
+        'rice_price_per_unit', 'total_quality', 'total_price', 'naku_price', 'naku_quantity', 'created_at',
+    )
 
     def create(self, request, *args, **kwargs):
         try:
@@ -178,14 +247,17 @@ class RiceProductionViewSet(viewsets.ModelViewSet):
             return Response({'error': getattr(e, 'message_dict', str(e))}, status=400)
 
 
-class ExpenseViewSet(viewsets.ModelViewSet):
+class ExpenseViewSet(IdempotencyMixin, ConditionalGetMixin, DateRangeFilterMixin, ExportMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Expense.objects.all().order_by('-created_at')
     serializer_class = ExpenseSerializer
+    category_lookup = 'munji_purchase__category'
+    export_fields = ('id', 'munji_purchase', 'title', 'amount', 'created_at')
 
 
-class MiscellaneousCostViewSet(viewsets.ModelViewSet):
+class MiscellaneousCostViewSet(IdempotencyMixin, ConditionalGetMixin, DateRangeFilterMixin, ExportMixin, SparseFieldsMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = MiscellaneousCost.objects.all().order_by('-created_at')
     serializer_class = MiscellaneousCostSerializer
+    export_fields = ('id', 'title', 'amount', 'created_at')
 
     def create(self, request, *args, **kwargs):
         try:
@@ -213,10 +285,149 @@ def get_payment_choices(request):
 
 
 @api_view(['GET'])
+@conditional_get(MunjiPurchase, Supplier, Category)
 def recent_purchases(request):
-    queryset = MunjiPurchase.objects.all().order_by('-created_at')
-    paginator = PageNumberPagination()
+    encoder = row_encoder(MunjiPurchaseSerializer)
+    queryset = MunjiPurchase.objects.order_by('-created_at')
+    paginator = PageNumberOrCursorPagination()
     paginator.page_size = 10
-    result_page = paginator.paginate_queryset(queryset, request)
-    serializer = MunjiPurchaseSerializer(result_page, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    result_page = paginator.paginate_queryset(queryset, request, lookups=encoder.lookups)
+    return paginator.get_paginated_response(encoder.encode_many(result_page))
+
+
+@api_view(['GET'])
+@conditional_get(DailyRollup, MunjiPurchase, Expense, MiscellaneousCost, RiceProduction, Category)
+def reports(request):
+    """
+    Totals from the DailyRollup table.
+    ?start_date= / ?end_date= (YYYY-MM-DD, inclusive), ?granularity=day|month
+    and ?group_by= any of category,payment_type (empty for period totals).
+    """
+    try:
+        options = rollups.report_options(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    # The ETag comes from the primary's stamps; so must the body.
+    with routers.primary_reads():
+        rows = rollups.report(**options)
+    return Response({
+        'granularity': options['granularity'],
+        'results': ReportRowSerializer(rows, many=True).data,
+    })
+
+
+# -------------------------------
+# Dashboard
+# -------------------------------
+DASHBOARD_MODELS = (GlobalSettings, DailyRollup, MunjiPurchase, Supplier, Category, Expense, MiscellaneousCost)
+SPLIT_METRICS = ('purchases', 'quantity_bought', 'spend', 'expenses')
+
+
+def dashboard_totals(today):
+    """Today's and month-to-date totals, with cash/credit splits, in one query on DailyRollup."""
+    periods = {'today': Q(day=today), 'month_to_date': Q()}
+    sums = {}
+    for period, in_period in periods.items():
+        for metric in ('purchases', 'spend', 'expenses', 'misc_costs'):
+            sums[f'{period}__{metric}'] = Sum(metric, filter=in_period)
+        for payment_type in (MunjiPurchase.CASH, MunjiPurchase.CREDIT):
+            for metric in SPLIT_METRICS:
+                sums[f'{period}__{payment_type}__{metric}'] = Sum(
+                    metric, filter=in_period & Q(payment_type=payment_type),
+                )
+    row = DailyRollup.objects.filter(day__gte=today.replace(day=1), day__lte=today).aggregate(**sums)
+
+    def total(key):
+        return row[key] or 0
+
+    return {
+        period: {
+            'start': today if period == 'today' else today.replace(day=1),
+            'end': today,
+            **{metric: total(f'{period}__{metric}') for metric in ('purchases', 'spend', 'expenses', 'misc_costs')},
+            **{
+                payment_type.lower(): {metric: total(f'{period}__{payment_type}__{metric}') for metric in SPLIT_METRICS}
+                for payment_type in (MunjiPurchase.CASH, MunjiPurchase.CREDIT)
+            },
+        }
+        for period in periods
+    }
+
+
+@api_view(['GET'])
+def dashboard(request):
+    """
+    Everything the home screen shows, in one response: the current
+    balances, the latest purchases and today's / month-to-date totals
+    split by payment type. Built from at most three queries and cached
+    for DASHBOARD_CACHE_TIMEOUT seconds, or until one of its models changes.
+    No ETag: the totals also change when the day does.
+    """
+    today = timezone.localdate()
+    stamps = [cache.model_stamp(model)[0] for model in DASHBOARD_MODELS]
+
+    @routers.primary_reads()
+    def load():
+        # Cached for every client under the primary's stamps: a lagging
+        # replica's totals would outlive its catching up.
+        encoder = row_encoder(MunjiPurchaseSerializer)
+        latest = (
+            MunjiPurchase.objects.order_by('-created_at', '-id')
+            .values_list(*encoder.lookups, named=True)[:settings.DASHBOARD_RECENT_PURCHASES]
+        )
+        totals = dashboard_totals(today)
+        return {
+            'balances': GlobalSettingsSerializer(GlobalSettings.get_instance()).data,
+            'recent_purchases': encoder.encode_many(latest),
+            **{period: DashboardPeriodSerializer(values).data for period, values in totals.items()},
+        }
+
+    key = hashlib.sha1(':'.join([str(today), *stamps]).encode()).hexdigest()
+    data = cache.cached('dashboard', key, load, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    return Response(data)
+
+
+# -------------------------------
+# Background Jobs
+# -------------------------------
+class JobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    POST {"kind": ..., "params": {...}} queues a job (202); poll the job's
+    URL for status and progress, then GET its result/. POST cancel/ stops it.
+    """
+    queryset = Job.objects.defer('result').order_by('-created_at', '-id')
+    serializer_class = JobSerializer
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job = jobs.submit(serializer.validated_data['kind'], serializer.validated_data.get('params'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        location = request.build_absolute_uri(reverse('job-detail', kwargs={'pk': job.pk}))
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """The job's result once it succeeded; 202 while it is queued or running, 409 if it failed or was cancelled."""
+        job = self.get_object()
+        if job.status == Job.SUCCEEDED:
+            return Response(Job.objects.values_list('result', flat=True).get(pk=job.pk))
+        if job.status in Job.FINISHED:
+            return Response({'error': f'Job {job.status}.', 'job': self.get_serializer(job).data},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        return Response(self.get_serializer(jobs.cancel(self.get_object())).data)
+
+
+# -------------------------------
+# Metrics
+# -------------------------------
+def metrics_view(request):
+    """Per-route request metrics of this process, in the Prometheus text format."""
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
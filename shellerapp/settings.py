@@ -47,12 +47,15 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'munji_app',
+    # Only for the Swagger UI and ReDoc bundles in its static files, pinned
+    # with drf-yasg in requirements.txt. Loading the app imports none of
+    # its schema code; build_openapi does that.
     'drf_yasg',
-
-    
 ]
 
 MIDDLEWARE = [
+    'munji_app.middleware.MetricsMiddleware',
+    'munji_app.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,13 +88,57 @@ WSGI_APPLICATION = 'shellerapp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Run on every new SQLite connection. WAL lets readers work while a write
+# is in progress; synchronous=NORMAL is durable across crashes in WAL mode
+# (a power cut may lose the last commits); busy_timeout waits for the write
+# lock instead of failing; cache_size is in KiB when negative.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=%s' % os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=%d' % int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'PRAGMA cache_size=-%d' % int(os.environ.get('SQLITE_CACHE_KIB', 65536)),
+    'PRAGMA mmap_size=%d' % int(os.environ.get('SQLITE_MMAP_BYTES', 268435456)),
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests (seconds; 0 closes them
+        # after each request) and check them before reuse.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            # Take the write lock when a transaction starts, so a transaction
+            # that reads then writes waits on busy_timeout instead of failing
+            # with "database is locked" when it tries to upgrade.
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # A file, not :memory:, so tests run with WAL and several connections.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Read replicas: DB_REPLICAS is a comma-separated list of SQLite files kept
+# as copies of the primary (see `manage.py sync_replicas`). GET requests
+# read munji_app data from them; a client that writes reads from the
+# primary for REPLICA_STICKY_SECONDS afterwards.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['munji_app.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -130,8 +177,7 @@ USE_TZ = True
 
 # Add this to your REST_FRAMEWORK settings
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'munji_app.pagination.PageNumberOrCursorPagination',
     'PAGE_SIZE': 10,
     'EXCEPTION_HANDLER': 'munji_app.exception_handler.custom_exception_handler',
 }
@@ -141,3 +187,45 @@ REST_FRAMEWORK = {
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache alias for munji_app change stamps and cached reads (GlobalSettings).
+# locmem is per process: use a shared backend when running several workers.
+MUNJI_CACHE = 'default'
+MUNJI_CACHE_TIMEOUT = 300
+# ETags and 304s are derived from the change stamps in MUNJI_CACHE, so they
+# are only served when that cache is shared by every worker. Set this for
+# deployments where a single process serves all requests (e.g. runserver)
+# to use them with a per-process backend such as locmem.
+MUNJI_SINGLE_PROCESS = os.environ.get('MUNJI_SINGLE_PROCESS', '0') == '1'
+
+# /api/dashboard/ is cached for this long at most; any write to the models
+# it reads (ledger changes included) replaces it sooner.
+DASHBOARD_CACHE_TIMEOUT = 30
+DASHBOARD_RECENT_PURCHASES = 5
+
+# Background jobs (see munji_app/jobs.py): jobs each `manage.py run_jobs`
+# process runs at once, and seconds between checks of an empty queue.
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 2))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+
+# Idempotency-Key on create endpoints (see munji_app/idempotency.py): how
+# long a key's response is replayed, and how long a duplicate of a request
+# still running waits for it before answering 409.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', 10.0))
+
+# OpenAPI schema written by `manage.py build_openapi` and served at /openapi.json.
+OPENAPI_SCHEMA_FILE = os.environ.get('OPENAPI_SCHEMA_FILE', str(BASE_DIR / 'openapi' / 'openapi.json'))
+
+# Write a LedgerSnapshot of the GlobalSettings balances every N journal
+# entries; point-in-time balance queries replay at most N entries.
+LEDGER_SNAPSHOT_INTERVAL = 500
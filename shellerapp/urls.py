@@ -1,28 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Munji App API",
-      default_version='v1',
-      description="API documentation for Munji App",
-      terms_of_service="https://www.yourapp.com/terms/",
-      contact=openapi.Contact(email="contact@yourapp.com"),
-      license=openapi.License(name="Your License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+from munji_app import schema
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('munji_app.urls')),
-    
-    # OpenAPI schema endpoints
-    path('openapi.json', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('static/swagger-ui.html/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+
+    # OpenAPI schema endpoints, served from the file `manage.py build_openapi` writes
+    path('openapi.json', schema.schema_json, name='schema-json'),
+    path('static/swagger-ui.html/', schema.swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', schema.redoc, name='schema-redoc'),
 ]